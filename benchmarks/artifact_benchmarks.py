@@ -0,0 +1,598 @@
+# vim: set fileencoding=utf-8
+"""
+benchmarks/artifact_benchmarks.py
+
+This file defines the ArtifactBenchmarks class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from argparse import ArgumentParser, Namespace
+import asyncio
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+if __package__:
+    from .private_dbus_daemon import PrivateDbusDaemon
+    from .synthetic_repositories import SyntheticRepositories
+else:
+    from private_dbus_daemon import PrivateDbusDaemon
+    from synthetic_repositories import SyntheticRepositories
+
+
+class _RecordingApp:
+    """
+    Stands in for the PythonEDA application, recording what the handlers send it.
+    """
+
+    def __init__(self):
+        """
+        Creates a new _RecordingApp instance.
+        """
+        self.events = asyncio.Queue()
+
+    async def emit(self, event):
+        """
+        Records an emitted event.
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        """
+        self.events.put_nowait((time.perf_counter(), event))
+
+    async def accept(self, event):
+        """
+        Records an accepted event.
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        """
+        self.events.put_nowait((time.perf_counter(), event))
+
+
+class ArtifactBenchmarks:
+    """
+    Measures the hot paths of the artifact infrastructure.
+
+    Class name: ArtifactBenchmarks
+
+    Responsibilities:
+        - Measure ArtifactCli cold start, each CLI handler end to end,
+          Change.from_unidiff_text on big diffs, the emitter routing, the wire
+          encodings, the emitter throughput and the listener delivery latency.
+        - Run offline, against synthetic repositories and a private dbus-daemon.
+        - Report machine-readable results.
+
+    Collaborators:
+        - benchmarks.SyntheticRepositories: The repositories to measure against.
+        - benchmarks.PrivateDbusDaemon: The bus to send signals through.
+
+    Run it with "python -m benchmarks.artifact_benchmarks --output results.json".
+    Each result has a name, its parameters, a unit, and either summary
+    statistics of its samples or a single value; failed measurements carry
+    their error instead, so the rest of the suite still runs.
+    """
+
+    def __init__(self, folder: str, quick: bool = False):
+        """
+        Creates a new ArtifactBenchmarks instance.
+        :param folder: The folder for the repositories, caches and the bus.
+        :type folder: str
+        :param quick: Whether to use smaller repositories and fewer samples.
+        :type quick: bool
+        """
+        super().__init__()
+        self._folder = folder
+        self._quick = quick
+        self._results = []
+        self._repositories = {}
+
+    @property
+    def results(self) -> List[Dict]:
+        """
+        Retrieves the results so far.
+        :return: Such results.
+        :rtype: List[Dict]
+        """
+        return self._results
+
+    def _samples(self, full: int) -> int:
+        """
+        Retrieves the number of samples to take.
+        :param full: The number for a full run.
+        :type full: int
+        :return: Such number, reduced in quick runs.
+        :rtype: int
+        """
+        return max(1, full // 10) if self._quick else full
+
+    def _record(self, name: str, params: Dict, unit: str, samples: List[float]):
+        """
+        Records the statistics of a measurement.
+        :param name: The measurement name.
+        :type name: str
+        :param params: Its parameters.
+        :type params: Dict
+        :param unit: The unit of the samples.
+        :type unit: str
+        :param samples: The samples.
+        :type samples: List[float]
+        """
+        ordered = sorted(samples)
+        self._results.append(
+            {
+                "name": name,
+                "params": params,
+                "unit": unit,
+                "status": "ok",
+                "samples": len(ordered),
+                "min": ordered[0],
+                "median": statistics.median(ordered),
+                "mean": statistics.fmean(ordered),
+                "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                "max": ordered[-1],
+            }
+        )
+
+    def _record_value(self, name: str, params: Dict, unit: str, value: float):
+        """
+        Records a measurement with a single value.
+        :param name: The measurement name.
+        :type name: str
+        :param params: Its parameters.
+        :type params: Dict
+        :param unit: The unit of the value.
+        :type unit: str
+        :param value: The value.
+        :type value: float
+        """
+        self._results.append(
+            {
+                "name": name,
+                "params": params,
+                "unit": unit,
+                "status": "ok",
+                "value": value,
+            }
+        )
+
+    def _record_error(self, name: str, params: Dict, error: BaseException):
+        """
+        Records a failed measurement.
+        :param name: The measurement name.
+        :type name: str
+        :param params: Its parameters.
+        :type params: Dict
+        :param error: The error.
+        :type error: BaseException
+        """
+        self._results.append(
+            {
+                "name": name,
+                "params": params,
+                "status": "error",
+                "error": f"{error.__class__.__name__}: {error}",
+            }
+        )
+
+    async def _measure(self, name: str, params: Dict, function: Callable, samples: int):
+        """
+        Times given call, awaiting it if it's a coroutine function.
+        :param name: The measurement name.
+        :type name: str
+        :param params: Its parameters.
+        :type params: Dict
+        :param function: The call.
+        :type function: Callable
+        :param samples: The number of samples to take.
+        :type samples: int
+        """
+        timings = []
+        try:
+            for _ in range(samples):
+                start = time.perf_counter()
+                result = function()
+                if asyncio.iscoroutine(result):
+                    await result
+                timings.append(time.perf_counter() - start)
+        except (Exception, SystemExit) as error:
+            self._record_error(name, params, error)
+            return
+        self._record(name, params, "s", timings)
+
+    def setup(self):
+        """
+        Isolates the caches and stores, and creates the repositories.
+        """
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self._folder, "cache")
+        os.environ["XDG_STATE_HOME"] = os.path.join(self._folder, "state")
+        repositories = SyntheticRepositories(
+            os.path.join(self._folder, "repositories"),
+            hugeDiffFiles=20 if self._quick else 200,
+            tags=100 if self._quick else 1000,
+        )
+        self._repositories = repositories.create()
+
+    def cli_cold_start(self):
+        """
+        Measures starting a new interpreter, importing ArtifactCli and parsing
+        a command line, which is what every git hook pays; and importing
+        ArtifactHookClient, which is what hooks pay when a daemon is running.
+        """
+        parse = (
+            "from argparse import ArgumentParser\n"
+            "from pythoneda.shared.artifact.infrastructure.cli.artifact_cli import ArtifactCli\n"
+            "parser = ArgumentParser()\n"
+            "ArtifactCli().add_arguments(parser)\n"
+            f"parser.parse_args(['-e', 'TagPushed', '-r', {self._repositories['small']!r}, '-t', '0.0.1'])\n"
+        )
+        hook_client = "from pythoneda.shared.artifact.infrastructure.cli.artifact_hook_client import ArtifactHookClient\n"
+        for target, code in [
+            ("ArtifactCli", parse),
+            ("ArtifactHookClient", hook_client),
+        ]:
+            asyncio.run(
+                self._measure(
+                    "cli.cold_start",
+                    {"target": target},
+                    lambda: subprocess.run(
+                        [sys.executable, "-c", code], check=True, capture_output=True
+                    ),
+                    self._samples(10),
+                )
+            )
+
+    async def handlers(self):
+        """
+        Measures each CLI handler end to end, with the git metadata cache
+        both cold and warm.
+        """
+        from pythoneda.shared.artifact.infrastructure.cli import (
+            CommittedChangesPushedCliHandler,
+            CommittedChangesTaggedCliHandler,
+            GitMetadataCache,
+            StagedChangesCommittedCliHandler,
+            TagPushedCliHandler,
+        )
+
+        cases = [
+            (StagedChangesCommittedCliHandler, "small", None),
+            (StagedChangesCommittedCliHandler, "huge-diff", None),
+            (CommittedChangesPushedCliHandler, "small", "0.0.1"),
+            (CommittedChangesTaggedCliHandler, "small", "0.0.1"),
+            (TagPushedCliHandler, "many-tags", "0.0.1"),
+        ]
+        for handler_class, repository, tag in cases:
+            folder = self._repositories[repository]
+            args = Namespace(
+                repository_folder=folder, tag=tag, max_file_diff_bytes=None
+            )
+            for cache in ["cold", "warm"]:
+                app = _RecordingApp()
+
+                async def handle():
+                    if cache == "cold":
+                        GitMetadataCache.instance().invalidate(folder)
+                    await handler_class().handle(app, args)
+
+                await self._measure(
+                    f"handler.{handler_class.__name__}",
+                    {"repository": repository, "metadata_cache": cache},
+                    handle,
+                    self._samples(20),
+                )
+
+    def change_parsing(self):
+        """
+        Measures Change.from_unidiff_text on the diff of the huge commit.
+        """
+        from pythoneda.shared.artifact.events import Change
+        from pythoneda.shared.artifact.infrastructure.cli import GitCommitExtractor
+
+        folder = self._repositories["huge-diff"]
+        _, diff, _ = GitCommitExtractor(folder).latest_commit()
+        self._record_value(
+            "change.diff_size", {"repository": "huge-diff"}, "bytes", len(diff)
+        )
+        asyncio.run(
+            self._measure(
+                "change.from_unidiff_text",
+                {"repository": "huge-diff"},
+                lambda: Change.from_unidiff_text(diff, "url", "main", folder),
+                self._samples(10),
+            )
+        )
+
+    def dispatch(self):
+        """
+        Measures how long the emitter takes to find the route of an event: a
+        lookup by type in the routing table, against a scan of
+        signal_emitters() by class name, which is how routes used to be found.
+        """
+        from pythoneda.shared.artifact.events import TagPushed
+        from pythoneda.shared.artifact.infrastructure.dbus import (
+            ArtifactDbusSignalEmitter,
+        )
+
+        emitter = ArtifactDbusSignalEmitter(transports={})
+        event = TagPushed("0.0.1", "0" * 40, "url", "main", "folder")
+        iterations = self._samples(100000)
+
+        def routing_table():
+            for _ in range(iterations):
+                emitter.routing_table().get(event.__class__)
+
+        def scan():
+            for _ in range(iterations):
+                name = emitter.full_class_name(event.__class__)
+                for key, value in emitter.signal_emitters().items():
+                    if key == name:
+                        break
+
+        for strategy, function in [("routing_table", routing_table), ("scan", scan)]:
+            start = time.perf_counter()
+            function()
+            self._record_value(
+                "emitter.dispatch",
+                {"strategy": strategy},
+                "ns/event",
+                (time.perf_counter() - start) / iterations * 1e9,
+            )
+
+    def encoding(self):
+        """
+        Measures the size of a StagedChangesCommitted event with a huge diff
+        on the wire, and how long it takes to encode and decode, with the
+        plain d-bus encoding and each compact codec.
+        """
+        from pythoneda.shared.artifact.events import Change, StagedChangesCommitted
+        from pythoneda.shared.artifact.events.infrastructure.dbus import (
+            DbusStagedChangesCommitted,
+        )
+        from pythoneda.shared.artifact.infrastructure.cli import GitCommitExtractor
+        from pythoneda.shared.artifact.infrastructure.dbus import (
+            DbusArtifactCompactEvent,
+        )
+
+        folder = self._repositories["huge-diff"]
+        hash_value, diff, message = GitCommitExtractor(folder).latest_commit()
+        event = StagedChangesCommitted(
+            message, Change.from_unidiff_text(diff, "url", "main", folder), hash_value
+        )
+        signature = DbusStagedChangesCommitted.sign(event)
+        body = DbusStagedChangesCommitted.transform(event)
+        self._record_value(
+            "encoding.size",
+            {"encoding": "dbus"},
+            "bytes",
+            sum(len(str(item).encode("utf-8")) for item in body),
+        )
+        for codec in DbusArtifactCompactEvent.available_codecs():
+            payload = DbusArtifactCompactEvent.encode(signature, body, codec)
+            self._record_value(
+                "encoding.size",
+                {"encoding": "compact", "codec": codec},
+                "bytes",
+                len(payload),
+            )
+            asyncio.run(
+                self._measure(
+                    "encoding.encode",
+                    {"codec": codec},
+                    lambda: DbusArtifactCompactEvent.encode(signature, body, codec),
+                    self._samples(20),
+                )
+            )
+            asyncio.run(
+                self._measure(
+                    "encoding.decode",
+                    {"codec": codec},
+                    lambda: DbusArtifactCompactEvent.decode(payload),
+                    self._samples(20),
+                )
+            )
+
+    async def emitter_throughput(self, address: str):
+        """
+        Measures how many TagPushed events per second the emitter sends
+        through the private bus, with and without envelopes, and with each encoding.
+        :param address: The d-bus address of the private bus.
+        :type address: str
+        """
+        from pythoneda.shared.artifact.events import TagPushed
+        from pythoneda.shared.artifact.infrastructure.dbus import (
+            ArtifactDbusSignalEmitter,
+        )
+
+        events = [
+            TagPushed(f"0.0.{index}", "0" * 40, "url", "main", "folder")
+            for index in range(self._samples(2000))
+        ]
+        for batch_size in [1, 32]:
+            for encoding in ["dbus", "compact"]:
+                params = {"batch_size": batch_size, "encoding": encoding}
+                try:
+                    emitter = ArtifactDbusSignalEmitter(
+                        batchMaxSize=batch_size,
+                        transports={"*": address},
+                        encoding=encoding,
+                    )
+                    start = time.perf_counter()
+                    await asyncio.gather(*[emitter.emit(event) for event in events])
+                    elapsed = time.perf_counter() - start
+                except Exception as error:
+                    self._record_error("emitter.throughput", params, error)
+                    continue
+                self._record_value(
+                    "emitter.throughput", params, "events/s", len(events) / elapsed
+                )
+
+    async def listener_latency(self, address: str):
+        """
+        Measures the time from emitting a TagPushed event to the listener
+        handing it to the application, through the private bus.
+        :param address: The d-bus address of the private bus.
+        :type address: str
+        """
+        from pythoneda.shared.artifact.events import TagPushed
+        from pythoneda.shared.artifact.infrastructure.dbus import (
+            ArtifactDbusSignalEmitter,
+            ArtifactDbusSignalListener,
+        )
+
+        class TagPushedListener(ArtifactDbusSignalListener):
+            @classmethod
+            def event_types(cls) -> List[str]:
+                return ["TagPushed"]
+
+        os.environ["PYTHONEDA_ARTIFACT_DBUS_TRANSPORTS"] = f"*={address}"
+        for encoding in ["dbus", "compact"]:
+            params = {"encoding": encoding}
+            app = _RecordingApp()
+            listener = None
+            try:
+                emitter = ArtifactDbusSignalEmitter(
+                    transports={"*": address}, encoding=encoding
+                )
+                listener = asyncio.ensure_future(TagPushedListener().accept(app))
+                await asyncio.sleep(0.5)
+                latencies = []
+                for index in range(self._samples(200)):
+                    start = time.perf_counter()
+                    await emitter.emit(
+                        TagPushed(f"0.0.{index}", "0" * 40, "url", "main", "folder")
+                    )
+                    received, _ = await asyncio.wait_for(app.events.get(), 10)
+                    latencies.append(received - start)
+            except Exception as error:
+                self._record_error("listener.latency", params, error)
+                continue
+            finally:
+                if listener is not None:
+                    listener.cancel()
+            self._record("listener.latency", params, "s", latencies)
+
+    def bus(self):
+        """
+        Measures the emitter and listener through a private dbus-daemon.
+        """
+        if not PrivateDbusDaemon.available():
+            self._record_error(
+                "emitter.throughput", {}, RuntimeError("dbus-daemon not found")
+            )
+            return
+        with PrivateDbusDaemon(os.path.join(self._folder, "bus")) as daemon:
+            asyncio.run(self.emitter_throughput(daemon.address))
+            asyncio.run(self.listener_latency(daemon.address))
+
+    def metadata(self) -> Dict:
+        """
+        Describes the environment the benchmarks ran in.
+        :return: Such description.
+        :rtype: Dict
+        """
+        git = subprocess.run(["git", "--version"], capture_output=True, text=True)
+        revision = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+        )
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": revision.stdout.strip() or None,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "git": git.stdout.strip(),
+            "quick": self._quick,
+        }
+
+    def run(self, only: List[str] = None) -> Dict:
+        """
+        Runs the benchmarks.
+        :param only: The names of the benchmarks to run, or None for all of them.
+        :type only: List[str]
+        :return: The metadata and the results.
+        :rtype: Dict
+        """
+        self.setup()
+        benchmarks = {
+            "cli": self.cli_cold_start,
+            "handlers": lambda: asyncio.run(self.handlers()),
+            "change": self.change_parsing,
+            "dispatch": self.dispatch,
+            "encoding": self.encoding,
+            "bus": self.bus,
+        }
+        for name, benchmark in benchmarks.items():
+            if only and name not in only:
+                continue
+            try:
+                benchmark()
+            except Exception as error:
+                self._record_error(name, {}, error)
+        return {"metadata": self.metadata(), "results": self.results}
+
+
+def main():
+    """
+    Runs the benchmarks from the command line.
+    """
+    parser = ArgumentParser(description="Benchmarks the artifact infrastructure")
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=False,
+        help="The JSON file to write (stdout by default).",
+    )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Use smaller repositories and fewer samples.",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=["cli", "handlers", "change", "dispatch", "encoding", "bus"],
+        help="Run only these benchmarks.",
+    )
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="pythoneda-artifact-bench-") as folder:
+        report = ArtifactBenchmarks(folder, args.quick).run(args.only)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
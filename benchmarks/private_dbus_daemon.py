@@ -0,0 +1,147 @@
+# vim: set fileencoding=utf-8
+"""
+benchmarks/private_dbus_daemon.py
+
+This file defines the PrivateDbusDaemon class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import shutil
+import subprocess
+
+
+class PrivateDbusDaemon:
+    """
+    A throwaway dbus-daemon, so benchmarks don't depend on the system or session bus.
+
+    Class name: PrivateDbusDaemon
+
+    Responsibilities:
+        - Start a dbus-daemon listening on a socket in a given folder.
+        - Stop it.
+
+    Collaborators:
+        - benchmarks.ArtifactBenchmarks: Sends and listens to signals through it.
+    """
+
+    CONFIG = """<!DOCTYPE busconfig PUBLIC "-//freedesktop//DTD D-Bus Bus Configuration 1.0//EN"
+ "http://www.freedesktop.org/standards/dbus/1.0/busconfig.dtd">
+<busconfig>
+  <type>session</type>
+  <listen>unix:path={socket}</listen>
+  <policy context="default">
+    <allow send_destination="*" eavesdrop="true"/>
+    <allow eavesdrop="true"/>
+    <allow own="*"/>
+  </policy>
+  <limit name="max_message_size">268435456</limit>
+  <limit name="max_incoming_bytes">1073741824</limit>
+  <limit name="max_outgoing_bytes">1073741824</limit>
+</busconfig>
+"""
+
+    def __init__(self, folder: str):
+        """
+        Creates a new PrivateDbusDaemon instance.
+        :param folder: The folder for its configuration and socket.
+        :type folder: str
+        """
+        super().__init__()
+        self._folder = folder
+        self._process = None
+        self._address = None
+
+    @classmethod
+    def available(cls) -> bool:
+        """
+        Checks whether dbus-daemon is installed.
+        :return: True in such case.
+        :rtype: bool
+        """
+        return shutil.which("dbus-daemon") is not None
+
+    @property
+    def address(self) -> str:
+        """
+        Retrieves the d-bus address of the running daemon.
+        :return: Such address, or None if it's not running.
+        :rtype: str
+        """
+        return self._address
+
+    def start(self) -> str:
+        """
+        Starts the daemon.
+        :return: Its d-bus address.
+        :rtype: str
+        """
+        os.makedirs(self._folder, exist_ok=True)
+        config = os.path.join(self._folder, "bus.conf")
+        with open(config, "w", encoding="utf-8") as file:
+            file.write(
+                self.__class__.CONFIG.format(
+                    socket=os.path.join(self._folder, "bus.sock")
+                )
+            )
+        self._process = subprocess.Popen(
+            [
+                "dbus-daemon",
+                f"--config-file={config}",
+                "--nofork",
+                "--print-address=1",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._address = self._process.stdout.readline().decode("utf-8").strip()
+        if not self._address:
+            self.stop()
+            raise RuntimeError("dbus-daemon did not start")
+        return self._address
+
+    def stop(self):
+        """
+        Stops the daemon.
+        """
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            self._process = None
+        self._address = None
+
+    def __enter__(self):
+        """
+        Starts the daemon when entering a with block.
+        :return: This instance.
+        :rtype: benchmarks.PrivateDbusDaemon
+        """
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        """
+        Stops the daemon when leaving a with block.
+        """
+        self.stop()
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
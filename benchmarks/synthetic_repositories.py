@@ -0,0 +1,208 @@
+# vim: set fileencoding=utf-8
+"""
+benchmarks/synthetic_repositories.py
+
+This file defines the SyntheticRepositories class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import random
+import subprocess
+from typing import Dict
+
+
+class SyntheticRepositories:
+    """
+    Creates the git repositories the benchmarks run against, offline and reproducibly.
+
+    Class name: SyntheticRepositories
+
+    Responsibilities:
+        - Create a small repository, one whose last commit has a huge diff,
+          and one with many tags.
+
+    Collaborators:
+        - benchmarks.ArtifactBenchmarks: Runs the benchmarks against them.
+    """
+
+    URL = "https://github.com/pythoneda-benchmarks/synthetic.git"
+
+    def __init__(
+        self,
+        folder: str,
+        hugeDiffFiles: int = 200,
+        hugeDiffLines: int = 2000,
+        tags: int = 1000,
+        seed: int = 42,
+    ):
+        """
+        Creates a new SyntheticRepositories instance.
+        :param folder: The folder to create the repositories in.
+        :type folder: str
+        :param hugeDiffFiles: The files changed by the huge commit.
+        :type hugeDiffFiles: int
+        :param hugeDiffLines: The lines of each of those files.
+        :type hugeDiffLines: int
+        :param tags: The number of tags of the many-tags repository.
+        :type tags: int
+        :param seed: The seed of the generated contents.
+        :type seed: int
+        """
+        super().__init__()
+        self._folder = folder
+        self._huge_diff_files = hugeDiffFiles
+        self._huge_diff_lines = hugeDiffLines
+        self._tags = tags
+        self._random = random.Random(seed)
+
+    @property
+    def folder(self) -> str:
+        """
+        Retrieves the folder of the repositories.
+        :return: Such folder.
+        :rtype: str
+        """
+        return self._folder
+
+    def _git(self, folder: str, *args: str):
+        """
+        Runs git in given repository, with a fixed identity and dates.
+        :param folder: The repository folder.
+        :type folder: str
+        :param args: The git arguments.
+        :type args: List[str]
+        """
+        environment = {
+            **os.environ,
+            "GIT_AUTHOR_NAME": "bench",
+            "GIT_AUTHOR_EMAIL": "bench@example.org",
+            "GIT_AUTHOR_DATE": "2023-01-01T00:00:00Z",
+            "GIT_COMMITTER_NAME": "bench",
+            "GIT_COMMITTER_EMAIL": "bench@example.org",
+            "GIT_COMMITTER_DATE": "2023-01-01T00:00:00Z",
+        }
+        subprocess.run(
+            ["git", "-c", "commit.gpgsign=false", "-c", "tag.gpgsign=false", *args],
+            cwd=folder,
+            env=environment,
+            check=True,
+            capture_output=True,
+        )
+
+    def _init(self, name: str) -> str:
+        """
+        Creates an empty repository.
+        :param name: Its name.
+        :type name: str
+        :return: Its folder.
+        :rtype: str
+        """
+        result = os.path.join(self.folder, name)
+        os.makedirs(result)
+        self._git(result, "init", "-q", "-b", "main")
+        self._git(result, "remote", "add", "origin", self.__class__.URL)
+        return result
+
+    def _write(self, folder: str, name: str, lines: int):
+        """
+        Writes a file with random lines.
+        :param folder: The repository folder.
+        :type folder: str
+        :param name: The file name.
+        :type name: str
+        :param lines: The number of lines.
+        :type lines: int
+        """
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as file:
+            for _ in range(lines):
+                file.write(f"value = {self._random.getrandbits(64):016x}\n")
+
+    def _commit(self, folder: str, message: str):
+        """
+        Commits everything in given repository.
+        :param folder: The repository folder.
+        :type folder: str
+        :param message: The commit message.
+        :type message: str
+        """
+        self._git(folder, "add", "-A")
+        self._git(folder, "commit", "-q", "-m", message)
+
+    def small(self) -> str:
+        """
+        Creates a repository with a few small commits.
+        :return: Its folder.
+        :rtype: str
+        """
+        result = self._init("small")
+        for index in range(3):
+            self._write(result, f"module_{index}.py", 20)
+            self._commit(result, f"Add module {index}")
+        self._git(result, "tag", "0.0.1")
+        return result
+
+    def huge_diff(self) -> str:
+        """
+        Creates a repository whose last commit changes many big files.
+        :return: Its folder.
+        :rtype: str
+        """
+        result = self._init("huge-diff")
+        self._write(result, "README.md", 1)
+        self._commit(result, "Initial commit")
+        for index in range(self._huge_diff_files):
+            self._write(result, f"generated_{index}.py", self._huge_diff_lines)
+        self._commit(result, "Add generated code")
+        self._git(result, "tag", "0.0.1")
+        return result
+
+    def many_tags(self) -> str:
+        """
+        Creates a repository with many commits, each one tagged;
+        half of the tags are annotated.
+        :return: Its folder.
+        :rtype: str
+        """
+        result = self._init("many-tags")
+        for index in range(self._tags):
+            self._write(result, "version.py", 1)
+            self._commit(result, f"Release {index}")
+            if index % 2 == 0:
+                self._git(result, "tag", f"0.0.{index}")
+            else:
+                self._git(result, "tag", "-a", "-m", f"Release {index}", f"0.0.{index}")
+        return result
+
+    def create(self) -> Dict[str, str]:
+        """
+        Creates all the repositories.
+        :return: Their folders, by name.
+        :rtype: Dict[str, str]
+        """
+        return {
+            "small": self.small(),
+            "huge-diff": self.huge_diff(),
+            "many-tags": self.many_tags(),
+        }
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -21,12 +21,43 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 __path__ = __import__("pkgutil").extend_path(__path__, __name__)
 
-from .artifact_cli import ArtifactCli
-from .committed_changes_pushed_cli_handler import CommittedChangesPushedCliHandler
-from .committed_changes_tagged_cli_handler import CommittedChangesTaggedCliHandler
-from .repository_folder_cli import RepositoryFolderCli
-from .staged_changes_committed_cli_handler import StagedChangesCommittedCliHandler
-from .tag_pushed_cli_handler import TagPushedCliHandler
+from ..common.lazy_attributes import LazyAttributes
+
+# Classes are imported on first access, so importing one module of this
+# package (e.g. the handler of a single event) doesn't import all of them.
+_LAZY_ATTRIBUTES = {
+    "ArtifactHookClient": ".artifact_hook_client",
+    "ArtifactCommitDebouncer": ".artifact_commit_debouncer",
+    "ArtifactDaemon": ".artifact_daemon",
+    "ArtifactOutbox": ".artifact_outbox",
+    "ArtifactOutboxDrainer": ".artifact_outbox_drainer",
+    "ArtifactRepositoryWatcher": ".artifact_repository_watcher",
+    "ArtifactWorkspace": ".artifact_workspace",
+    "ArtifactCli": ".artifact_cli",
+    "ArtifactCliHandlerRegistry": ".artifact_cli_handler_registry",
+    "GitCommitExtractor": ".git_commit_extractor",
+    "GitExecutor": ".git_executor",
+    "GitMetadata": ".git_metadata",
+    "GitMetadataCache": ".git_metadata_cache",
+    "GitTagResolver": ".git_tag_resolver",
+    "OciImageLayout": ".oci_image_layout",
+    "ArtifactReplayCli": ".artifact_replay_cli",
+    "CommittedChangesPushedCliHandler": ".committed_changes_pushed_cli_handler",
+    "CommittedChangesTaggedCliHandler": ".committed_changes_tagged_cli_handler",
+    "DockerImageCliHandler": ".docker_image_cli_handler",
+    "DockerImageAvailableCliHandler": ".docker_image_available_cli_handler",
+    "DockerImagePushedCliHandler": ".docker_image_pushed_cli_handler",
+    "DockerImageRequestedCliHandler": ".docker_image_requested_cli_handler",
+    "RepositoryFolderCli": ".repository_folder_cli",
+    "StagedChangesCommittedCliHandler": ".staged_changes_committed_cli_handler",
+    "TagPushedCliHandler": ".tag_pushed_cli_handler",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+_lazy_attributes = LazyAttributes(__name__, _LAZY_ATTRIBUTES)
+__getattr__ = _lazy_attributes.getattr
+__dir__ = _lazy_attributes.dir
 # vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
 # Local Variables:
 # mode: python
@@ -19,11 +19,14 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-from argparse import ArgumentParser
-from importlib import import_module
+from argparse import ArgumentParser, Namespace
+import asyncio
+import os
 from pythoneda.shared import BaseObject, PrimaryPort
 from pythoneda.shared.application import PythonEDA
 from pythoneda.shared.infrastructure.cli import CliHandler
+from .artifact_cli_handler_registry import ArtifactCliHandlerRegistry
+import sys
 
 
 class ArtifactCli(CliHandler, PrimaryPort):
@@ -35,10 +38,15 @@ class ArtifactCli(CliHandler, PrimaryPort):
 
     Responsibilities:
         - Parse the command-line to retrieve the information about the commit.
+        - Optionally stay resident as an ArtifactDaemon serving git hooks, collapsing bursts of commits.
+        - Optionally fan out to many repositories of a workspace.
+        - Optionally go through the ArtifactOutbox, so hooks don't wait for d-bus.
+        - Prune the ArtifactDiffStore on demand.
 
     Collaborators:
         - pythoneda.shared.application.PythonEDA subclasses: They are notified back with the information retrieved
         from the command line.
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactCliHandlerRegistry: Finds the CLI handler of each event.
         - pythoneda.shared.artifact.infrastructure.cli.*: CLI handlers.
     """
 
@@ -71,18 +79,102 @@ class ArtifactCli(CliHandler, PrimaryPort):
             "-e",
             "--event",
             required=False,
-            choices=[
-                "StagedChangesCommitted",
-                "CommittedChangesPushed",
-                "CommittedChangesTagged",
-                "TagPushed",
-            ],
+            choices=ArtifactCliHandlerRegistry.instance().events(),
             help="The type of event to send.",
         )
         parser.add_argument(
             "-r", "--repository-folder", required=False, help="The repository folder"
         )
+        parser.add_argument(
+            "-R",
+            "--repository-folders",
+            required=False,
+            nargs="+",
+            help="Several repository folders, or glob patterns matching them.",
+        )
+        parser.add_argument(
+            "-w",
+            "--workspace",
+            required=False,
+            nargs="+",
+            help="Folders containing repository checkouts.",
+        )
+        parser.add_argument(
+            "--workers",
+            required=False,
+            type=int,
+            help="The number of threads gathering git metadata (one per core by default).",
+        )
         parser.add_argument("-t", "--tag", required=False, help="The tag")
+        parser.add_argument(
+            "--tags",
+            required=False,
+            nargs="+",
+            help="Several tags, resolved and emitted at once.",
+        )
+        parser.add_argument(
+            "--pre-push-stdin",
+            action="store_true",
+            help="Read the tags being pushed from the standard input of a git pre-push hook.",
+        )
+        parser.add_argument(
+            "--image",
+            required=False,
+            help="The image reference, e.g. pythoneda/artifact:0.0.1.",
+        )
+        parser.add_argument(
+            "--image-path",
+            required=False,
+            help="The local OCI image layout, or image tarball.",
+        )
+        parser.add_argument(
+            "--registry-url",
+            required=False,
+            help="The registry the image was pushed to.",
+        )
+        parser.add_argument(
+            "--max-file-diff-bytes",
+            required=False,
+            type=int,
+            help="Replace file diffs bigger than this with their size and sha256 (default: $PYTHONEDA_ARTIFACT_MAX_FILE_DIFF_BYTES, or 1 MiB; 0 keeps them whole).",
+        )
+        parser.add_argument(
+            "--daemon",
+            action="store_true",
+            help="Stay resident, serving events forwarded by git hooks.",
+        )
+        parser.add_argument(
+            "--socket",
+            required=False,
+            help="The Unix socket the daemon listens to.",
+        )
+        parser.add_argument(
+            "--debounce-ms",
+            required=False,
+            type=int,
+            default=int(os.environ.get("PYTHONEDA_ARTIFACT_DEBOUNCE_MS", "0")),
+            help="The daemon collapses the commits of a repository until it stays quiet this long.",
+        )
+        parser.add_argument(
+            "--outbox",
+            action="store_true",
+            help="Append events to the local outbox instead of emitting them; the daemon forwards them.",
+        )
+        parser.add_argument(
+            "--drain-outbox",
+            action="store_true",
+            help="Forward the events in the local outbox, and exit.",
+        )
+        parser.add_argument(
+            "--diff-store",
+            action="store_true",
+            help="Keep commit diffs in the local diff store; events carry references to them.",
+        )
+        parser.add_argument(
+            "--prune-diff-store",
+            action="store_true",
+            help="Evict the least recently used diffs beyond the caps of the local diff store, and exit.",
+        )
 
     async def handle(self, app: PythonEDA, args):
         """
@@ -92,14 +184,83 @@ class ArtifactCli(CliHandler, PrimaryPort):
         :param args: The CLI args.
         :type args: argparse.args
         """
-        if args.event is not None:
-            event_in_snake_case = self.__class__.camel_to_snake(args.event)
+        # a hook only needs the handler of its event: the daemon, outbox and
+        # workspace modules are imported by the branches using them
+        if args.daemon:
+            from .artifact_daemon import ArtifactDaemon
+            from .artifact_outbox import ArtifactOutbox
+            from .artifact_outbox_drainer import ArtifactOutboxDrainer
 
-            module = import_module(
-                f"pythoneda.shared.artifact.infrastructure.cli.{event_in_snake_case}_cli_handler"
+            daemon = ArtifactDaemon(
+                app, self, args.socket, args.debounce_ms / 1000 or None
             )
-            handler_class = getattr(module, f"{args.event}CliHandler")
-            await handler_class().handle(app, args)
+            if ArtifactOutbox.enabled(args):
+                await asyncio.gather(daemon.serve(), ArtifactOutboxDrainer().run())
+            else:
+                await daemon.serve()
+        elif args.drain_outbox:
+            from .artifact_outbox_drainer import ArtifactOutboxDrainer
+
+            await ArtifactOutboxDrainer().drain()
+        elif args.prune_diff_store:
+            from ..common.artifact_diff_store import ArtifactDiffStore
+
+            evicted = ArtifactDiffStore.instance().prune()
+            ArtifactCli.logger().info(f"Evicted {evicted} diffs")
+        elif args.event is not None and (args.repository_folders or args.workspace):
+            await self.handle_workspace(app, args)
+        elif args.event is not None:
+            await self.handle_event(app, args)
+
+    async def handle_workspace(self, app: PythonEDA, args):
+        """
+        Dispatches the event for every repository in the workspace.
+        The git metadata of all of them is gathered in parallel first, so the
+        handlers find it already cached; then the handlers run concurrently,
+        at most --workers of them at a time.
+        :param app: The PythonEDA instance.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param args: The CLI args.
+        :type args: argparse.args
+        """
+        from .artifact_workspace import ArtifactWorkspace
+        from .git_executor import GitExecutor
+
+        workspace = ArtifactWorkspace(args.repository_folders, args.workspace)
+        folders = workspace.folders()
+        metadata = await asyncio.get_running_loop().run_in_executor(
+            None, workspace.metadata, folders, args.workers
+        )
+        semaphore = asyncio.Semaphore(args.workers or GitExecutor.instance().workers)
+
+        async def handle(folder: str):
+            async with semaphore:
+                try:
+                    await self.handle_event(
+                        app, Namespace(**{**vars(args), "repository_folder": folder})
+                    )
+                except SystemExit:
+                    # e.g. the tag is missing in this repository only
+                    ArtifactCli.logger().error(f"{args.event} failed in {folder}")
+
+        await asyncio.gather(
+            *[handle(folder) for folder in folders if folder in metadata]
+        )
+
+    async def handle_event(self, app: PythonEDA, args):
+        """
+        Dispatches the event specified in given arguments to its CLI handler.
+        :param app: The PythonEDA instance.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param args: The CLI args.
+        :type args: argparse.args
+        """
+        if args.event is not None:
+            handler = ArtifactCliHandlerRegistry.instance().handler(args.event)
+            if handler is None:
+                print(f"No CLI handler for {args.event}")
+                sys.exit(1)
+            await handler.handle(app, args)
 # vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
 # Local Variables:
 # mode: python
@@ -0,0 +1,151 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/artifact_cli_handler_registry.py
+
+This file defines the ArtifactCliHandlerRegistry class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from importlib import import_module
+from importlib.metadata import entry_points
+from pythoneda.shared import BaseObject
+import threading
+from typing import Any, Callable, List
+
+
+class ArtifactCliHandlerRegistry(BaseObject):
+    """
+    Maps event names to the CLI handlers in charge of them.
+
+    Class name: ArtifactCliHandlerRegistry
+
+    Responsibilities:
+        - Know which CLI handler deals with each event, built-in or contributed by other packages.
+        - Import each handler the first time its event is dispatched, and reuse the same instance afterwards.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactCli: Dispatches events through it.
+        - pythoneda.shared.artifact.infrastructure.cli.*CliHandler: The built-in handlers.
+
+    Other packages contribute handlers through the "pythoneda.artifact.cli_handlers"
+    entry point group, naming the entry point after the event, e.g.
+    DockerImageBuilt = "mypackage.cli:DockerImageBuiltCliHandler".
+    Entry points are only listed when the registry is built; they are
+    loaded, like the built-in handlers, the first time they are needed.
+    """
+
+    ENTRY_POINT_GROUP = "pythoneda.artifact.cli_handlers"
+
+    HANDLERS = {
+        "StagedChangesCommitted": ".staged_changes_committed_cli_handler",
+        "CommittedChangesPushed": ".committed_changes_pushed_cli_handler",
+        "CommittedChangesTagged": ".committed_changes_tagged_cli_handler",
+        "TagPushed": ".tag_pushed_cli_handler",
+        "DockerImageRequested": ".docker_image_requested_cli_handler",
+        "DockerImageAvailable": ".docker_image_available_cli_handler",
+        "DockerImagePushed": ".docker_image_pushed_cli_handler",
+    }
+
+    _singleton = None
+
+    def __init__(self):
+        """
+        Creates a new ArtifactCliHandlerRegistry instance.
+        """
+        super().__init__()
+        self._factories = {
+            event: self.__class__._builtin(event, module)
+            for event, module in self.__class__.HANDLERS.items()
+        }
+        for entry_point in entry_points(group=self.__class__.ENTRY_POINT_GROUP):
+            if entry_point.name in self._factories:
+                ArtifactCliHandlerRegistry.logger().warning(
+                    f"{entry_point.value} overrides the CLI handler of {entry_point.name}"
+                )
+            self._factories[entry_point.name] = entry_point.load
+        self._handlers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """
+        Retrieves the shared instance.
+        :return: Such instance.
+        :rtype: pythoneda.shared.artifact.infrastructure.cli.ArtifactCliHandlerRegistry
+        """
+        if cls._singleton is None:
+            cls._singleton = cls()
+        return cls._singleton
+
+    @classmethod
+    def _builtin(cls, event: str, module: str) -> Callable[[], type]:
+        """
+        Builds a function importing a built-in handler class.
+        :param event: The event name.
+        :type event: str
+        :param module: The module defining the handler, relative to this package.
+        :type module: str
+        :return: Such function.
+        :rtype: Callable[[], type]
+        """
+        return lambda: getattr(import_module(module, __package__), f"{event}CliHandler")
+
+    def events(self) -> List[str]:
+        """
+        Retrieves the events with a CLI handler.
+        :return: The event names.
+        :rtype: List[str]
+        """
+        return list(self._factories)
+
+    def register(self, event: str, handler: Any):
+        """
+        Registers the CLI handler of an event, replacing the previous one.
+        :param event: The event name.
+        :type event: str
+        :param handler: The handler.
+        :type handler: Any
+        """
+        with self._lock:
+            self._factories[event] = lambda: type(handler)
+            self._handlers[event] = handler
+
+    def handler(self, event: str) -> Any:
+        """
+        Retrieves the CLI handler of given event.
+        :param event: The event name.
+        :type event: str
+        :return: The handler, or None if the event has none.
+        :rtype: Any
+        """
+        result = self._handlers.get(event)
+        if result is None:
+            factory = self._factories.get(event)
+            if factory is not None:
+                with self._lock:
+                    result = self._handlers.get(event)
+                    if result is None:
+                        result = factory()()
+                        self._handlers[event] = result
+        return result
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,181 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/artifact_commit_debouncer.py
+
+This file defines the ArtifactCommitDebouncer class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from argparse import Namespace
+import asyncio
+import os
+from pythoneda.shared import BaseObject
+from .git_metadata_cache import GitMetadataCache
+import time
+from typing import Callable, Dict
+
+
+class ArtifactCommitDebouncer(BaseObject):
+    """
+    Collapses bursts of post-commit requests of a repository into one.
+
+    Class name: ArtifactCommitDebouncer
+
+    Responsibilities:
+        - Record the commit each StagedChangesCommitted request refers to, as it arrives.
+        - Hold the requests of a repository until it stays quiet for a while.
+        - Hand over a single request with all the commits of the burst, in order.
+        - Hand over a burst before any other request of the same repository, to keep their order.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactDaemon: Feeds the requests, and queues the bursts.
+        - pythoneda.shared.artifact.infrastructure.cli.StagedChangesCommittedCliHandler: Processes the bursts.
+
+    During a rebase, "git am" or a cherry-pick of a series, the post-commit
+    hook fires once per commit. The commit is read from the repository
+    files when each request arrives, without running git, so later commits
+    of the burst can't hide it.
+    """
+
+    EVENT = "StagedChangesCommitted"
+
+    def __init__(self, window: float, enqueue: Callable, maxWindow: float = 10.0):
+        """
+        Creates a new ArtifactCommitDebouncer instance.
+        :param window: How long a repository must stay quiet to end a burst, in seconds.
+        :type window: float
+        :param enqueue: Receives the request of each burst.
+        :type enqueue: Callable
+        :param maxWindow: The longest a burst is held, in seconds.
+        :type maxWindow: float
+        """
+        super().__init__()
+        self._window = window
+        self._enqueue = enqueue
+        self._max_window = maxWindow
+        self._bursts: Dict[str, Dict] = {}
+
+    @property
+    def window(self) -> float:
+        """
+        Retrieves how long a repository must stay quiet to end a burst.
+        :return: Such time, in seconds.
+        :rtype: float
+        """
+        return self._window
+
+    @classmethod
+    def head(cls, folder: str) -> str:
+        """
+        Resolves the HEAD of given repository by reading its files.
+        :param folder: The repository folder.
+        :type folder: str
+        :return: The commit hash, or None if it can't be resolved.
+        :rtype: str
+        """
+        git_folders = GitMetadataCache.git_folders(folder)
+        if not git_folders:
+            return None
+        try:
+            with open(os.path.join(git_folders[0], "HEAD"), "r") as file:
+                value = file.read().strip()
+        except OSError:
+            return None
+        if not value.startswith("ref:"):
+            return value or None
+        ref = value[len("ref:") :].strip()
+        for git_folder in git_folders:
+            try:
+                with open(os.path.join(git_folder, ref), "r") as file:
+                    return file.read().strip() or None
+            except OSError:
+                pass
+        for git_folder in git_folders:
+            try:
+                with open(os.path.join(git_folder, "packed-refs"), "r") as file:
+                    for line in file:
+                        parts = line.split()
+                        if len(parts) == 2 and parts[1] == ref:
+                            return parts[0]
+            except OSError:
+                pass
+        return None
+
+    def add(self, args: Namespace) -> bool:
+        """
+        Takes a request. StagedChangesCommitted requests join the burst of
+        their repository; other requests first flush it.
+        :param args: The parsed request.
+        :type args: argparse.Namespace
+        :return: True if the request joined a burst, False if the caller should process it.
+        :rtype: bool
+        """
+        if not args.repository_folder:
+            return False
+        folder = os.path.realpath(args.repository_folder)
+        if args.event != self.__class__.EVENT:
+            self.flush(folder)
+            return False
+        commit = self.__class__.head(folder)
+        if commit is None:
+            self.flush(folder)
+            return False
+        loop = asyncio.get_running_loop()
+        burst = self._bursts.get(folder)
+        if burst is None:
+            burst = {"args": args, "commits": [], "started": time.monotonic()}
+            self._bursts[folder] = burst
+        else:
+            burst["timer"].cancel()
+        if commit not in burst["commits"]:
+            burst["commits"].append(commit)
+        if time.monotonic() - burst["started"] >= self._max_window:
+            self.flush(folder)
+        else:
+            burst["timer"] = loop.call_later(self.window, self.flush, folder)
+        return True
+
+    def flush(self, folder: str):
+        """
+        Hands over the burst of given repository, if any.
+        :param folder: The real path of the repository folder.
+        :type folder: str
+        """
+        burst = self._bursts.pop(folder, None)
+        if burst is None:
+            return
+        if "timer" in burst:
+            burst["timer"].cancel()
+        if len(burst["commits"]) > 1:
+            ArtifactCommitDebouncer.logger().debug(
+                f"Collapsed {len(burst['commits'])} commits of {folder}"
+            )
+        self._enqueue(Namespace(**{**vars(burst["args"]), "commits": burst["commits"]}))
+
+    def flush_all(self):
+        """
+        Hands over every pending burst.
+        """
+        for folder in list(self._bursts):
+            self.flush(folder)
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,233 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/artifact_daemon.py
+
+This file defines the ArtifactDaemon class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from argparse import ArgumentError, ArgumentParser
+import asyncio
+import json
+import os
+from pythoneda.shared import BaseObject
+from pythoneda.shared.application import PythonEDA
+from .artifact_commit_debouncer import ArtifactCommitDebouncer
+from .artifact_hook_client import ArtifactHookClient
+import socket
+
+
+class ArtifactDaemon(BaseObject):
+    """
+    A long-lived process that keeps the PythonEDA stack and the bus connection warm for git hooks.
+
+    Class name: ArtifactDaemon
+
+    Responsibilities:
+        - Listen to ArtifactHookClient requests on a Unix socket.
+        - Dispatch each request to the CLI handlers, in arrival order.
+        - Optionally collapse bursts of post-commit requests with an ArtifactCommitDebouncer.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactCli: Parses and dispatches the requests.
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactHookClient: Sends the requests.
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactCommitDebouncer: Collapses bursts of commits.
+        - pythoneda.shared.application.PythonEDA: Emits the resulting events.
+    """
+
+    def __init__(
+        self, app: PythonEDA, cli, socketPath: str = None, debounce: float = None
+    ):
+        """
+        Creates a new ArtifactDaemon instance.
+        :param app: The PythonEDA application.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param cli: The CLI that parses and dispatches each request.
+        :type cli: pythoneda.shared.artifact.infrastructure.cli.ArtifactCli
+        :param socketPath: The Unix socket to listen to.
+        :type socketPath: str
+        :param debounce: How long a repository must stay quiet to end a burst of commits, in seconds, or None.
+        :type debounce: float
+        """
+        super().__init__()
+        self._app = app
+        self._cli = cli
+        self._socket_path = socketPath or ArtifactHookClient.default_socket_path()
+        self._queue = asyncio.Queue()
+        self._debouncer = (
+            ArtifactCommitDebouncer(debounce, self._queue.put_nowait)
+            if debounce
+            else None
+        )
+
+    @property
+    def app(self) -> PythonEDA:
+        """
+        Retrieves the PythonEDA application.
+        :return: Such instance.
+        :rtype: pythoneda.shared.application.PythonEDA
+        """
+        return self._app
+
+    @property
+    def cli(self):
+        """
+        Retrieves the CLI used to parse and dispatch requests.
+        :return: Such instance.
+        :rtype: pythoneda.shared.artifact.infrastructure.cli.ArtifactCli
+        """
+        return self._cli
+
+    @property
+    def socket_path(self) -> str:
+        """
+        Retrieves the path of the Unix socket.
+        :return: Such path.
+        :rtype: str
+        """
+        return self._socket_path
+
+    def _already_running(self) -> bool:
+        """
+        Checks whether another daemon is listening to our socket, removing it if it's stale.
+        :return: True in such case.
+        :rtype: bool
+        """
+        result = False
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+                result = True
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+            finally:
+                probe.close()
+        return result
+
+    async def serve(self):
+        """
+        Listens to hook requests until cancelled.
+        """
+        ArtifactHookClient.ensure_socket_folder(self.socket_path)
+        if self._already_running():
+            ArtifactDaemon.logger().info(
+                f"Another daemon is already listening to {self.socket_path}"
+            )
+            return
+
+        worker = asyncio.create_task(self._process_requests())
+        server = await asyncio.start_unix_server(
+            self._accept_connection, path=self.socket_path
+        )
+        os.chmod(self.socket_path, 0o600)
+        ArtifactDaemon.logger().info(f"Listening to {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if self._debouncer is not None:
+                self._debouncer.flush_all()
+            worker.cancel()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def _parse(self, request: dict):
+        """
+        Parses a hook request the same way ArtifactCli parses the command line.
+        Relative paths are resolved against the folder the hook ran in.
+        :param request: The request.
+        :type request: dict
+        :return: The parsed arguments.
+        :rtype: argparse.Namespace
+        """
+        parser = ArgumentParser(exit_on_error=False)
+
+        def reject(message: str):
+            # argparse would print the usage to the daemon's stderr, and exit
+            raise ValueError(f"Invalid arguments: {message}")
+
+        parser.error = reject
+        self.cli.add_arguments(parser)
+        try:
+            result = parser.parse_args(request["argv"])
+        except ArgumentError as error:
+            raise ValueError(f"Invalid arguments: {error}") from error
+        if result.event is None:
+            raise ValueError("-e|--event is mandatory")
+        cwd = request.get("cwd", os.getcwd())
+        for name in ["repository_folder", "image_path"]:
+            value = getattr(result, name, None)
+            if value:
+                setattr(result, name, os.path.join(cwd, value))
+        for name in ["repository_folders", "workspace"]:
+            values = getattr(result, name, None)
+            if values:
+                setattr(result, name, [os.path.join(cwd, value) for value in values])
+        result.daemon = False
+        return result
+
+    async def _accept_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """
+        Reads the requests sent through a client connection.
+        :param reader: The stream to read from.
+        :type reader: asyncio.StreamReader
+        :param writer: The stream to write the responses to.
+        :type writer: asyncio.StreamWriter
+        """
+        try:
+            line = await reader.readline()
+            while line:
+                try:
+                    args = self._parse(json.loads(line))
+                    if self._debouncer is None or not self._debouncer.add(args):
+                        await self._queue.put(args)
+                    response = {"status": "accepted"}
+                except (ValueError, KeyError, TypeError) as error:
+                    response = {"status": "error", "reason": str(error)}
+                writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                await writer.drain()
+                line = await reader.readline()
+        finally:
+            writer.close()
+
+    async def _process_requests(self):
+        """
+        Dispatches the queued requests, one at a time to preserve their order.
+        """
+        while True:
+            args = await self._queue.get()
+            try:
+                if args.repository_folders or args.workspace:
+                    await self.cli.handle_workspace(self.app, args)
+                else:
+                    await self.cli.handle_event(self.app, args)
+            except SystemExit:
+                ArtifactDaemon.logger().error(f"Rejected request: {args}")
+            except Exception as error:
+                ArtifactDaemon.logger().error(f"Error processing {args}: {error}")
+            finally:
+                self._queue.task_done()
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
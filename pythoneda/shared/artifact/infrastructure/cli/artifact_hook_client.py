@@ -0,0 +1,284 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/artifact_hook_client.py
+
+This file defines the ArtifactHookClient class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+import os
+import socket
+import stat
+import sys
+import time
+from typing import List, TextIO
+
+
+class ArtifactHookClient:
+    """
+    A thin git-hook client that forwards its command line to a running ArtifactDaemon.
+
+    Class name: ArtifactHookClient
+
+    Responsibilities:
+        - Forward --event/--repository-folder/--tag to the daemon over a Unix socket.
+        - Start the daemon on first use, if a daemon command is configured.
+        - Turn the ref lines git passes to pre-push hooks into the list of pushed tags.
+        - Refuse socket folders other users could tamper with.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactDaemon: Receives the requests.
+
+    This module only depends on the standard library, so git hooks can run it
+    directly (python artifact_hook_client.py -e TagPushed -r . -t v1.0.0)
+    without importing the PythonEDA stack.
+    """
+
+    SOCKET_ENV_VAR = "PYTHONEDA_ARTIFACT_SOCKET"
+    DAEMON_COMMAND_ENV_VAR = "PYTHONEDA_ARTIFACT_DAEMON_COMMAND"
+    DAEMON_TIMEOUT_ENV_VAR = "PYTHONEDA_ARTIFACT_DAEMON_TIMEOUT"
+
+    EXIT_ACCEPTED = 0
+    EXIT_REJECTED = 1
+    EXIT_UNAVAILABLE = 2
+
+    PRE_PUSH_STDIN_OPTION = "--pre-push-stdin"
+    TAG_PREFIX = "refs/tags/"
+
+    def __init__(
+        self, socketPath: str = None, daemonCommand: str = None, timeout: float = None
+    ):
+        """
+        Creates a new ArtifactHookClient instance.
+        :param socketPath: The Unix socket the daemon listens to.
+        :type socketPath: str
+        :param daemonCommand: The command that starts the daemon, if any.
+        :type daemonCommand: str
+        :param timeout: How long to wait for a freshly-started daemon, in seconds.
+        :type timeout: float
+        """
+        super().__init__()
+        self._socket_path = socketPath or self.__class__.default_socket_path()
+        self._daemon_command = daemonCommand or os.environ.get(
+            self.__class__.DAEMON_COMMAND_ENV_VAR
+        )
+        self._timeout = (
+            timeout
+            if timeout is not None
+            else float(os.environ.get(self.__class__.DAEMON_TIMEOUT_ENV_VAR, "10"))
+        )
+
+    @property
+    def socket_path(self) -> str:
+        """
+        Retrieves the path of the daemon socket.
+        :return: Such path.
+        :rtype: str
+        """
+        return self._socket_path
+
+    @property
+    def daemon_command(self) -> str:
+        """
+        Retrieves the command that starts the daemon.
+        :return: Such command, or None.
+        :rtype: str
+        """
+        return self._daemon_command
+
+    @property
+    def timeout(self) -> float:
+        """
+        Retrieves the time to wait for a freshly-started daemon.
+        :return: Such timeout, in seconds.
+        :rtype: float
+        """
+        return self._timeout
+
+    @classmethod
+    def default_socket_path(cls) -> str:
+        """
+        Retrieves the default location of the daemon socket.
+        :return: The socket path.
+        :rtype: str
+        """
+        result = os.environ.get(cls.SOCKET_ENV_VAR)
+        if not result:
+            runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+            if runtime_dir:
+                result = os.path.join(runtime_dir, "pythoneda", "artifact.sock")
+            else:
+                result = os.path.join(
+                    "/tmp", f"pythoneda-artifact-{os.getuid()}", "artifact.sock"
+                )
+        return result
+
+    @classmethod
+    def socket_folder_problem(cls, folder: str) -> str:
+        """
+        Checks that only the current user can reach the sockets in given folder.
+        It could be in a shared location such as /tmp, where other users
+        could have created it, or replaced it with a symlink, beforehand.
+        :param folder: The folder.
+        :type folder: str
+        :return: Why the folder can't be trusted, or None if it can.
+        :rtype: str
+        """
+        status = os.lstat(folder)
+        if stat.S_ISLNK(status.st_mode):
+            return "it's a symbolic link"
+        if not stat.S_ISDIR(status.st_mode):
+            return "it's not a folder"
+        if status.st_uid != os.getuid():
+            return f"it's owned by uid {status.st_uid}"
+        if status.st_mode & 0o077:
+            return f"its permissions are {oct(stat.S_IMODE(status.st_mode))}"
+        return None
+
+    @classmethod
+    def ensure_socket_folder(cls, socketPath: str):
+        """
+        Creates the folder of given socket if needed, and checks that only
+        the current user can reach it.
+        :param socketPath: The socket path.
+        :type socketPath: str
+        """
+        folder = os.path.dirname(os.path.abspath(socketPath))
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        problem = cls.socket_folder_problem(folder)
+        if problem is not None:
+            raise PermissionError(f"Refusing to use {folder}: {problem}")
+
+    def _connect(self) -> socket.socket:
+        """
+        Connects to the daemon.
+        :return: The connected socket, or None if the daemon is not running.
+        :rtype: socket.socket
+        """
+        result = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            result.connect(self.socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            result.close()
+            result = None
+        return result
+
+    def _start_daemon(self) -> socket.socket:
+        """
+        Starts the daemon in the background, and waits until it accepts connections.
+        :return: The connected socket, or None if the daemon could not be started.
+        :rtype: socket.socket
+        """
+        result = None
+        if self.daemon_command:
+            import shlex
+            import subprocess
+
+            subprocess.Popen(
+                shlex.split(self.daemon_command)
+                + ["--daemon", "--socket", self.socket_path],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            deadline = time.monotonic() + self.timeout
+            while result is None and time.monotonic() < deadline:
+                time.sleep(0.02)
+                result = self._connect()
+        return result
+
+    @classmethod
+    def pre_push_tags(cls, stream: TextIO) -> List[str]:
+        """
+        Retrieves the tags being pushed, from the lines git writes to the
+        standard input of pre-push hooks:
+        "<local ref> <local sha> <remote ref> <remote sha>".
+        :param stream: The standard input of the hook.
+        :type stream: TextIO
+        :return: The tags, in the order git lists them; deleted tags excluded.
+        :rtype: List[str]
+        """
+        result = []
+        for line in stream:
+            parts = line.split()
+            if (
+                len(parts) == 4
+                and parts[0].startswith(cls.TAG_PREFIX)
+                and parts[1].strip("0")
+            ):
+                result.append(parts[0][len(cls.TAG_PREFIX) :])
+        return result
+
+    def send(self, argv: List[str]) -> int:
+        """
+        Forwards given command-line arguments to the daemon. The daemon can't
+        read the hook's standard input, so --pre-push-stdin is replaced with
+        the --tags being pushed.
+        :param argv: The arguments.
+        :type argv: List[str]
+        :return: The exit code for the hook.
+        :rtype: int
+        """
+        if self.__class__.PRE_PUSH_STDIN_OPTION in argv:
+            tags = self.__class__.pre_push_tags(sys.stdin)
+            if not tags:
+                return self.__class__.EXIT_ACCEPTED
+            argv = [
+                arg for arg in argv if arg != self.__class__.PRE_PUSH_STDIN_OPTION
+            ] + ["--tags", *tags]
+        folder = os.path.dirname(os.path.abspath(self.socket_path))
+        try:
+            problem = self.__class__.socket_folder_problem(folder)
+        except FileNotFoundError:
+            # the daemon creates it
+            problem = None
+        if problem is not None:
+            print(f"Refusing to use {folder}: {problem}", file=sys.stderr)
+            return self.__class__.EXIT_UNAVAILABLE
+        connection = self._connect() or self._start_daemon()
+        if connection is None:
+            print(
+                f"pythoneda-artifact daemon not available at {self.socket_path}",
+                file=sys.stderr,
+            )
+            return self.__class__.EXIT_UNAVAILABLE
+
+        with connection:
+            request = {"argv": list(argv), "cwd": os.getcwd()}
+            connection.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            with connection.makefile("rb") as stream:
+                line = stream.readline()
+
+        response = json.loads(line) if line else {"status": "error"}
+        if response.get("status") == "accepted":
+            return self.__class__.EXIT_ACCEPTED
+
+        print(response.get("reason", "Request rejected by daemon"), file=sys.stderr)
+        return self.__class__.EXIT_REJECTED
+
+
+if __name__ == "__main__":
+    sys.exit(ArtifactHookClient().send(sys.argv[1:]))
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,368 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/artifact_outbox.py
+
+This file defines the ArtifactOutbox class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import atexit
+import fcntl
+import json
+import os
+from pythoneda.shared import BaseObject
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Tuple, Union
+
+
+class ArtifactOutbox(BaseObject):
+    """
+    An append-only, segmented local log of events waiting to be emitted.
+
+    Class name: ArtifactOutbox
+
+    Responsibilities:
+        - Append events cheaply, so git hooks don't wait for d-bus.
+        - Sync appended entries to disk in batches, or after a while at the latest.
+        - Let a drainer read the entries in order, and remember how far it got.
+        - Let only one drainer at a time work on it, across processes.
+        - Keep the entries that can't be forwarded in a dead-letter file.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.*CliHandler: Append the events.
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactOutboxDrainer: Reads and forwards them.
+    """
+
+    ENABLED_ENV_VAR = "PYTHONEDA_ARTIFACT_OUTBOX"
+    FOLDER_ENV_VAR = "PYTHONEDA_ARTIFACT_OUTBOX_FOLDER"
+    SEGMENT_PREFIX = "segment-"
+    SEGMENT_SUFFIX = ".log"
+    CURSOR_FILE = "cursor.json"
+    LOCK_FILE = "drain.lock"
+    DEAD_LETTER_FILE = "dead-letter.log"
+
+    _singleton = None
+
+    def __init__(
+        self,
+        folder: str = None,
+        maxSegmentBytes: int = 4 * 1024 * 1024,
+        syncEvery: int = 64,
+        syncInterval: float = 1.0,
+    ):
+        """
+        Creates a new ArtifactOutbox instance.
+        :param folder: The folder of the segments, or None to use the default one.
+        :type folder: str
+        :param maxSegmentBytes: The size after which a new segment is started.
+        :type maxSegmentBytes: int
+        :param syncEvery: The number of appended entries after which they're synced to disk.
+        :type syncEvery: int
+        :param syncInterval: The time after which appended entries are synced to disk, in seconds.
+        :type syncInterval: float
+        """
+        super().__init__()
+        self._folder = folder or self.__class__.default_folder()
+        self._max_segment_bytes = maxSegmentBytes
+        self._sync_every = syncEvery
+        self._sync_interval = syncInterval
+        self._unsynced = []
+        self._last_sync = time.monotonic()
+        self._sync_lock = threading.Lock()
+        self._sync_timer = None
+        self._drain_lock = None
+        atexit.register(self.sync)
+
+    @classmethod
+    def instance(cls):
+        """
+        Retrieves the shared instance.
+        :return: Such instance.
+        :rtype: pythoneda.shared.artifact.infrastructure.cli.ArtifactOutbox
+        """
+        if cls._singleton is None:
+            cls._singleton = cls()
+        return cls._singleton
+
+    @classmethod
+    def enabled(cls, args) -> bool:
+        """
+        Checks whether events should go through the outbox.
+        :param args: The CLI args.
+        :type args: argparse.args
+        :return: True if --outbox was given, or PYTHONEDA_ARTIFACT_OUTBOX is set.
+        :rtype: bool
+        """
+        return bool(getattr(args, "outbox", False)) or os.environ.get(
+            cls.ENABLED_ENV_VAR, ""
+        ).lower() in ("1", "true", "yes")
+
+    @classmethod
+    def default_folder(cls) -> str:
+        """
+        Retrieves the default folder of the outbox.
+        :return: Such folder.
+        :rtype: str
+        """
+        result = os.environ.get(cls.FOLDER_ENV_VAR)
+        if not result:
+            state_home = os.environ.get("XDG_STATE_HOME") or os.path.join(
+                os.path.expanduser("~"), ".local", "state"
+            )
+            result = os.path.join(state_home, "pythoneda", "artifact", "outbox")
+        return result
+
+    @property
+    def folder(self) -> str:
+        """
+        Retrieves the folder of the segments.
+        :return: Such folder.
+        :rtype: str
+        """
+        return self._folder
+
+    def segments(self) -> List[str]:
+        """
+        Retrieves the segment files, oldest first.
+        :return: Their names.
+        :rtype: List[str]
+        """
+        try:
+            names = os.listdir(self.folder)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            name
+            for name in names
+            if name.startswith(self.__class__.SEGMENT_PREFIX)
+            and name.endswith(self.__class__.SEGMENT_SUFFIX)
+        )
+
+    def _current_segment(self) -> str:
+        """
+        Retrieves the segment to append to, starting a new one if the last one is full.
+        :return: Its path.
+        :rtype: str
+        """
+        segments = self.segments()
+        if segments:
+            path = os.path.join(self.folder, segments[-1])
+            if os.path.getsize(path) < self._max_segment_bytes:
+                return path
+        return os.path.join(
+            self.folder,
+            f"{self.__class__.SEGMENT_PREFIX}{time.time_ns():020d}{self.__class__.SEGMENT_SUFFIX}",
+        )
+
+    def append(
+        self, repositoryFolder: str, eventName: str, eventArgs: Union[List, Dict]
+    ):
+        """
+        Appends an event.
+        :param repositoryFolder: The repository the event refers to.
+        :type repositoryFolder: str
+        :param eventName: The event class name, e.g. "TagPushed".
+        :type eventName: str
+        :param eventArgs: The arguments to build the event with, positional or by keyword.
+        :type eventArgs: Union[List, Dict]
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        line = (
+            json.dumps(
+                {
+                    "repository": repositoryFolder,
+                    "event": eventName,
+                    "args": eventArgs,
+                    "time": time.time(),
+                }
+            )
+            + "\n"
+        ).encode("utf-8")
+        descriptor = os.open(
+            self._current_segment(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600
+        )
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX)
+            os.write(descriptor, line)
+            fcntl.flock(descriptor, fcntl.LOCK_UN)
+        except BaseException:
+            os.close(descriptor)
+            raise
+        with self._sync_lock:
+            self._unsynced.append(descriptor)
+            due = (
+                len(self._unsynced) >= self._sync_every
+                or time.monotonic() - self._last_sync >= self._sync_interval
+            )
+            if not due and self._sync_timer is None:
+                # so entries don't stay unsynced if no more appends come
+                self._sync_timer = threading.Timer(self._sync_interval, self.sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+        if due:
+            self.sync()
+
+    def sync(self):
+        """
+        Syncs the appended entries to disk.
+        """
+        with self._sync_lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+            unsynced, self._unsynced = self._unsynced, []
+            self._last_sync = time.monotonic()
+        for descriptor in unsynced:
+            try:
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+
+    def lock(self) -> bool:
+        """
+        Tries to become the only drainer of the outbox, across processes.
+        :return: True if no other drainer holds the lock.
+        :rtype: bool
+        """
+        if self._drain_lock is not None:
+            return False
+        os.makedirs(self.folder, exist_ok=True)
+        descriptor = os.open(
+            os.path.join(self.folder, self.__class__.LOCK_FILE),
+            os.O_RDWR | os.O_CREAT,
+            0o600,
+        )
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(descriptor)
+            return False
+        self._drain_lock = descriptor
+        return True
+
+    def unlock(self):
+        """
+        Releases the lock taken by lock().
+        """
+        descriptor, self._drain_lock = self._drain_lock, None
+        if descriptor is not None:
+            fcntl.flock(descriptor, fcntl.LOCK_UN)
+            os.close(descriptor)
+
+    def dead_letter(self, entry, reason: str):
+        """
+        Keeps an entry that can't be forwarded, so the drainer can move past it.
+        :param entry: The entry, or the raw line if it couldn't be parsed.
+        :type entry: Union[Dict, str]
+        :param reason: Why it can't be forwarded.
+        :type reason: str
+        """
+        ArtifactOutbox.logger().error(
+            f"Dead-lettering outbox entry ({reason}): {entry}"
+        )
+        os.makedirs(self.folder, exist_ok=True)
+        line = (
+            json.dumps({"entry": entry, "reason": reason, "time": time.time()}) + "\n"
+        ).encode("utf-8")
+        descriptor = os.open(
+            os.path.join(self.folder, self.__class__.DEAD_LETTER_FILE),
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            0o600,
+        )
+        try:
+            os.write(descriptor, line)
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def cursor(self) -> Tuple[str, int]:
+        """
+        Retrieves how far the drainer got.
+        :return: The segment name and the offset within it.
+        :rtype: Tuple[str, int]
+        """
+        try:
+            with open(
+                os.path.join(self.folder, self.__class__.CURSOR_FILE), "r"
+            ) as file:
+                data = json.load(file)
+            return data["segment"], data["offset"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return None, 0
+
+    def commit(self, segment: str, offset: int):
+        """
+        Records how far the drainer got, and removes the segments it's done with.
+        :param segment: The segment name.
+        :type segment: str
+        :param offset: The offset within the segment.
+        :type offset: int
+        """
+        descriptor, path = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        with os.fdopen(descriptor, "w") as file:
+            json.dump({"segment": segment, "offset": offset}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path, os.path.join(self.folder, self.__class__.CURSOR_FILE))
+        for name in self.segments():
+            if name >= segment:
+                break
+            os.unlink(os.path.join(self.folder, name))
+
+    def read(self, maxEntries: int = 1000) -> Iterator[Tuple[str, int, Dict]]:
+        """
+        Reads the entries the drainer hasn't forwarded yet, in order.
+        :param maxEntries: The maximum number of entries to read.
+        :type maxEntries: int
+        Corrupt entries are dead-lettered, and come with no content.
+        :return: For each entry, its segment, the offset right after it, and its content.
+        :rtype: Iterator[Tuple[str, int, Dict]]
+        """
+        count = 0
+        current, offset = self.cursor()
+        for name in self.segments():
+            if current is not None and name < current:
+                continue
+            start = offset if name == current else 0
+            with open(os.path.join(self.folder, name), "rb") as file:
+                file.seek(start)
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        # being written right now
+                        return
+                    start += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        entry = None
+                        self.dead_letter(
+                            line.decode("utf-8", errors="replace"),
+                            f"corrupt entry in {name}",
+                        )
+                    yield name, start, entry
+                    count += 1
+                    if count >= maxEntries:
+                        return
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,222 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/artifact_outbox_drainer.py
+
+This file defines the ArtifactOutboxDrainer class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+from importlib import import_module
+from pythoneda.shared import BaseObject, Event
+from .artifact_outbox import ArtifactOutbox
+from typing import Dict, List
+
+
+class ArtifactOutboxDrainer(BaseObject):
+    """
+    Forwards the events in the ArtifactOutbox to d-bus.
+
+    Class name: ArtifactOutboxDrainer
+
+    Responsibilities:
+        - Rebuild the events stored in the outbox.
+        - Emit them, retrying with exponential backoff while d-bus is unavailable.
+        - Keep the order of the events of each repository, while different
+          repositories are forwarded concurrently.
+        - Advance the outbox cursor only once the events are sent.
+        - Dead-letter the entries that can't be forwarded, and move past them.
+        - Make sure only one drainer at a time works on the outbox.
+        - Keep draining, and the daemon running, whatever goes wrong in a round.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactOutbox: Stores the events.
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalEmitter: Emits them.
+
+    Delivery is at-least-once: an event can be emitted again if the drainer
+    dies before advancing the cursor, or if a retried envelope was partially sent.
+    """
+
+    EVENTS_PACKAGE = "pythoneda.shared.artifact.events"
+
+    def __init__(
+        self,
+        outbox: ArtifactOutbox = None,
+        emitter=None,
+        pollInterval: float = 0.5,
+        maxRetryDelay: float = 30.0,
+        maxAttempts: int = None,
+    ):
+        """
+        Creates a new ArtifactOutboxDrainer instance.
+        :param outbox: The outbox, or None for the shared one.
+        :type outbox: pythoneda.shared.artifact.infrastructure.cli.ArtifactOutbox
+        :param emitter: The emitter, or None for a new ArtifactDbusSignalEmitter.
+        :type emitter: pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalEmitter
+        :param pollInterval: How often to check for new entries, in seconds.
+        :type pollInterval: float
+        :param maxRetryDelay: The longest wait between retries, in seconds.
+        :type maxRetryDelay: float
+        :param maxAttempts: The attempts to emit an event before dead-lettering it, or None to keep trying.
+        :type maxAttempts: int
+        """
+        super().__init__()
+        self._outbox = outbox or ArtifactOutbox.instance()
+        if emitter is None:
+            from ..dbus import ArtifactDbusSignalEmitter
+
+            emitter = ArtifactDbusSignalEmitter()
+        self._emitter = emitter
+        self._poll_interval = pollInterval
+        self._max_retry_delay = maxRetryDelay
+        self._max_attempts = maxAttempts
+
+    @property
+    def outbox(self) -> ArtifactOutbox:
+        """
+        Retrieves the outbox.
+        :return: Such outbox.
+        :rtype: pythoneda.shared.artifact.infrastructure.cli.ArtifactOutbox
+        """
+        return self._outbox
+
+    @property
+    def emitter(self):
+        """
+        Retrieves the emitter.
+        :return: Such emitter.
+        :rtype: pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalEmitter
+        """
+        return self._emitter
+
+    @classmethod
+    def event(cls, entry: Dict) -> Event:
+        """
+        Rebuilds the event of given outbox entry.
+        :param entry: The entry.
+        :type entry: Dict
+        :return: The event.
+        :rtype: pythoneda.shared.Event
+        """
+        event_class = getattr(import_module(cls.EVENTS_PACKAGE), entry["event"], None)
+        if event_class is None:
+            raise ValueError(f"Unknown event {entry['event']}")
+        if isinstance(entry["args"], dict):
+            return event_class(**entry["args"])
+        return event_class(*entry["args"])
+
+    async def run(self):
+        """
+        Drains the outbox forever. Errors are logged, and the next round
+        tries again, so they don't bring the daemon down.
+        """
+        while True:
+            try:
+                await self.drain()
+            except Exception as error:
+                ArtifactOutboxDrainer.logger().error(
+                    f"Could not drain the outbox: {error!r}"
+                )
+            await asyncio.sleep(self._poll_interval)
+
+    async def drain(self) -> int:
+        """
+        Forwards the entries in the outbox until it's empty, waiting for
+        any other drainer to finish first.
+        :return: The number of forwarded entries.
+        :rtype: int
+        """
+        while not self.outbox.lock():
+            await asyncio.sleep(self._poll_interval)
+        try:
+            return await self._drain()
+        finally:
+            self.outbox.unlock()
+
+    async def _drain(self) -> int:
+        """
+        Forwards the entries in the outbox until it's empty, once the lock is held.
+        :return: The number of forwarded entries.
+        :rtype: int
+        """
+        result = 0
+        while True:
+            entries = list(self.outbox.read())
+            if not entries:
+                break
+            repositories = {}
+            for _, _, entry in entries:
+                if entry is None:
+                    # corrupt, already dead-lettered by the outbox
+                    continue
+                if not isinstance(entry, dict):
+                    self.outbox.dead_letter(entry, "not an outbox entry")
+                    continue
+                repositories.setdefault(entry.get("repository"), []).append(entry)
+            await asyncio.gather(
+                *[
+                    self._forward(repository, repository_entries)
+                    for repository, repository_entries in repositories.items()
+                ]
+            )
+            segment, offset, _ = entries[-1]
+            self.outbox.commit(segment, offset)
+            result += len(entries)
+        if result:
+            ArtifactOutboxDrainer.logger().debug(
+                f"Forwarded {result} events from the outbox"
+            )
+        return result
+
+    async def _forward(self, repository: str, entries: List[Dict]):
+        """
+        Emits the events of a repository, in order.
+        :param repository: The repository folder.
+        :type repository: str
+        :param entries: Its entries.
+        :type entries: List[Dict]
+        """
+        for entry in entries:
+            try:
+                event = self.__class__.event(entry)
+            except Exception as error:
+                self.outbox.dead_letter(entry, f"cannot rebuild the event: {error!r}")
+                continue
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    await self.emitter.emit(event)
+                    break
+                except Exception as error:
+                    if self._max_attempts is not None and attempt >= self._max_attempts:
+                        self.outbox.dead_letter(
+                            entry, f"cannot emit it after {attempt} attempts: {error!r}"
+                        )
+                        break
+                    delay = min(self._max_retry_delay, 0.1 * 2**attempt)
+                    ArtifactOutboxDrainer.logger().warning(
+                        f"Could not emit {entry['event']} of {repository} ({error}), retrying in {delay}s"
+                    )
+                    await asyncio.sleep(delay)
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
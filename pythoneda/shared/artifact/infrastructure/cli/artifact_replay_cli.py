@@ -0,0 +1,418 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/artifact_replay_cli.py
+
+This file defines the ArtifactReplayCli class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from argparse import ArgumentParser, Namespace
+import asyncio
+import os
+from pythoneda.shared import PrimaryPort
+from pythoneda.shared.application import PythonEDA
+from pythoneda.shared.infrastructure.cli import CliHandler
+from .artifact_cli import ArtifactCli
+from .git_commit_extractor import GitCommitExtractor
+from .git_executor import GitExecutor
+from .git_tag_resolver import GitTagResolver
+import subprocess
+import sys
+import time
+from typing import AsyncIterator, Awaitable, Dict, Iterable, List, Tuple
+
+
+class ArtifactReplayCli(CliHandler, PrimaryPort):
+    """
+    A PrimaryPort to re-emit artifact events for many commits or tags at once.
+
+    Class name: ArtifactReplayCli
+
+    Responsibilities:
+        - Walk a revision range, emitting StagedChangesCommitted events.
+        - Go through a list of tags, emitting CommittedChangesTagged or TagPushed events.
+        - Replay a file of (event, folder, tag) records.
+        - Dispatch everything through the CLI handlers, so events are built,
+          and go through the outbox or the diff store, as in git hooks.
+        - Keep the events of each repository in order, emitting the ones of different repositories concurrently.
+        - Report the throughput, and the failed dispatches, at the end.
+
+    Collaborators:
+        - pythoneda.shared.application.PythonEDA: Emits the events.
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactCli: Dispatches the events to their CLI handlers.
+        - pythoneda.shared.artifact.infrastructure.cli.GitCommitExtractor: Lists the commits in the revision range.
+        - pythoneda.shared.artifact.infrastructure.cli.GitTagResolver: Lists the tags.
+    """
+
+    BATCH_SIZE = 64
+
+    def __init__(self):
+        """
+        Creates a new ArtifactReplayCli.
+        """
+        super().__init__("Replays artifact-related events in batch")
+
+    @classmethod
+    @property
+    def is_one_shot_compatible(cls) -> bool:
+        """
+        Retrieves whether this primary port should be instantiated when
+        "one-shot" behavior is active.
+        It should return False unless the port listens to future messages
+        from outside.
+        :return: True in such case.
+        :rtype: bool
+        """
+        return True
+
+    def add_arguments(self, parser: ArgumentParser):
+        """
+        Defines the specific CLI arguments.
+        :param parser: The parser.
+        :type parser: argparse.ArgumentParser
+        """
+        parser.add_argument(
+            "-r", "--repository-folder", required=False, help="The repository folder"
+        )
+        parser.add_argument(
+            "--replay-rev-range",
+            required=False,
+            help="Emit StagedChangesCommitted for each commit in this range (e.g. v1.0.0..HEAD).",
+        )
+        parser.add_argument(
+            "--replay-tags",
+            required=False,
+            nargs="*",
+            help="Emit --replay-event for these tags, or for all tags if none is given.",
+        )
+        parser.add_argument(
+            "--replay-event",
+            required=False,
+            default="TagPushed",
+            choices=["CommittedChangesTagged", "TagPushed"],
+            help="The type of event to emit for each tag.",
+        )
+        parser.add_argument(
+            "--replay-records",
+            required=False,
+            help='A file with one "event repository-folder [tag]" record per line.',
+        )
+        parser.add_argument(
+            "--replay-concurrency",
+            required=False,
+            type=int,
+            default=8,
+            help="The maximum number of repositories whose events are being emitted at the same time.",
+        )
+        parser.add_argument(
+            "--max-file-diff-bytes",
+            required=False,
+            type=int,
+            help="Replace file diffs bigger than this with their size and sha256 (default: $PYTHONEDA_ARTIFACT_MAX_FILE_DIFF_BYTES, or 1 MiB; 0 keeps them whole).",
+        )
+        parser.add_argument(
+            "--outbox",
+            action="store_true",
+            help="Append events to the local outbox instead of emitting them.",
+        )
+        parser.add_argument(
+            "--diff-store",
+            action="store_true",
+            help="Keep commit diffs in the local diff store; events carry references to them.",
+        )
+
+    async def handle(self, app: PythonEDA, args):
+        """
+        Processes the command specified from the command line.
+        :param app: The PythonEDA instance.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param args: The CLI args.
+        :type args: argparse.args
+        """
+        if (
+            args.replay_rev_range is None
+            and args.replay_tags is None
+            and args.replay_records is None
+        ):
+            return
+
+        if (
+            args.replay_rev_range is not None or args.replay_tags is not None
+        ) and not args.repository_folder:
+            print(f"-r|--repository-folder is mandatory")
+            sys.exit(1)
+
+        cli = ArtifactCli()
+        defaults = ArgumentParser()
+        cli.add_arguments(defaults)
+        start = time.monotonic()
+        count = 0
+        failures = 0
+        sources = []
+        if args.replay_rev_range is not None:
+            sources.append(self._commit_emissions)
+        if args.replay_tags is not None:
+            sources.append(self._tag_emissions)
+        if args.replay_records is not None:
+            sources.append(self._record_emissions)
+        try:
+            for source in sources:
+                emitted, failed = await self._emit_all(
+                    source(cli, app, args, defaults), args.replay_concurrency
+                )
+                count += emitted
+                failures += failed
+        finally:
+            elapsed = time.monotonic() - start
+            rate = count / elapsed if elapsed > 0 else 0
+            print(
+                f"Replayed {count} events in {elapsed:.2f}s ({rate:.1f} events/s), {failures} failed dispatches"
+            )
+
+    @classmethod
+    def record(
+        cls, args, defaults: ArgumentParser, event: str, repositoryFolder: str, **extra
+    ) -> Namespace:
+        """
+        Builds the arguments of a CLI handler, as if they came from a git hook.
+        :param args: The CLI args of the replay.
+        :type args: argparse.args
+        :param defaults: The parser of ArtifactCli, for the arguments not given.
+        :type defaults: argparse.ArgumentParser
+        :param event: The event name.
+        :type event: str
+        :param repositoryFolder: The repository folder.
+        :type repositoryFolder: str
+        :param extra: Other arguments, e.g. tag="v1.0.0".
+        :type extra: Dict
+        :return: The arguments.
+        :rtype: argparse.Namespace
+        """
+        result = defaults.parse_args([])
+        result.event = event
+        result.repository_folder = repositoryFolder
+        result.max_file_diff_bytes = args.max_file_diff_bytes
+        result.outbox = args.outbox
+        result.diff_store = args.diff_store
+        for name, value in extra.items():
+            setattr(result, name, value)
+        return result
+
+    @classmethod
+    def batches(cls, items: List[str]) -> Iterable[List[str]]:
+        """
+        Splits given items into batches of BATCH_SIZE.
+        :param items: The items.
+        :type items: List[str]
+        :return: The batches, in order.
+        :rtype: Iterable[List[str]]
+        """
+        for start in range(0, len(items), cls.BATCH_SIZE):
+            yield items[start : start + cls.BATCH_SIZE]
+
+    async def _commit_emissions(
+        self, cli: ArtifactCli, app: PythonEDA, args, defaults: ArgumentParser
+    ) -> AsyncIterator[Tuple[str, Awaitable]]:
+        """
+        Dispatches the commits in the range to the StagedChangesCommitted
+        handler, in batches it extracts with a single git process each.
+        :param cli: The CLI used to dispatch them.
+        :type cli: pythoneda.shared.artifact.infrastructure.cli.ArtifactCli
+        :param app: The PythonEDA instance.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param args: The CLI args.
+        :type args: argparse.args
+        :param defaults: The parser of ArtifactCli.
+        :type defaults: argparse.ArgumentParser
+        :return: The repository folder and the pending dispatch of each record.
+        :rtype: AsyncIterator[Tuple[str, Awaitable]]
+        """
+        extractor = GitCommitExtractor(
+            args.repository_folder, timeout=GitExecutor.instance().timeout
+        )
+        try:
+            hashes = await asyncio.get_running_loop().run_in_executor(
+                None, extractor.hashes, args.replay_rev_range
+            )
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as error:
+            ArtifactReplayCli.logger().error(
+                f"Cannot list the commits in {args.replay_rev_range}: {error}"
+            )
+            return
+        for batch in self.__class__.batches(hashes):
+            record = self.__class__.record(
+                args,
+                defaults,
+                "StagedChangesCommitted",
+                args.repository_folder,
+                commits=batch,
+            )
+            yield args.repository_folder, self._dispatch(cli, app, record, len(batch))
+
+    async def _tag_emissions(
+        self, cli: ArtifactCli, app: PythonEDA, args, defaults: ArgumentParser
+    ) -> AsyncIterator[Tuple[str, Awaitable]]:
+        """
+        Dispatches the tags to the CommittedChangesTagged or TagPushed handler.
+        TagPushed resolves many tags at once, so it gets them in batches.
+        :param cli: The CLI used to dispatch them.
+        :type cli: pythoneda.shared.artifact.infrastructure.cli.ArtifactCli
+        :param app: The PythonEDA instance.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param args: The CLI args.
+        :type args: argparse.args
+        :param defaults: The parser of ArtifactCli.
+        :type defaults: argparse.ArgumentParser
+        :return: The repository folder and the pending dispatch of each record.
+        :rtype: AsyncIterator[Tuple[str, Awaitable]]
+        """
+        tags = args.replay_tags
+        if not tags:
+            resolver = GitTagResolver(
+                args.repository_folder, GitExecutor.instance().timeout
+            )
+            tags = [
+                tag
+                for tag, _ in await asyncio.get_running_loop().run_in_executor(
+                    None, resolver.tags
+                )
+            ]
+        if args.replay_event == "TagPushed":
+            for batch in self.__class__.batches(tags):
+                record = self.__class__.record(
+                    args, defaults, "TagPushed", args.repository_folder, tags=batch
+                )
+                yield args.repository_folder, self._dispatch(
+                    cli, app, record, len(batch)
+                )
+        else:
+            for tag in tags:
+                record = self.__class__.record(
+                    args, defaults, args.replay_event, args.repository_folder, tag=tag
+                )
+                yield args.repository_folder, self._dispatch(cli, app, record)
+
+    async def _record_emissions(
+        self, cli: ArtifactCli, app: PythonEDA, args, defaults: ArgumentParser
+    ) -> AsyncIterator[Tuple[str, Awaitable]]:
+        """
+        Dispatches each record in the records file to its CLI handler.
+        :param cli: The CLI used to dispatch them.
+        :type cli: pythoneda.shared.artifact.infrastructure.cli.ArtifactCli
+        :param app: The PythonEDA instance.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param args: The CLI args.
+        :type args: argparse.args
+        :param defaults: The parser of ArtifactCli.
+        :type defaults: argparse.ArgumentParser
+        :return: The repository folder and the pending dispatch of each record.
+        :rtype: AsyncIterator[Tuple[str, Awaitable]]
+        """
+        with open(args.replay_records, "r", encoding="utf-8") as records:
+            for line_number, line in enumerate(records, start=1):
+                fields = line.split()
+                if not fields or fields[0].startswith("#"):
+                    continue
+                if len(fields) < 2:
+                    ArtifactReplayCli.logger().warning(
+                        f"{args.replay_records}:{line_number}: missing repository folder"
+                    )
+                    continue
+                record = self.__class__.record(
+                    args,
+                    defaults,
+                    fields[0],
+                    fields[1],
+                    tag=fields[2] if len(fields) > 2 else None,
+                )
+                yield os.path.realpath(fields[1]), self._dispatch(cli, app, record)
+
+    async def _dispatch(
+        self, cli: ArtifactCli, app: PythonEDA, record: Namespace, events: int = 1
+    ) -> Tuple[int, int]:
+        """
+        Dispatches a record, so that an invalid or failing one does not stop the replay.
+        :param cli: The CLI used to dispatch the record.
+        :type cli: pythoneda.shared.artifact.infrastructure.cli.ArtifactCli
+        :param app: The PythonEDA instance.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param record: The record.
+        :type record: argparse.Namespace
+        :param events: The number of events the record stands for.
+        :type events: int
+        :return: The number of events dispatched, and the number of failed dispatches.
+        :rtype: Tuple[int, int]
+        """
+        try:
+            await cli.handle_event(app, record)
+            return events, 0
+        except SystemExit:
+            ArtifactReplayCli.logger().error(f"Rejected record: {record}")
+        except Exception as error:
+            ArtifactReplayCli.logger().error(
+                f"Cannot dispatch record {record}: {error}"
+            )
+        return 0, 1
+
+    async def _emit_all(
+        self, emissions: AsyncIterator[Tuple[str, Awaitable]], concurrency: int
+    ) -> Tuple[int, int]:
+        """
+        Awaits given emissions one after another for each repository, keeping at
+        most `concurrency` repositories in flight.
+        :param emissions: The repository folder and the emission of each record.
+        :type emissions: AsyncIterator[Tuple[str, Awaitable]]
+        :param concurrency: The maximum number of repositories in flight.
+        :type concurrency: int
+        :return: The number of events emitted, and the number of failed dispatches.
+        :rtype: Tuple[int, int]
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        queues: Dict[str, asyncio.Queue] = {}
+        workers = []
+        totals = [0, 0]
+
+        async def emit(queue: asyncio.Queue):
+            while True:
+                emission = await queue.get()
+                if emission is None:
+                    return
+                async with semaphore:
+                    emitted, failed = await emission
+                totals[0] += emitted
+                totals[1] += failed
+
+        try:
+            async for folder, emission in emissions:
+                queue = queues.get(folder)
+                if queue is None:
+                    queue = asyncio.Queue(maxsize=max(1, concurrency))
+                    queues[folder] = queue
+                    workers.append(asyncio.create_task(emit(queue)))
+                await queue.put(emission)
+        finally:
+            for queue in queues.values():
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        return totals[0], totals[1]
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,565 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/artifact_repository_watcher.py
+
+This file defines the ArtifactRepositoryWatcher class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from argparse import ArgumentParser
+import asyncio
+import ctypes
+import ctypes.util
+import os
+from pythoneda.shared import BaseObject
+from pythoneda.shared.application import PythonEDA
+from .git_executor import GitExecutor
+from .git_metadata_cache import GitMetadataCache
+import struct
+import subprocess
+from typing import Dict, List, Tuple
+
+
+class _Inotify:
+    """
+    A minimal binding to Linux's inotify, through libc.
+
+    Class name: _Inotify
+
+    Responsibilities:
+        - Watch folders for the changes git makes to its refs.
+        - Read the pending notifications without blocking.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactRepositoryWatcher: Reacts to the notifications.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = (
+        IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    )
+    HEADER = struct.Struct("iIII")
+
+    def __init__(self):
+        """
+        Creates a new _Inotify instance.
+        """
+        super().__init__()
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        self._descriptor = self._libc.inotify_init1(
+            self.__class__.IN_NONBLOCK | self.__class__.IN_CLOEXEC
+        )
+        if self._descriptor < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    @property
+    def descriptor(self) -> int:
+        """
+        Retrieves the file descriptor to wait on.
+        :return: Such descriptor.
+        :rtype: int
+        """
+        return self._descriptor
+
+    def add(self, path: str) -> int:
+        """
+        Watches given folder.
+        :param path: The folder.
+        :type path: str
+        :return: The watch descriptor.
+        :rtype: int
+        """
+        result = self._libc.inotify_add_watch(
+            self._descriptor, os.fsencode(path), self.__class__.MASK
+        )
+        if result < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return result
+
+    def read(self) -> List[Tuple[int, int, str]]:
+        """
+        Reads the pending notifications.
+        :return: For each one, its watch descriptor, its mask and the file name.
+        :rtype: List[Tuple[int, int, str]]
+        """
+        result = []
+        try:
+            data = os.read(self._descriptor, 64 * 1024)
+        except BlockingIOError:
+            return result
+        offset = 0
+        header = self.__class__.HEADER
+        while offset + header.size <= len(data):
+            watch, mask, _, length = header.unpack_from(data, offset)
+            offset += header.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            result.append((watch, mask, os.fsdecode(name)))
+        return result
+
+    def close(self):
+        """
+        Stops watching.
+        """
+        os.close(self._descriptor)
+
+
+class ArtifactRepositoryWatcher(BaseObject):
+    """
+    Watches repository folders, and emits the events of the commits and tags
+    made in them, without git hooks.
+
+    Class name: ArtifactRepositoryWatcher
+
+    Responsibilities:
+        - Watch HEAD, packed-refs and refs/ of each repository, with inotify (or polling elsewhere).
+        - Read the refs from the repository files when they change, and compare them to the previous ones.
+        - Emit StagedChangesCommitted for new commits on the checked-out branch,
+          CommittedChangesPushed when a remote-tracking branch catches up with it,
+          and CommittedChangesTagged for new tags.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactCli: Dispatches the events to the CLI handlers.
+        - pythoneda.shared.artifact.infrastructure.cli.RepositoryFolderCli: Starts it.
+
+    TagPushed is not emitted: the repository files don't tell which tags a
+    push sent, or whether it succeeded, and guessing from the remote-tracking
+    branches misses tags pushed on their own and reports fetched ones. Tag
+    pushes are reported by the pre-push hook instead
+    (artifact_hook_client.py -e TagPushed -r . --pre-push-stdin), from the
+    refs git itself hands to it. Tags fetched from a remote get reported
+    as new tags, though.
+    A push of the checked-out branch is recognized by
+    refs/remotes/<remote>/<branch> moving onto the branch head, with an
+    "update by push" entry in its reflog (fetches and pulls leave other ones).
+    """
+
+    BRANCH_PREFIX = "refs/heads/"
+    REMOTE_PREFIX = "refs/remotes/"
+    TAG_PREFIX = "refs/tags/"
+
+    def __init__(
+        self,
+        app: PythonEDA,
+        cli,
+        folders: List[str],
+        settle: float = 0.2,
+        pollInterval: float = 2.0,
+    ):
+        """
+        Creates a new ArtifactRepositoryWatcher instance.
+        :param app: The PythonEDA application.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param cli: The CLI that dispatches the events.
+        :type cli: pythoneda.shared.artifact.infrastructure.cli.ArtifactCli
+        :param folders: The repository folders.
+        :type folders: List[str]
+        :param settle: How long a repository must stay quiet before its refs are read, in seconds.
+        :type settle: float
+        :param pollInterval: How often repositories are checked when inotify is not available, in seconds.
+        :type pollInterval: float
+        """
+        super().__init__()
+        self._app = app
+        self._cli = cli
+        self._folders = [os.path.realpath(folder) for folder in folders]
+        self._settle = settle
+        self._poll_interval = pollInterval
+        self._parser = ArgumentParser(exit_on_error=False)
+        cli.add_arguments(self._parser)
+        self._snapshots: Dict[str, Tuple[str, str, Dict[str, str]]] = {}
+        self._timers = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._watches: Dict[int, Tuple[str, str]] = {}
+        self._git_folders: Dict[str, List[str]] = {}
+
+    @property
+    def folders(self) -> List[str]:
+        """
+        Retrieves the watched repository folders.
+        :return: Such folders.
+        :rtype: List[str]
+        """
+        return self._folders
+
+    @classmethod
+    def snapshot(cls, folder: str) -> Tuple[str, str, Dict[str, str]]:
+        """
+        Reads the HEAD and the refs of given repository from its files, without running git.
+        :param folder: The repository folder.
+        :type folder: str
+        :return: The commit HEAD points to, the checked-out branch (or None if detached),
+        and the commit or tag object of each ref.
+        :rtype: Tuple[str, str, Dict[str, str]]
+        """
+        git_folders = GitMetadataCache.git_folders(folder)
+        refs = {}
+        for git_folder in reversed(git_folders):
+            try:
+                with open(os.path.join(git_folder, "packed-refs"), "r") as file:
+                    for line in file:
+                        parts = line.split()
+                        if len(parts) == 2 and not line.startswith(("#", "^")):
+                            refs[parts[1]] = parts[0]
+            except OSError:
+                pass
+        for git_folder in reversed(git_folders):
+            for root, _, files in os.walk(os.path.join(git_folder, "refs")):
+                for name in files:
+                    if name.endswith(".lock"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        with open(path, "r") as file:
+                            value = file.read().strip()
+                    except OSError:
+                        continue
+                    if value and not value.startswith("ref:"):
+                        refs[os.path.relpath(path, git_folder)] = value
+        head = None
+        branch = None
+        if git_folders:
+            try:
+                with open(os.path.join(git_folders[0], "HEAD"), "r") as file:
+                    value = file.read().strip()
+            except OSError:
+                value = ""
+            if value.startswith("ref:"):
+                branch = value[len("ref:") :].strip()
+                head = refs.get(branch)
+            else:
+                head = value or None
+        return head, branch, refs
+
+    @classmethod
+    def pushes(
+        cls,
+        folder: str,
+        head: str,
+        branch: str,
+        oldRefs: Dict[str, str],
+        refs: Dict[str, str],
+    ) -> List[str]:
+        """
+        Finds the remote-tracking branches of the checked-out branch that moved onto
+        its head because of a push, according to their reflogs.
+        :param folder: The repository folder.
+        :type folder: str
+        :param head: The commit HEAD points to.
+        :type head: str
+        :param branch: The checked-out branch, or None if detached.
+        :type branch: str
+        :param oldRefs: The previous refs.
+        :type oldRefs: Dict[str, str]
+        :param refs: The current refs.
+        :type refs: Dict[str, str]
+        :return: Such remote-tracking branches.
+        :rtype: List[str]
+        """
+        result = []
+        if head is None or branch is None or not branch.startswith(cls.BRANCH_PREFIX):
+            return result
+        suffix = f"/{branch[len(cls.BRANCH_PREFIX) :]}"
+        for ref in sorted(refs):
+            if (
+                ref.startswith(cls.REMOTE_PREFIX)
+                and ref.endswith(suffix)
+                and len(ref) > len(cls.REMOTE_PREFIX) + len(suffix)
+                and refs[ref] == head
+                and oldRefs.get(ref) != head
+                and cls._updated_by_push(folder, ref)
+            ):
+                result.append(ref)
+        return result
+
+    @classmethod
+    def _updated_by_push(cls, folder: str, ref: str) -> bool:
+        """
+        Checks whether the last update of given ref was a push, from its reflog.
+        :param folder: The repository folder.
+        :type folder: str
+        :param ref: The ref.
+        :type ref: str
+        :return: True in such case, or if the ref has no reflog.
+        :rtype: bool
+        """
+        for git_folder in GitMetadataCache.git_folders(folder):
+            try:
+                with open(os.path.join(git_folder, "logs", ref), "rb") as file:
+                    lines = file.read().splitlines()
+            except OSError:
+                continue
+            if lines:
+                # <old> <new> <identity> <timestamp> <timezone>\t<message>
+                message = lines[-1].partition(b"\t")[2]
+                return message.startswith(b"update by push")
+        return True
+
+    def _git(self, folder: str, *args: str) -> List[str]:
+        """
+        Runs git in given repository.
+        :param folder: The repository folder.
+        :type folder: str
+        :param args: The git arguments.
+        :type args: List[str]
+        :return: The lines of its output, or none if it failed.
+        :rtype: List[str]
+        """
+        timeout = GitExecutor.instance().timeout
+        try:
+            process = subprocess.run(
+                ["git", *args], cwd=folder, capture_output=True, timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            ArtifactRepositoryWatcher.logger().error(
+                f"git {' '.join(args)} was killed after {timeout} seconds in {folder}"
+            )
+            return []
+        if process.returncode != 0:
+            ArtifactRepositoryWatcher.logger().error(
+                f"git {' '.join(args)} failed in {folder}: {process.stderr.decode('utf-8', errors='replace')}"
+            )
+            return []
+        return process.stdout.decode("utf-8", errors="replace").splitlines()
+
+    async def _emit(self, eventName: str, folder: str, tag: str = None, commits=None):
+        """
+        Dispatches an event to its CLI handler, as if it came from a git hook.
+        :param eventName: The event name, e.g. "CommittedChangesTagged".
+        :type eventName: str
+        :param folder: The repository folder.
+        :type folder: str
+        :param tag: The tag, if any.
+        :type tag: str
+        :param commits: The commits, if any.
+        :type commits: List[str]
+        """
+        argv = ["-e", eventName, "-r", folder] + (["-t", tag] if tag else [])
+        args = self._parser.parse_args(argv)
+        if commits:
+            args.commits = commits
+        try:
+            await self._cli.handle_event(self._app, args)
+        except SystemExit:
+            ArtifactRepositoryWatcher.logger().error(f"Rejected {eventName}: {args}")
+        except Exception as error:
+            ArtifactRepositoryWatcher.logger().error(
+                f"Error processing {eventName} in {folder}: {error}"
+            )
+
+    async def _process(self, folder: str):
+        """
+        Processes the changes of given repository, one batch at a time.
+        :param folder: The repository folder.
+        :type folder: str
+        """
+        async with self._locks.setdefault(folder, asyncio.Lock()):
+            try:
+                await self._compare(folder)
+            except Exception as error:
+                ArtifactRepositoryWatcher.logger().error(
+                    f"Error processing the changes of {folder}: {error}"
+                )
+
+    async def _compare(self, folder: str):
+        """
+        Compares the refs of given repository with the previous ones, and emits the resulting events.
+        :param folder: The repository folder.
+        :type folder: str
+        """
+        executor = GitExecutor.instance()
+        old_head, old_branch, old_refs = self._snapshots[folder]
+        head, branch, refs = self.__class__.snapshot(folder)
+        self._snapshots[folder] = (head, branch, refs)
+
+        pushed = self.__class__.pushes(folder, head, branch, old_refs, refs)
+        known = set(old_refs.values())
+        if (
+            head is not None
+            and head != old_head
+            and branch == old_branch
+            and head not in known
+        ):
+            # a new commit, not a checkout, reset or fast-forward to a known one
+            exclude = [old_head] if old_head else []
+            # commits pushed since the last snapshot are still new
+            exclude.extend(old_refs[ref] for ref in pushed if ref in old_refs)
+            remote_prefix = self.__class__.REMOTE_PREFIX
+            commits = await executor.run(
+                folder,
+                self._git,
+                folder,
+                "rev-list",
+                "--reverse",
+                head,
+                "--not",
+                *exclude,
+                *[f"--exclude={ref[len(remote_prefix) :]}" for ref in pushed],
+                "--remotes",
+            )
+            if commits:
+                await self._emit("StagedChangesCommitted", folder, commits=commits)
+
+        if pushed:
+            await self._emit("CommittedChangesPushed", folder)
+
+        prefix = self.__class__.TAG_PREFIX
+        for ref in sorted(refs):
+            if ref.startswith(prefix) and ref not in old_refs:
+                await self._emit(
+                    "CommittedChangesTagged", folder, tag=ref[len(prefix) :]
+                )
+
+    def _changed(self, folder: str):
+        """
+        Schedules reading the refs of given repository once it stays quiet.
+        :param folder: The repository folder.
+        :type folder: str
+        """
+        timer = self._timers.get(folder)
+        if timer is not None:
+            timer.cancel()
+        self._timers[folder] = asyncio.get_running_loop().call_later(
+            self._settle,
+            lambda: asyncio.ensure_future(self._process(folder)),
+        )
+
+    def _watch_tree(self, inotify: _Inotify, folder: str, path: str):
+        """
+        Watches given folder and its subfolders.
+        :param inotify: The inotify instance.
+        :type inotify: _Inotify
+        :param folder: The repository folder they belong to.
+        :type folder: str
+        :param path: The folder to watch.
+        :type path: str
+        """
+        for root, _, _ in os.walk(path):
+            try:
+                self._watches[inotify.add(root)] = (folder, root)
+            except OSError as error:
+                ArtifactRepositoryWatcher.logger().warning(
+                    f"Cannot watch {root}: {error}"
+                )
+
+    def _on_notifications(self, inotify: _Inotify):
+        """
+        Reacts to the pending inotify notifications.
+        :param inotify: The inotify instance.
+        :type inotify: _Inotify
+        """
+        for watch, mask, name in inotify.read():
+            if mask & _Inotify.IN_Q_OVERFLOW:
+                for folder in self.folders:
+                    self._changed(folder)
+                continue
+            if mask & _Inotify.IN_IGNORED:
+                self._watches.pop(watch, None)
+                continue
+            target = self._watches.get(watch)
+            if target is None or name.endswith(".lock"):
+                continue
+            folder, path = target
+            if path in self._git_folders[folder]:
+                # the git folder itself: only HEAD and packed-refs matter
+                if name in ("HEAD", "packed-refs"):
+                    self._changed(folder)
+                continue
+            if mask & _Inotify.IN_ISDIR and mask & (
+                _Inotify.IN_CREATE | _Inotify.IN_MOVED_TO
+            ):
+                self._watch_tree(inotify, folder, os.path.join(path, name))
+            self._changed(folder)
+
+    async def _watch_inotify(self, inotify: _Inotify):
+        """
+        Watches the repositories with inotify, until cancelled.
+        :param inotify: The inotify instance.
+        :type inotify: _Inotify
+        """
+        for folder in self.folders:
+            git_folders = GitMetadataCache.git_folders(folder)
+            self._git_folders[folder] = git_folders
+            for git_folder in git_folders:
+                self._watches[inotify.add(git_folder)] = (folder, git_folder)
+                self._watch_tree(inotify, folder, os.path.join(git_folder, "refs"))
+        loop = asyncio.get_running_loop()
+        loop.add_reader(inotify.descriptor, self._on_notifications, inotify)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            loop.remove_reader(inotify.descriptor)
+            inotify.close()
+
+    async def _watch_polling(self):
+        """
+        Checks the repositories periodically, until cancelled.
+        """
+        fingerprints = {
+            folder: GitMetadataCache.fingerprint(folder) for folder in self.folders
+        }
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            for folder in self.folders:
+                fingerprint = GitMetadataCache.fingerprint(folder)
+                if fingerprint != fingerprints[folder]:
+                    fingerprints[folder] = fingerprint
+                    await self._process(folder)
+
+    async def watch(self):
+        """
+        Watches the repositories, emitting events as they change, until cancelled.
+        """
+        for folder in self.folders:
+            self._snapshots[folder] = self.__class__.snapshot(folder)
+        try:
+            inotify = _Inotify()
+        except (OSError, AttributeError) as error:
+            ArtifactRepositoryWatcher.logger().info(
+                f"inotify not available ({error}), polling every {self._poll_interval} seconds"
+            )
+            inotify = None
+        ArtifactRepositoryWatcher.logger().info(
+            f"Watching {len(self.folders)} repositories"
+        )
+        if inotify is None:
+            await self._watch_polling()
+        else:
+            await self._watch_inotify(inotify)
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
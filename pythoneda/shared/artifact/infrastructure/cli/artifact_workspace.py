@@ -0,0 +1,184 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/artifact_workspace.py
+
+This file defines the ArtifactWorkspace class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import os
+from pythoneda.shared import BaseObject
+from .git_metadata import GitMetadata
+from .git_metadata_cache import GitMetadataCache
+from typing import Dict, List
+
+
+class ArtifactWorkspace(BaseObject):
+    """
+    A set of repository checkouts the CLI fans out to.
+
+    Class name: ArtifactWorkspace
+
+    Responsibilities:
+        - Find the repositories matching glob patterns or living under workspace roots.
+        - Gather their git metadata in parallel.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactCli: Emits events for each repository.
+        - pythoneda.shared.artifact.infrastructure.cli.GitMetadataCache: Retrieves and caches the metadata.
+    """
+
+    def __init__(
+        self, patterns: List[str] = None, roots: List[str] = None, maxDepth: int = 3
+    ):
+        """
+        Creates a new ArtifactWorkspace instance.
+        :param patterns: Repository folders, or glob patterns matching them.
+        :type patterns: List[str]
+        :param roots: Folders to look for repositories under.
+        :type roots: List[str]
+        :param maxDepth: How deep to look for repositories under each root.
+        :type maxDepth: int
+        """
+        super().__init__()
+        self._patterns = patterns or []
+        self._roots = roots or []
+        self._max_depth = maxDepth
+
+    @property
+    def patterns(self) -> List[str]:
+        """
+        Retrieves the repository folders or glob patterns.
+        :return: Such patterns.
+        :rtype: List[str]
+        """
+        return self._patterns
+
+    @property
+    def roots(self) -> List[str]:
+        """
+        Retrieves the folders to look for repositories under.
+        :return: Such folders.
+        :rtype: List[str]
+        """
+        return self._roots
+
+    @property
+    def max_depth(self) -> int:
+        """
+        Retrieves how deep to look for repositories under each root.
+        :return: Such depth.
+        :rtype: int
+        """
+        return self._max_depth
+
+    @classmethod
+    def is_repository(cls, folder: str) -> bool:
+        """
+        Checks whether given folder is a git checkout.
+        :param folder: The folder.
+        :type folder: str
+        :return: True in such case.
+        :rtype: bool
+        """
+        return os.path.exists(os.path.join(folder, ".git"))
+
+    def _find_under(self, root: str, depth: int) -> List[str]:
+        """
+        Finds the repositories under given folder.
+        :param root: The folder.
+        :type root: str
+        :param depth: The remaining depth.
+        :type depth: int
+        :return: The repository folders.
+        :rtype: List[str]
+        """
+        if self.__class__.is_repository(root):
+            return [root]
+        result = []
+        if depth > 0:
+            try:
+                entries = sorted(
+                    entry.path
+                    for entry in os.scandir(root)
+                    if entry.is_dir(follow_symlinks=False)
+                    and not entry.name.startswith(".")
+                )
+            except OSError:
+                entries = []
+            for entry in entries:
+                result.extend(self._find_under(entry, depth - 1))
+        return result
+
+    def folders(self) -> List[str]:
+        """
+        Retrieves the repository folders of this workspace, without duplicates.
+        :return: Such folders.
+        :rtype: List[str]
+        """
+        candidates = []
+        for pattern in self.patterns:
+            candidates.extend(
+                sorted(glob.glob(os.path.expanduser(pattern))) or [pattern]
+            )
+        for root in self.roots:
+            candidates.extend(
+                self._find_under(os.path.expanduser(root), self.max_depth)
+            )
+
+        result = []
+        seen = set()
+        for folder in candidates:
+            key = os.path.realpath(folder)
+            if key not in seen and self.__class__.is_repository(folder):
+                seen.add(key)
+                result.append(folder)
+        return result
+
+    def metadata(
+        self, folders: List[str], workers: int = None
+    ) -> Dict[str, GitMetadata]:
+        """
+        Retrieves the git metadata of given repositories, in parallel.
+        :param folders: The repository folders.
+        :type folders: List[str]
+        :param workers: The number of threads, or None to use one per core.
+        :type workers: int
+        :return: The metadata of each folder whose metadata could be retrieved.
+        :rtype: Dict[str, pythoneda.shared.artifact.infrastructure.cli.GitMetadata]
+        """
+        result = {}
+        cache = GitMetadataCache.instance()
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = {folder: executor.submit(cache.get, folder) for folder in folders}
+            for folder, future in futures.items():
+                try:
+                    result[folder] = future.result()
+                except Exception as error:
+                    ArtifactWorkspace.logger().error(
+                        f"Cannot read git metadata of {folder}: {error}"
+                    )
+        return result
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
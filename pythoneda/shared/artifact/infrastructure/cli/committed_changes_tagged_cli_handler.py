@@ -22,7 +22,10 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from pythoneda.shared import BaseObject
 from pythoneda.shared.application import PythonEDA
 from pythoneda.shared.artifact.events import CommittedChangesTagged
-from pythoneda.shared.git import GitRepo
+from ..common.artifact_metrics import ArtifactMetrics
+from .artifact_outbox import ArtifactOutbox
+from .git_executor import GitExecutor
+from .git_metadata_cache import GitMetadataCache
 import sys
 
 
@@ -35,9 +38,14 @@ class CommittedChangesTaggedCliHandler(BaseObject):
 
     Responsibilities:
         - Build and emit a CommittedChangesTagged event from the information provided by the CLI.
+        - Append it to the ArtifactOutbox instead, if enabled.
 
     Collaborators:
         - pythoneda.artifact.application.ArtifactApp: Gets notified back to process the CommittedChangesTagged event.
+        - pythoneda.shared.artifact.infrastructure.cli.GitMetadataCache: Provides the repository metadata.
+        - pythoneda.shared.artifact.infrastructure.cli.GitExecutor: Runs git off the event loop.
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactMetrics: Times each stage.
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactOutbox: Stores the event, if enabled.
         - pythoneda.shared.artifact.events.CommittedChangesTagged
     """
 
@@ -59,12 +67,27 @@ class CommittedChangesTaggedCliHandler(BaseObject):
             print(f"-r|--repository-folder is mandatory")
             sys.exit(1)
         else:
-            git_repo = GitRepo.from_folder(args.repository_folder)
-            event = CommittedChangesTagged(
-                args.tag, git_repo.url, git_repo.rev, git_repo.folder
+            metrics = ArtifactMetrics.instance()
+            git_repo = await metrics.measure(
+                "git_metadata",
+                "CommittedChangesTagged",
+                GitExecutor.instance().run(
+                    args.repository_folder,
+                    GitMetadataCache.instance().get,
+                    args.repository_folder,
+                ),
             )
+            with metrics.span("event_build", "CommittedChangesTagged"):
+                event_args = [args.tag, git_repo.url, git_repo.rev, git_repo.folder]
+                event = CommittedChangesTagged(*event_args)
             CommittedChangesTaggedCliHandler.logger().debug(event)
-            await app.emit(event)
+            if ArtifactOutbox.enabled(args):
+                with metrics.span("outbox_append", "CommittedChangesTagged"):
+                    ArtifactOutbox.instance().append(
+                        args.repository_folder, "CommittedChangesTagged", event_args
+                    )
+            else:
+                await metrics.measure("emit", "CommittedChangesTagged", app.emit(event))
 # vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
 # Local Variables:
 # mode: python
@@ -0,0 +1,88 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/docker_image_available_cli_handler.py
+
+This file defines the DockerImageAvailableCliHandler class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from pythoneda.shared.application import PythonEDA
+from pythoneda.shared.artifact.events import DockerImageAvailable
+from .docker_image_cli_handler import DockerImageCliHandler
+from .oci_image_layout import OciImageLayout
+import sys
+
+
+class DockerImageAvailableCliHandler(DockerImageCliHandler):
+
+    """
+    A CLI handler in charge of handling DockerImageAvailable events.
+
+    Class name: DockerImageAvailableCliHandler
+
+    Responsibilities:
+        - Build and emit a DockerImageAvailable event from a locally-built image.
+        - Append it to the ArtifactOutbox instead, if enabled.
+
+    Collaborators:
+        - pythoneda.artifact.application.ArtifactApp: Gets notified back to process the DockerImageAvailable event.
+        - pythoneda.shared.artifact.infrastructure.cli.DockerImageCliHandler: Describes the image, and emits or stores the event.
+        - pythoneda.shared.artifact.events.DockerImageAvailable
+    """
+
+    def __init__(self):
+        """
+        Creates a new DockerImageAvailableCliHandler.
+        """
+        super().__init__()
+
+    async def handle(self, app: PythonEDA, args):
+        """
+        Processes the command specified from the command line.
+        :param app: The PythonEDA application.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param args: The CLI args.
+        :type args: argparse.args
+        """
+        if not args.image_path:
+            print(f"--image-path is mandatory")
+            sys.exit(1)
+        else:
+            description = await self.describe(args, "DockerImageAvailable")
+            name_and_version = OciImageLayout.name_and_version(args.image, description)
+            if name_and_version is None:
+                print(f"--image is mandatory")
+                sys.exit(1)
+            name, version = name_and_version
+            await self.emit(
+                app,
+                args,
+                DockerImageAvailable,
+                {
+                    "imageName": name,
+                    "imageVersion": version,
+                    "imageUrl": description["url"],
+                    "metadata": OciImageLayout.metadata(description),
+                },
+            )
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,112 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/docker_image_cli_handler.py
+
+This file defines the DockerImageCliHandler class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+from pythoneda.shared import BaseObject
+from pythoneda.shared.application import PythonEDA
+from ..common.artifact_metrics import ArtifactMetrics
+from .artifact_outbox import ArtifactOutbox
+from .oci_image_layout import OciImageLayout
+import sys
+from typing import Dict
+
+
+class DockerImageCliHandler(BaseObject):
+
+    """
+    The base of the CLI handlers of Docker image events.
+
+    Class name: DockerImageCliHandler
+
+    Responsibilities:
+        - Describe the local image given in the CLI args.
+        - Emit the event, or append it to the ArtifactOutbox instead, if enabled.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.OciImageLayout: Describes the image.
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactMetrics: Times each stage.
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactOutbox: Stores the event, if enabled.
+    """
+
+    def __init__(self):
+        """
+        Creates a new DockerImageCliHandler.
+        """
+        super().__init__()
+
+    async def describe(self, args, eventName: str) -> Dict:
+        """
+        Describes the image at --image-path, exiting if it cannot be read.
+        :param args: The CLI args.
+        :type args: argparse.args
+        :param eventName: The name of the event, for the metrics.
+        :type eventName: str
+        :return: The description of the image, as in OciImageLayout.describe().
+        :rtype: Dict
+        """
+        layout = OciImageLayout(args.image_path, args.workers)
+        try:
+            return await ArtifactMetrics.instance().measure(
+                "image_digest",
+                eventName,
+                asyncio.get_running_loop().run_in_executor(
+                    None, layout.describe, args.image
+                ),
+            )
+        except (OSError, ValueError, KeyError) as error:
+            print(f"Cannot read {args.image_path}: {error}")
+            sys.exit(1)
+        finally:
+            layout.close()
+
+    async def emit(self, app: PythonEDA, args, eventClass: type, eventArgs: Dict):
+        """
+        Builds the event and emits it, or appends it to the outbox, keyed by the image name.
+        :param app: The PythonEDA application.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param args: The CLI args.
+        :type args: argparse.args
+        :param eventClass: The event class.
+        :type eventClass: type
+        :param eventArgs: The arguments of the event, by keyword.
+        :type eventArgs: Dict
+        """
+        metrics = ArtifactMetrics.instance()
+        event_name = eventClass.__name__
+        with metrics.span("event_build", event_name):
+            event = eventClass(**eventArgs)
+        self.__class__.logger().debug(event)
+        if ArtifactOutbox.enabled(args):
+            with metrics.span("outbox_append", event_name):
+                # the image name, so the events of an image are forwarded in order
+                ArtifactOutbox.instance().append(
+                    eventArgs["imageName"], event_name, eventArgs
+                )
+        else:
+            await metrics.measure("emit", event_name, app.emit(event))
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,86 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/docker_image_requested_cli_handler.py
+
+This file defines the DockerImageRequestedCliHandler class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from pythoneda.shared.application import PythonEDA
+from pythoneda.shared.artifact.events import DockerImageRequested
+from .docker_image_cli_handler import DockerImageCliHandler
+from .oci_image_layout import OciImageLayout
+import sys
+
+
+class DockerImageRequestedCliHandler(DockerImageCliHandler):
+
+    """
+    A CLI handler in charge of handling DockerImageRequested events.
+
+    Class name: DockerImageRequestedCliHandler
+
+    Responsibilities:
+        - Build and emit a DockerImageRequested event, describing the local image it refers to, if any.
+        - Append it to the ArtifactOutbox instead, if enabled.
+
+    Collaborators:
+        - pythoneda.artifact.application.ArtifactApp: Gets notified back to process the DockerImageRequested event.
+        - pythoneda.shared.artifact.infrastructure.cli.DockerImageCliHandler: Describes the image, and emits or stores the event.
+        - pythoneda.shared.artifact.events.DockerImageRequested
+    """
+
+    def __init__(self):
+        """
+        Creates a new DockerImageRequestedCliHandler.
+        """
+        super().__init__()
+
+    async def handle(self, app: PythonEDA, args):
+        """
+        Processes the command specified from the command line.
+        :param app: The PythonEDA application.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param args: The CLI args.
+        :type args: argparse.args
+        """
+        if not args.image:
+            print(f"--image is mandatory")
+            sys.exit(1)
+        else:
+            metadata = {}
+            if args.image_path:
+                description = await self.describe(args, "DockerImageRequested")
+                metadata = OciImageLayout.metadata(description)
+            name, version = OciImageLayout.split_reference(args.image)
+            await self.emit(
+                app,
+                args,
+                DockerImageRequested,
+                {
+                    "imageName": name,
+                    "imageVersion": version,
+                    "metadata": metadata,
+                },
+            )
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
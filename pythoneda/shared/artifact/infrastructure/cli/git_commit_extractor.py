@@ -0,0 +1,359 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/git_commit_extractor.py
+
+This file defines the GitCommitExtractor class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import hashlib
+import os
+from pythoneda.shared import BaseObject
+import subprocess
+import tempfile
+import threading
+from typing import BinaryIO, Iterator, List, Tuple
+
+
+class _DiffSection:
+    """
+    The diff of a single file, as read from git's output.
+
+    Class name: _DiffSection
+
+    Responsibilities:
+        - Accumulate the lines of a file diff, up to a size limit.
+        - Summarize the diff, by size and sha256, once it exceeds the limit.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.GitCommitExtractor: Feeds the lines.
+    """
+
+    def __init__(self, firstLine: bytes, maxBytes: int = None):
+        """
+        Creates a new _DiffSection instance.
+        :param firstLine: The "diff --git" or "diff --cc" line.
+        :type firstLine: bytes
+        :param maxBytes: The maximum size of the diff to keep inline, or None (or 0) for no limit.
+        :type maxBytes: int
+        """
+        super().__init__()
+        self._max_bytes = maxBytes
+        self._header: List[bytes] = [firstLine]
+        self._body: List[bytes] = []
+        self._in_header = True
+        self._size = len(firstLine)
+        self._sha256 = hashlib.sha256(firstLine)
+        self._omitted = False
+
+    def append(self, line: bytes):
+        """
+        Appends a line.
+        :param line: The line.
+        :type line: bytes
+        """
+        if self._in_header and (line.startswith(b"--- ") or line.startswith(b"@@")):
+            self._in_header = False
+        self._size += len(line)
+        self._sha256.update(line)
+        if self._in_header:
+            self._header.append(line)
+        elif not self._omitted:
+            self._body.append(line)
+            if self._max_bytes and self._size > self._max_bytes:
+                self._body = []
+                self._omitted = True
+
+    def text(self) -> str:
+        """
+        Retrieves the diff, or its summary if it was too big.
+        :return: The unidiff text of this file.
+        :rtype: str
+        """
+        if self._omitted:
+            summary = f"# pythoneda: diff omitted ({self._size} bytes, sha256:{self._sha256.hexdigest()})\n"
+            lines = self._header + [summary.encode("utf-8")]
+        else:
+            lines = self._header + self._body
+        return b"".join(lines).decode("utf-8", errors="replace")
+
+
+class GitCommitExtractor(BaseObject):
+    """
+    Retrieves the hash, message and diff of a commit with a single git process.
+
+    Class name: GitCommitExtractor
+
+    Responsibilities:
+        - Run "git show" once, and stream its output into hash, message and unidiff.
+        - Stream whole commit ranges through a single "git log".
+        - List the commits of a range, without their diffs.
+        - Replace oversized file diffs with a summary and content hash.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.StagedChangesCommittedCliHandler: Uses it to build events.
+    """
+
+    COMMIT_MARKER = b"\x01"
+    DIFF_MARKERS = (b"diff --git ", b"diff --cc ", b"diff --combined ")
+    MAX_FILE_DIFF_BYTES_ENV_VAR = "PYTHONEDA_ARTIFACT_MAX_FILE_DIFF_BYTES"
+    DEFAULT_MAX_FILE_DIFF_BYTES = 1 << 20
+
+    def __init__(
+        self, folder: str, maxFileDiffBytes: int = None, timeout: float = None
+    ):
+        """
+        Creates a new GitCommitExtractor instance.
+        :param folder: The repository folder.
+        :type folder: str
+        :param maxFileDiffBytes: The maximum size of a file diff to keep inline, or None to use PYTHONEDA_ARTIFACT_MAX_FILE_DIFF_BYTES (1 MiB by default). 0 disables it.
+        :type maxFileDiffBytes: int
+        :param timeout: The time after which git gets killed, in seconds, or None.
+        :type timeout: float
+        """
+        super().__init__()
+        self._folder = folder
+        self._max_file_diff_bytes = (
+            maxFileDiffBytes
+            if maxFileDiffBytes is not None
+            else int(
+                os.environ.get(
+                    self.__class__.MAX_FILE_DIFF_BYTES_ENV_VAR,
+                    str(self.__class__.DEFAULT_MAX_FILE_DIFF_BYTES),
+                )
+            )
+        )
+        self._timeout = timeout
+
+    @property
+    def folder(self) -> str:
+        """
+        Retrieves the repository folder.
+        :return: Such folder.
+        :rtype: str
+        """
+        return self._folder
+
+    @property
+    def max_file_diff_bytes(self) -> int:
+        """
+        Retrieves the maximum size of a file diff to keep inline.
+        :return: Such size, or 0 if unlimited.
+        :rtype: int
+        """
+        return self._max_file_diff_bytes
+
+    @property
+    def timeout(self) -> float:
+        """
+        Retrieves the time after which git gets killed.
+        :return: Such timeout, in seconds, or None.
+        :rtype: float
+        """
+        return self._timeout
+
+    def latest_commit(self) -> Tuple[str, str, str]:
+        """
+        Retrieves the latest commit.
+        :return: A tuple with the hash, the diff and the message of the commit.
+        :rtype: Tuple[str, str, str]
+        """
+        return self.commit("HEAD")
+
+    def commit(self, rev: str) -> Tuple[str, str, str]:
+        """
+        Retrieves given commit.
+        :param rev: The revision.
+        :type rev: str
+        :return: A tuple with the hash, the diff and the message of the commit.
+        :rtype: Tuple[str, str, str]
+        """
+        commits = list(
+            self._run(
+                [
+                    "git",
+                    "show",
+                    "--no-color",
+                    "--no-ext-diff",
+                    "--format=%x01%H%x00%B%x00",
+                    rev,
+                ]
+            )
+        )
+        return commits[0] if len(commits) == 1 else None
+
+    def commits(self, revRange: str) -> Iterator[Tuple[str, str, str]]:
+        """
+        Retrieves the commits in given range, oldest first, with a single git process.
+        :param revRange: The revision range, as understood by git log.
+        :type revRange: str
+        :return: For each commit, a tuple with its hash, diff and message.
+        :rtype: Iterator[Tuple[str, str, str]]
+        """
+        return self._run(
+            [
+                "git",
+                "log",
+                "--reverse",
+                "--no-color",
+                "--no-ext-diff",
+                "--patch",
+                "--cc",
+                "--format=%x01%H%x00%B%x00",
+                revRange,
+            ]
+        )
+
+    def hashes(self, revRange: str) -> List[str]:
+        """
+        Retrieves the hashes of the commits in given range, oldest first,
+        without their diffs.
+        :param revRange: The revision range, as understood by git rev-list.
+        :type revRange: str
+        :return: The hashes.
+        :rtype: List[str]
+        """
+        command = ["git", "rev-list", "--reverse", revRange]
+        process = subprocess.run(
+            command, cwd=self.folder, capture_output=True, timeout=self.timeout
+        )
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(
+                process.returncode,
+                command,
+                stderr=process.stderr.decode("utf-8", errors="replace"),
+            )
+        return process.stdout.decode("ascii").split()
+
+    def commits_of(self, hashes: List[str]) -> Iterator[Tuple[str, str, str]]:
+        """
+        Retrieves given commits, in the same order, with a single git process.
+        :param hashes: The commit hashes.
+        :type hashes: List[str]
+        :return: For each commit, a tuple with its hash, diff and message.
+        :rtype: Iterator[Tuple[str, str, str]]
+        """
+        return self._run(
+            [
+                "git",
+                "log",
+                "--no-walk=unsorted",
+                "--no-color",
+                "--no-ext-diff",
+                "--patch",
+                "--cc",
+                "--format=%x01%H%x00%B%x00",
+            ]
+            + hashes
+        )
+
+    def _run(self, command: List[str]) -> Iterator[Tuple[str, str, str]]:
+        """
+        Runs given git command, streaming the commits in its output.
+        The last commit is held back until git exits, since a failed or
+        killed git can leave its diff cut short; in such case,
+        subprocess.CalledProcessError is raised instead.
+        :param command: The command.
+        :type command: List[str]
+        :return: For each commit, a tuple with its hash, diff and message.
+        :rtype: Iterator[Tuple[str, str, str]]
+        """
+        with tempfile.TemporaryFile() as errors:
+            process = subprocess.Popen(
+                command, cwd=self.folder, stdout=subprocess.PIPE, stderr=errors
+            )
+            killer = None
+            if self.timeout is not None:
+                killer = threading.Timer(self.timeout, process.kill)
+                killer.start()
+            last = None
+            try:
+                for commit in self._read_commits(process.stdout):
+                    if last is not None:
+                        yield last
+                    last = commit
+            finally:
+                if killer is not None:
+                    killer.cancel()
+                process.stdout.close()
+                return_code = process.wait()
+            if return_code != 0:
+                errors.seek(0)
+                output = errors.read().decode("utf-8", errors="replace")
+                reason = (
+                    f"was killed after {self.timeout} seconds"
+                    if return_code < 0
+                    else "failed"
+                )
+                GitCommitExtractor.logger().error(
+                    f"{' '.join(command)} {reason} in {self.folder}: {output}"
+                )
+                raise subprocess.CalledProcessError(return_code, command, stderr=output)
+        if last is not None:
+            yield last
+
+    def _read_commits(self, stream: BinaryIO) -> Iterator[Tuple[str, str, str]]:
+        """
+        Parses the commits in given git output, one file diff at a time.
+        Each commit starts with a line formatted as %x01%H%x00%B%x00; merges
+        come with combined ("diff --cc") file diffs.
+        :param stream: The output of git.
+        :type stream: BinaryIO
+        :return: For each commit, a tuple with its hash, diff and message.
+        :rtype: Iterator[Tuple[str, str, str]]
+        """
+        header = None
+        hash_value = None
+        message = None
+        files: List[str] = []
+        section = None
+        for line in stream:
+            if line.startswith(self.__class__.COMMIT_MARKER):
+                if hash_value is not None:
+                    if section is not None:
+                        files.append(section.text())
+                    yield hash_value, "".join(files), message
+                header = line[1:]
+                hash_value = None
+                files = []
+                section = None
+            elif header is not None:
+                header += line
+            elif line.startswith(self.__class__.DIFF_MARKERS):
+                if section is not None:
+                    files.append(section.text())
+                section = _DiffSection(line, self.max_file_diff_bytes)
+            elif section is not None:
+                section.append(line)
+
+            if header is not None and header.count(b"\0") >= 2:
+                raw_hash, raw_message, _ = header.split(b"\0", 2)
+                hash_value = raw_hash.decode("ascii")
+                message = raw_message.decode("utf-8", errors="replace").rstrip("\n")
+                header = None
+
+        if hash_value is not None:
+            if section is not None:
+                files.append(section.text())
+            yield hash_value, "".join(files), message
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
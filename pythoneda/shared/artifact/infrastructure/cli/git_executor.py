@@ -0,0 +1,132 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/git_executor.py
+
+This file defines the GitExecutor class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import os
+from pythoneda.shared import BaseObject
+from typing import Any, Callable
+
+
+class GitExecutor(BaseObject):
+    """
+    Runs the blocking git calls of the CLI handlers off the event loop.
+
+    Class name: GitExecutor
+
+    Responsibilities:
+        - Run git calls in a bounded thread pool, so handlers make progress concurrently.
+        - Give up waiting for a repository after a timeout.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.*CliHandler: Run their git calls through it.
+    """
+
+    WORKERS_ENV_VAR = "PYTHONEDA_ARTIFACT_GIT_WORKERS"
+    TIMEOUT_ENV_VAR = "PYTHONEDA_ARTIFACT_GIT_TIMEOUT"
+
+    _singleton = None
+
+    def __init__(self, workers: int = None, timeout: float = None):
+        """
+        Creates a new GitExecutor instance.
+        :param workers: The maximum number of concurrent git calls.
+        :type workers: int
+        :param timeout: How long to wait for each git call, in seconds.
+        :type timeout: float
+        """
+        super().__init__()
+        self._workers = workers or int(
+            os.environ.get(
+                self.__class__.WORKERS_ENV_VAR, str(min(32, (os.cpu_count() or 1) + 4))
+            )
+        )
+        self._timeout = (
+            timeout
+            if timeout is not None
+            else float(os.environ.get(self.__class__.TIMEOUT_ENV_VAR, "60"))
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._workers, thread_name_prefix="git"
+        )
+
+    @classmethod
+    def instance(cls):
+        """
+        Retrieves the shared instance.
+        :return: Such instance.
+        :rtype: pythoneda.shared.artifact.infrastructure.cli.GitExecutor
+        """
+        if cls._singleton is None:
+            cls._singleton = cls()
+        return cls._singleton
+
+    @property
+    def workers(self) -> int:
+        """
+        Retrieves the maximum number of concurrent git calls.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._workers
+
+    @property
+    def timeout(self) -> float:
+        """
+        Retrieves how long to wait for each git call.
+        :return: Such timeout, in seconds.
+        :rtype: float
+        """
+        return self._timeout
+
+    async def run(self, folder: str, function: Callable, *args) -> Any:
+        """
+        Runs given blocking call in the pool.
+        :param folder: The repository folder the call works on, for logging.
+        :type folder: str
+        :param function: The call.
+        :type function: Callable
+        :param args: Its arguments.
+        :type args: List
+        :return: What the call returns.
+        :rtype: Any
+        """
+        try:
+            return await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(
+                    self._executor, partial(function, *args)
+                ),
+                self.timeout,
+            )
+        except asyncio.TimeoutError:
+            GitExecutor.logger().error(
+                f"Gave up on {folder} after {self.timeout} seconds"
+            )
+            raise
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
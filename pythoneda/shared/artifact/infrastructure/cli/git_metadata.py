@@ -0,0 +1,115 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/git_metadata.py
+
+This file defines the GitMetadata class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from typing import Dict
+
+
+class GitMetadata:
+    """
+    The repository information the CLI handlers need to build their events.
+
+    Class name: GitMetadata
+
+    Responsibilities:
+        - Hold the url, rev and folder of a git repository.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.GitMetadataCache: Creates and caches instances.
+    """
+
+    def __init__(self, url: str, rev: str, folder: str):
+        """
+        Creates a new GitMetadata instance.
+        :param url: The url of the repository.
+        :type url: str
+        :param rev: The current revision.
+        :type rev: str
+        :param folder: The repository folder.
+        :type folder: str
+        """
+        super().__init__()
+        self._url = url
+        self._rev = rev
+        self._folder = folder
+
+    @property
+    def url(self) -> str:
+        """
+        Retrieves the url of the repository.
+        :return: Such url.
+        :rtype: str
+        """
+        return self._url
+
+    @property
+    def rev(self) -> str:
+        """
+        Retrieves the current revision.
+        :return: Such revision.
+        :rtype: str
+        """
+        return self._rev
+
+    @property
+    def folder(self) -> str:
+        """
+        Retrieves the repository folder.
+        :return: Such folder.
+        :rtype: str
+        """
+        return self._folder
+
+    def to_dict(self) -> Dict[str, str]:
+        """
+        Converts this instance to a dictionary.
+        :return: Such dictionary.
+        :rtype: Dict[str, str]
+        """
+        return {"url": self.url, "rev": self.rev, "folder": self.folder}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, str]):
+        """
+        Builds an instance from a dictionary.
+        :param data: The dictionary, as returned by to_dict().
+        :type data: Dict[str, str]
+        :return: The new instance.
+        :rtype: pythoneda.shared.artifact.infrastructure.cli.GitMetadata
+        """
+        return cls(data["url"], data["rev"], data["folder"])
+
+    def __repr__(self) -> str:
+        """
+        Provides a textual representation of this instance.
+        :return: Such representation.
+        :rtype: str
+        """
+        return (
+            f"GitMetadata(url={self.url!r}, rev={self.rev!r}, folder={self.folder!r})"
+        )
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
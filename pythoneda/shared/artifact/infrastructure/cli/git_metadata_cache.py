@@ -0,0 +1,309 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/git_metadata_cache.py
+
+This file defines the GitMetadataCache class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import fcntl
+import hashlib
+import json
+import os
+from pythoneda.shared import BaseObject
+from .git_executor import GitExecutor
+from .git_metadata import GitMetadata
+import subprocess
+import tempfile
+import threading
+from typing import Dict, List, Tuple
+
+
+class GitMetadataCache(BaseObject):
+    """
+    A cache of GitMetadata, keyed by repository folder, shared by all CLI handlers.
+
+    Class name: GitMetadataCache
+
+    Responsibilities:
+        - Retrieve the url, rev and folder of a repository without running git when nothing changed.
+        - Invalidate entries when .git/HEAD, .git/config, packed-refs or any ref changes.
+        - Persist entries on disk so one-shot, batch and daemon processes share them.
+        - Read the metadata on cache misses, killing git if it takes too long.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.GitExecutor: Provides the git timeout.
+        - pythoneda.shared.artifact.infrastructure.cli.GitMetadata: The cached values.
+    """
+
+    _singleton = None
+
+    def __init__(self, cacheFile: str = None, timeout: float = None):
+        """
+        Creates a new GitMetadataCache instance.
+        :param cacheFile: The file to persist the cache to, or None to use the default one.
+        :type cacheFile: str
+        :param timeout: The time after which git gets killed, in seconds, or None to use the one of GitExecutor.
+        :type timeout: float
+        """
+        super().__init__()
+        self._cache_file = cacheFile or self.__class__.default_cache_file()
+        self._timeout = (
+            timeout if timeout is not None else GitExecutor.instance().timeout
+        )
+        self._entries = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """
+        Retrieves the shared instance.
+        :return: Such instance.
+        :rtype: pythoneda.shared.artifact.infrastructure.cli.GitMetadataCache
+        """
+        if cls._singleton is None:
+            cls._singleton = cls()
+        return cls._singleton
+
+    @property
+    def cache_file(self) -> str:
+        """
+        Retrieves the file the cache is persisted to.
+        :return: Such file.
+        :rtype: str
+        """
+        return self._cache_file
+
+    @property
+    def timeout(self) -> float:
+        """
+        Retrieves the time after which git gets killed.
+        :return: Such timeout, in seconds.
+        :rtype: float
+        """
+        return self._timeout
+
+    @classmethod
+    def default_cache_file(cls) -> str:
+        """
+        Retrieves the default location of the persisted cache.
+        :return: The path of the cache file.
+        :rtype: str
+        """
+        cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache"
+        )
+        return os.path.join(cache_home, "pythoneda", "artifact", "git-metadata.json")
+
+    @classmethod
+    def git_folders(cls, folder: str) -> List[str]:
+        """
+        Retrieves the git folders of given repository: its own one and, for worktrees, the common one.
+        :param folder: The repository folder.
+        :type folder: str
+        :return: The git folders.
+        :rtype: List[str]
+        """
+        result = []
+        git_folder = os.path.join(folder, ".git")
+        if os.path.isfile(git_folder):
+            with open(git_folder, "r", encoding="utf-8") as file:
+                content = file.read().strip()
+            if content.startswith("gitdir:"):
+                git_folder = os.path.normpath(
+                    os.path.join(folder, content[len("gitdir:") :].strip())
+                )
+        if os.path.isdir(git_folder):
+            result.append(git_folder)
+            common_dir_file = os.path.join(git_folder, "commondir")
+            if os.path.isfile(common_dir_file):
+                with open(common_dir_file, "r", encoding="utf-8") as file:
+                    result.append(
+                        os.path.normpath(os.path.join(git_folder, file.read().strip()))
+                    )
+        return result
+
+    @classmethod
+    def fingerprint(cls, folder: str) -> str:
+        """
+        Computes a fingerprint of the files git updates when HEAD, refs or config change.
+        :param folder: The repository folder.
+        :type folder: str
+        :return: The fingerprint, or None if the folder is not a git repository.
+        :rtype: str
+        """
+        stats: List[Tuple[str, int, int]] = []
+        for git_folder in cls.git_folders(folder):
+            for name in ["HEAD", "config", "packed-refs"]:
+                path = os.path.join(git_folder, name)
+                try:
+                    stat = os.stat(path)
+                    stats.append((path, stat.st_mtime_ns, stat.st_size))
+                except FileNotFoundError:
+                    pass
+            for root, folders, files in os.walk(os.path.join(git_folder, "refs")):
+                stat = os.stat(root)
+                stats.append((root, stat.st_mtime_ns, stat.st_size))
+                for name in files:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                        stats.append((path, stat.st_mtime_ns, stat.st_size))
+                    except FileNotFoundError:
+                        pass
+        if not stats:
+            return None
+        return hashlib.sha1(repr(sorted(stats)).encode("utf-8")).hexdigest()
+
+    def _read(self) -> Dict[str, Dict]:
+        """
+        Reads the persisted entries.
+        :return: The entries, or an empty dictionary if there are none.
+        :rtype: Dict[str, Dict]
+        """
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _load(self) -> Dict[str, Dict]:
+        """
+        Loads the persisted entries, if any.
+        :return: The entries.
+        :rtype: Dict[str, Dict]
+        """
+        if self._entries is None:
+            self._entries = self._read()
+        return self._entries
+
+    def _save(self, key: str):
+        """
+        Persists the entry of given repository atomically, merged with the
+        entries other processes persisted since this one loaded them.
+        :param key: The repository key.
+        :type key: str
+        """
+        folder = os.path.dirname(self.cache_file)
+        try:
+            os.makedirs(folder, exist_ok=True)
+            with open(f"{self.cache_file}.lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                entries = self._read()
+                if key in self._entries:
+                    entries[key] = self._entries[key]
+                else:
+                    entries.pop(key, None)
+                descriptor, path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+                with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                    json.dump(entries, file)
+                os.replace(path, self.cache_file)
+            self._entries = entries
+        except OSError as error:
+            GitMetadataCache.logger().warning(
+                f"Could not persist {self.cache_file}: {error}"
+            )
+
+    def _git(self, folder: str, *args: str) -> subprocess.CompletedProcess:
+        """
+        Runs git in given repository, killing it after the timeout.
+        :param folder: The repository folder.
+        :type folder: str
+        :param args: The git arguments.
+        :type args: List[str]
+        :return: The finished process.
+        :rtype: subprocess.CompletedProcess
+        """
+        try:
+            return subprocess.run(
+                ["git", *args],
+                cwd=folder,
+                capture_output=True,
+                text=True,
+                timeout=self.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            GitMetadataCache.logger().error(
+                f"git {' '.join(args)} was killed after {self.timeout} seconds in {folder}"
+            )
+            raise
+
+    def read(self, folder: str) -> GitMetadata:
+        """
+        Reads the metadata of given repository with git, bypassing the cache.
+        :param folder: The repository folder.
+        :type folder: str
+        :return: The metadata.
+        :rtype: pythoneda.shared.artifact.infrastructure.cli.GitMetadata
+        """
+        branch = self._git(folder, "rev-parse", "--abbrev-ref", "HEAD")
+        if branch.returncode != 0:
+            raise subprocess.CalledProcessError(
+                branch.returncode, branch.args, stderr=branch.stderr
+            )
+        # repositories without an origin remote have no url
+        url = self._git(folder, "config", "--get", "remote.origin.url")
+        return GitMetadata(url.stdout.strip() or None, branch.stdout.strip(), folder)
+
+    def get(self, folder: str) -> GitMetadata:
+        """
+        Retrieves the metadata of given repository, running git only if it changed.
+        The folder of the metadata is always the one given.
+        :param folder: The repository folder.
+        :type folder: str
+        :return: The metadata.
+        :rtype: pythoneda.shared.artifact.infrastructure.cli.GitMetadata
+        """
+        key = os.path.realpath(folder)
+        fingerprint = self.__class__.fingerprint(key)
+        with self._lock:
+            entry = self._load().get(key)
+            if (
+                fingerprint is not None
+                and entry is not None
+                and entry.get("fingerprint") == fingerprint
+            ):
+                # the entry may come from another spelling of the folder, e.g. "."
+                return GitMetadata.from_dict({**entry["metadata"], "folder": folder})
+
+        result = self.read(folder)
+        if fingerprint is not None:
+            with self._lock:
+                self._load()[key] = {
+                    "fingerprint": fingerprint,
+                    "metadata": result.to_dict(),
+                }
+                self._save(key)
+        return result
+
+    def invalidate(self, folder: str):
+        """
+        Discards the cached metadata of given repository.
+        :param folder: The repository folder.
+        :type folder: str
+        """
+        key = os.path.realpath(folder)
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                self._save(key)
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
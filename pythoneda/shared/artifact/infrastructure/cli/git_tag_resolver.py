@@ -0,0 +1,265 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/git_tag_resolver.py
+
+This file defines the GitTagResolver class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+from pythoneda.shared import BaseObject
+from .git_metadata_cache import GitMetadataCache
+import subprocess
+from typing import List, Tuple
+import zlib
+
+
+class GitTagResolver(BaseObject):
+    """
+    Resolves tags to the commits they point to, without computing any diff.
+
+    Class name: GitTagResolver
+
+    Responsibilities:
+        - Resolve many tags with a single "git for-each-ref".
+        - Resolve a single tag from the repository files, running "git rev-parse" only as a fallback.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactReplayCli: Uses it to list the tags to replay.
+        - pythoneda.shared.artifact.infrastructure.cli.TagPushedCliHandler: Uses it to find the commit of the pushed tag.
+        - pythoneda.shared.artifact.infrastructure.cli.GitMetadataCache: Locates the git folders.
+    """
+
+    def __init__(self, folder: str, timeout: float = None):
+        """
+        Creates a new GitTagResolver instance.
+        :param folder: The repository folder.
+        :type folder: str
+        :param timeout: The time after which git gets killed, in seconds, or None.
+        :type timeout: float
+        """
+        super().__init__()
+        self._folder = folder
+        self._timeout = timeout
+
+    @property
+    def folder(self) -> str:
+        """
+        Retrieves the repository folder.
+        :return: Such folder.
+        :rtype: str
+        """
+        return self._folder
+
+    @property
+    def timeout(self) -> float:
+        """
+        Retrieves the time after which git gets killed.
+        :return: Such timeout, in seconds, or None.
+        :rtype: float
+        """
+        return self._timeout
+
+    def _packed(self, gitFolder: str, ref: str) -> Tuple[str, bool]:
+        """
+        Looks up given ref in the packed-refs file of given git folder.
+        :param gitFolder: The git folder.
+        :type gitFolder: str
+        :param ref: The ref, e.g. "refs/tags/1.0.0".
+        :type ref: str
+        :return: The commit, and whether it's known to be one; or None if it's not there.
+        :rtype: Tuple[str, bool]
+        """
+        try:
+            with open(os.path.join(gitFolder, "packed-refs"), "r") as file:
+                peeled = False
+                found = None
+                for line in file:
+                    if line.startswith("#"):
+                        peeled = (
+                            "fully-peeled" in line.split() or "peeled" in line.split()
+                        )
+                    elif found is not None:
+                        if line.startswith("^"):
+                            return line[1:].strip(), True
+                        return found, peeled
+                    else:
+                        parts = line.split()
+                        if len(parts) == 2 and parts[1] == ref:
+                            found = parts[0]
+                if found is not None:
+                    return found, peeled
+        except OSError:
+            pass
+        return None
+
+    def _loose_object_type(self, gitFolders: List[str], sha: str) -> Tuple[str, str]:
+        """
+        Reads the header of given loose object.
+        :param gitFolders: The git folders.
+        :type gitFolders: List[str]
+        :param sha: The object hash.
+        :type sha: str
+        :return: Its type and, for tags, the object they point to; or None if it's not loose.
+        :rtype: Tuple[str, str]
+        """
+        for git_folder in gitFolders:
+            path = os.path.join(git_folder, "objects", sha[:2], sha[2:])
+            try:
+                with open(path, "rb") as file:
+                    decompressor = zlib.decompressobj()
+                    data = decompressor.decompress(file.read(512), 256)
+            except (OSError, zlib.error):
+                continue
+            object_type = data.split(b" ", 1)[0].decode("ascii", errors="replace")
+            target = None
+            if object_type == "tag":
+                body = data.split(b"\0", 1)[-1]
+                if body.startswith(b"object "):
+                    target = body[len("object ") :].split(b"\n", 1)[0].decode("ascii")
+            return object_type, target
+        return None
+
+    def resolve(self, name: str) -> str:
+        """
+        Retrieves the commit given tag points to, without computing any diff.
+        Lightweight tags, packed tags and loose annotated tags are read from the
+        repository files; "git rev-parse" is run only for the rest.
+        :param name: The tag name.
+        :type name: str
+        :return: The commit hash, or None if the tag doesn't exist.
+        :rtype: str
+        """
+        ref = f"refs/tags/{name}"
+        git_folders = GitMetadataCache.git_folders(self.folder)
+        target = None
+        for git_folder in git_folders:
+            try:
+                with open(os.path.join(git_folder, ref), "r") as file:
+                    target = file.read().strip() or None
+                break
+            except OSError:
+                pass
+        if target is None:
+            for git_folder in git_folders:
+                packed = self._packed(git_folder, ref)
+                if packed is not None:
+                    target, peeled = packed
+                    if peeled:
+                        return target
+                    break
+        if target is not None:
+            # annotated tags can point to other tags, so peel until a commit
+            for _ in range(8):
+                loose = self._loose_object_type(git_folders, target)
+                if loose is None:
+                    break
+                object_type, tagged = loose
+                if object_type == "commit":
+                    return target
+                if object_type != "tag" or tagged is None:
+                    return None
+                target = tagged
+        return self._rev_parse(f"{ref}^{{commit}}")
+
+    def _rev_parse(self, rev: str) -> str:
+        """
+        Resolves given revision with "git rev-parse".
+        :param rev: The revision.
+        :type rev: str
+        :return: The object hash, or None if it can't be resolved.
+        :rtype: str
+        """
+        try:
+            process = subprocess.run(
+                ["git", "rev-parse", "--verify", "--quiet", rev],
+                cwd=self.folder,
+                capture_output=True,
+                timeout=self.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            GitTagResolver.logger().error(
+                f"git rev-parse timed out in {self.folder} after {self.timeout} seconds"
+            )
+            return None
+        if process.returncode != 0:
+            return None
+        return process.stdout.decode("ascii", errors="replace").strip() or None
+
+    def tags(self, names: List[str] = None) -> List[Tuple[str, str]]:
+        """
+        Retrieves the commits of given tags, or of all tags if none is given.
+        Annotated tags are peeled to the commit they point to, even through
+        other tags; tags not pointing to a commit are left out.
+        :param names: The tag names.
+        :type names: List[str]
+        :return: A list of (tag, commit hash) tuples, in the order of the names if given.
+        :rtype: List[Tuple[str, str]]
+        """
+        refs = [f"refs/tags/{name}" for name in names] if names else ["refs/tags"]
+        try:
+            process = subprocess.run(
+                [
+                    "git",
+                    "for-each-ref",
+                    "--format=%(refname:strip=2)%00%(objectname)%00%(objecttype)%00%(*objectname)%00%(*objecttype)",
+                ]
+                + refs,
+                cwd=self.folder,
+                capture_output=True,
+                timeout=self.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            GitTagResolver.logger().error(
+                f"git for-each-ref timed out in {self.folder} after {self.timeout} seconds"
+            )
+            return []
+        if process.returncode != 0:
+            GitTagResolver.logger().error(
+                f"git for-each-ref failed in {self.folder}: {process.stderr.decode('utf-8', errors='replace')}"
+            )
+            return []
+
+        commits = {}
+        for line in process.stdout.decode("utf-8", errors="replace").splitlines():
+            tag, target, target_type, peeled, peeled_type = line.split("\0")
+            if target_type == "commit":
+                commits[tag] = target
+            elif peeled_type == "commit":
+                commits[tag] = peeled
+            else:
+                # %(*objectname) peels a single level: tags of tags, or of
+                # anything but commits, go through "git rev-parse"
+                commit = self._rev_parse(f"refs/tags/{tag}^{{commit}}")
+                if commit is not None:
+                    commits[tag] = commit
+
+        if not names:
+            return list(commits.items())
+        for name in names:
+            if name not in commits:
+                GitTagResolver.logger().warning(
+                    f"Tag {name} not found in {self.folder}"
+                )
+        return [(name, commits[name]) for name in names if name in commits]
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,411 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/cli/oci_image_layout.py
+
+This file defines the OciImageLayout class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import io
+import json
+import mmap
+import os
+from pythoneda.shared import BaseObject
+import tarfile
+from typing import Dict, List, Tuple
+
+
+class OciImageLayout(BaseObject):
+    """
+    A container image stored locally, as an OCI image layout or as a tarball.
+
+    Class name: OciImageLayout
+
+    Responsibilities:
+        - Read OCI image layouts, either folders or tarballs, and "docker save" tarballs.
+        - Find the manifest, config and layers of the image, without any registry.
+        - Compute the digests and sizes of the layers in parallel, hashing memory-mapped files.
+        - Check that the computed digests match the declared ones.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.DockerImageAvailableCliHandler: Describes the built image.
+        - pythoneda.shared.artifact.infrastructure.cli.DockerImagePushedCliHandler: Describes the pushed image.
+        - pythoneda.shared.artifact.infrastructure.cli.DockerImageRequestedCliHandler: Describes the requested image.
+
+    Hashing a large buffer releases the GIL, so threads hash layers in
+    parallel. Uncompressed tarballs are memory-mapped once, and each
+    layer is hashed in place. Compressed tarballs can only be read
+    sequentially, so their layers are streamed one after the other.
+    """
+
+    INDEX_MEDIA_TYPES = [
+        "application/vnd.oci.image.index.v1+json",
+        "application/vnd.docker.distribution.manifest.list.v2+json",
+    ]
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, path: str, workers: int = None):
+        """
+        Creates a new OciImageLayout instance.
+        :param path: The layout folder, or the tarball.
+        :type path: str
+        :param workers: The number of threads hashing layers (one per core by default).
+        :type workers: int
+        """
+        super().__init__()
+        self._path = path
+        self._workers = workers or os.cpu_count() or 1
+        self._tar = None
+        self._members = None
+
+    @property
+    def path(self) -> str:
+        """
+        Retrieves the layout folder, or the tarball.
+        :return: Such path.
+        :rtype: str
+        """
+        return self._path
+
+    @property
+    def workers(self) -> int:
+        """
+        Retrieves the number of threads hashing layers.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._workers
+
+    @classmethod
+    def split_reference(cls, reference: str) -> Tuple[str, str]:
+        """
+        Splits an image reference into its name and version.
+        :param reference: The reference, e.g. "registry:5000/pythoneda/artifact:0.0.1".
+        :type reference: str
+        :return: The name and the version ("latest" if there is none).
+        :rtype: Tuple[str, str]
+        """
+        name = reference.split("@", 1)[0]
+        slash = name.rfind("/")
+        colon = name.rfind(":")
+        if colon > slash:
+            return name[:colon], name[colon + 1 :]
+        return name, "latest"
+
+    def _tarball(self) -> tarfile.TarFile:
+        """
+        Opens the tarball, once.
+        :return: The tarball.
+        :rtype: tarfile.TarFile
+        """
+        if self._tar is None:
+            try:
+                self._tar = tarfile.open(self.path, "r:*")
+            except tarfile.TarError as error:
+                raise ValueError(f"{self.path} is not a tarball: {error}")
+            self._members = {
+                os.path.normpath(member.name): member
+                for member in self._tar.getmembers()
+                if member.isfile()
+            }
+        return self._tar
+
+    @property
+    def compressed(self) -> bool:
+        """
+        Checks whether the image is a compressed tarball.
+        :return: True in such case.
+        :rtype: bool
+        """
+        if os.path.isdir(self.path):
+            return False
+        return not isinstance(self._tarball().fileobj, io.BufferedReader)
+
+    def exists(self, name: str) -> bool:
+        """
+        Checks whether given file is part of the image.
+        :param name: The file, relative to the layout.
+        :type name: str
+        :return: True in such case.
+        :rtype: bool
+        """
+        if os.path.isdir(self.path):
+            return os.path.isfile(os.path.join(self.path, name))
+        self._tarball()
+        return os.path.normpath(name) in self._members
+
+    def read(self, name: str) -> bytes:
+        """
+        Reads given file of the image.
+        :param name: The file, relative to the layout.
+        :type name: str
+        :return: Its contents.
+        :rtype: bytes
+        """
+        if os.path.isdir(self.path):
+            with open(os.path.join(self.path, name), "rb") as file:
+                return file.read()
+        tar = self._tarball()
+        member = self._members.get(os.path.normpath(name))
+        if member is None:
+            raise ValueError(f"{name} not found in {self.path}")
+        with tar.extractfile(member) as file:
+            return file.read()
+
+    @classmethod
+    def blob_name(cls, digest: str) -> str:
+        """
+        Retrieves the file of given blob, relative to the layout.
+        :param digest: The digest, e.g. "sha256:...".
+        :type digest: str
+        :return: The file name.
+        :rtype: str
+        """
+        algorithm, value = digest.split(":", 1)
+        return os.path.join("blobs", algorithm, value)
+
+    def _manifest_descriptor(self, reference: str = None) -> Dict:
+        """
+        Finds the descriptor of the image manifest in the OCI index.
+        :param reference: The image reference or version to pick, if the index lists several.
+        :type reference: str
+        :return: The descriptor.
+        :rtype: Dict
+        """
+        index = json.loads(self.read("index.json"))
+        while True:
+            manifests = index.get("manifests", [])
+            if not manifests:
+                raise ValueError(f"No image manifest in {self.path}")
+            result = manifests[0]
+            if reference is not None:
+                for descriptor in manifests:
+                    name = descriptor.get("annotations", {}).get(
+                        "org.opencontainers.image.ref.name"
+                    )
+                    if name in (
+                        reference,
+                        self.__class__.split_reference(reference)[1],
+                    ):
+                        result = descriptor
+                        break
+            if result.get("mediaType") not in self.__class__.INDEX_MEDIA_TYPES:
+                return result
+            # a multi-platform image: describe its first platform
+            index = json.loads(self.read(self.__class__.blob_name(result["digest"])))
+
+    def describe(self, reference: str = None) -> Dict:
+        """
+        Describes the image, computing and checking the digests of its layers.
+        :param reference: The image reference or version to pick, if there are several.
+        :type reference: str
+        :return: The digest, size, config, tags, layers (digest and size) and url of the image.
+        :rtype: Dict
+        """
+        if self.exists("index.json"):
+            descriptor = self._manifest_descriptor(reference)
+            manifest = json.loads(
+                self.read(self.__class__.blob_name(descriptor["digest"]))
+            )
+            layers = [
+                (layer["digest"], self.__class__.blob_name(layer["digest"]))
+                for layer in manifest.get("layers", [])
+            ]
+            digest = descriptor["digest"]
+            config = manifest["config"]["digest"]
+            name = descriptor.get("annotations", {}).get(
+                "org.opencontainers.image.ref.name"
+            )
+            tags = [name] if name else []
+        elif self.exists("manifest.json"):
+            # "docker save" tarballs
+            manifest = json.loads(self.read("manifest.json"))[0]
+            layers = [(None, layer) for layer in manifest.get("Layers", [])]
+            config_data = self.read(manifest["Config"])
+            config = f"sha256:{hashlib.sha256(config_data).hexdigest()}"
+            digest = config
+            tags = manifest.get("RepoTags") or []
+        else:
+            raise ValueError(f"{self.path} is not an OCI image layout nor a tarball")
+
+        computed = self.digests([name for _, name in layers])
+        result_layers = []
+        for (expected, name), (actual, size) in zip(layers, computed):
+            if expected is not None and expected != actual:
+                raise ValueError(f"Layer {name} has digest {actual}, not {expected}")
+            result_layers.append((actual, size))
+        return {
+            "digest": digest,
+            "config": config,
+            "size": sum(size for _, size in result_layers),
+            "tags": tags,
+            "layers": result_layers,
+            "url": self.url,
+        }
+
+    @property
+    def url(self) -> str:
+        """
+        Retrieves the location of the image, using the transports of skopeo and podman.
+        :return: Such location, e.g. "oci-archive:/tmp/image.tar".
+        :rtype: str
+        """
+        if os.path.isdir(self.path):
+            return f"oci:{self.path}"
+        if self.exists("index.json"):
+            return f"oci-archive:{self.path}"
+        return f"docker-archive:{self.path}"
+
+    @classmethod
+    def metadata(cls, description: Dict) -> Dict[str, str]:
+        """
+        Flattens the description of an image, to be attached to events.
+        :param description: The description, as returned by describe().
+        :type description: Dict
+        :return: The digest, config, size and layers of the image.
+        :rtype: Dict[str, str]
+        """
+        return {
+            "digest": description["digest"],
+            "config": description["config"],
+            "size": str(description["size"]),
+            "layers": ",".join(
+                f"{digest}/{size}" for digest, size in description["layers"]
+            ),
+        }
+
+    @classmethod
+    def name_and_version(cls, reference: str, description: Dict) -> Tuple[str, str]:
+        """
+        Retrieves the name and version of the image.
+        :param reference: The image reference given explicitly, if any.
+        :type reference: str
+        :param description: The description, as returned by describe().
+        :type description: Dict
+        :return: The name and the version, or None if the image is not named.
+        :rtype: Tuple[str, str]
+        """
+        if reference:
+            return cls.split_reference(reference)
+        for tag in description["tags"]:
+            # OCI layouts usually annotate just the version
+            if "/" in tag or ":" in tag:
+                return cls.split_reference(tag)
+        return None
+
+    def digests(self, names: List[str]) -> List[Tuple[str, int]]:
+        """
+        Computes the sha256 digest and size of given files, in parallel.
+        :param names: The files, relative to the layout.
+        :type names: List[str]
+        :return: For each file, its digest and size.
+        :rtype: List[Tuple[str, int]]
+        """
+        if not names:
+            return []
+        if os.path.isdir(self.path):
+            paths = [os.path.join(self.path, name) for name in names]
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                return list(executor.map(self.__class__._file_digest, paths))
+        self._tarball()
+        members = []
+        for name in names:
+            member = self._members.get(os.path.normpath(name))
+            if member is None:
+                raise ValueError(f"{name} not found in {self.path}")
+            members.append(member)
+        if self.compressed:
+            return [self._stream_digest(member) for member in members]
+        with open(self.path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                view = memoryview(mapping)
+                try:
+                    with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                        return list(
+                            executor.map(
+                                lambda member: self.__class__._member_digest(
+                                    view, member
+                                ),
+                                members,
+                            )
+                        )
+                finally:
+                    view.release()
+
+    @classmethod
+    def _member_digest(
+        cls, view: memoryview, member: tarfile.TarInfo
+    ) -> Tuple[str, int]:
+        """
+        Computes the sha256 digest and size of given tarball member, in place.
+        :param view: The memory-mapped tarball.
+        :type view: memoryview
+        :param member: The member.
+        :type member: tarfile.TarInfo
+        :return: Its digest and size.
+        :rtype: Tuple[str, int]
+        """
+        with view[member.offset_data : member.offset_data + member.size] as data:
+            return f"sha256:{hashlib.sha256(data).hexdigest()}", member.size
+
+    @classmethod
+    def _file_digest(cls, path: str) -> Tuple[str, int]:
+        """
+        Computes the sha256 digest and size of given file, memory-mapping it.
+        :param path: The file.
+        :type path: str
+        :return: Its digest and size.
+        :rtype: Tuple[str, int]
+        """
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size == 0:
+                return f"sha256:{hashlib.sha256().hexdigest()}", 0
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                return f"sha256:{hashlib.sha256(mapping).hexdigest()}", size
+
+    def _stream_digest(self, member: tarfile.TarInfo) -> Tuple[str, int]:
+        """
+        Computes the sha256 digest and size of given tarball member, reading it in chunks.
+        :param member: The member.
+        :type member: tarfile.TarInfo
+        :return: Its digest and size.
+        :rtype: Tuple[str, int]
+        """
+        digest = hashlib.sha256()
+        with self._tarball().extractfile(member) as file:
+            for chunk in iter(lambda: file.read(self.__class__.CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return f"sha256:{digest.hexdigest()}", member.size
+
+    def close(self):
+        """
+        Closes the tarball, if open.
+        """
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+            self._members = None
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -23,6 +23,7 @@ from argparse import ArgumentParser
 from pythoneda.shared import PrimaryPort
 from pythoneda.shared.application import PythonEDA
 from pythoneda.shared.infrastructure.cli import CliHandler
+import sys
 
 
 class RepositoryFolderCli(CliHandler, PrimaryPort):
@@ -34,6 +35,8 @@ class RepositoryFolderCli(CliHandler, PrimaryPort):
 
     Responsibilities:
         - Parse the command-line to retrieve the information about the repository folder.
+        - Accept many repository folders at once, given explicitly, as glob patterns or as workspaces.
+        - Optionally watch the repository folders, emitting events without git hooks.
 
     Collaborators:
         - PythonEDA subclasses: They are notified back with the information retrieved from the command line.
@@ -74,7 +77,26 @@ class RepositoryFolderCli(CliHandler, PrimaryPort):
         :type parser: argparse.ArgumentParser
         """
         parser.add_argument(
-            "-r", "--repository-folder", required=True, help="The repository folder"
+            "-r", "--repository-folder", required=False, help="The repository folder"
+        )
+        parser.add_argument(
+            "-R",
+            "--repository-folders",
+            required=False,
+            nargs="+",
+            help="Several repository folders, or glob patterns matching them.",
+        )
+        parser.add_argument(
+            "-w",
+            "--workspace",
+            required=False,
+            nargs="+",
+            help="Folders containing repository checkouts.",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Stay resident, emitting the events of the commits, tags and pushes in the repository folders.",
         )
 
     async def handle(self, app: PythonEDA, args):
@@ -85,7 +107,28 @@ class RepositoryFolderCli(CliHandler, PrimaryPort):
         :param args: The CLI args.
         :type args: argparse.args
         """
-        app.accept_repository_folder(args.repository_folder)
+        watch = getattr(args, "watch", False)
+        if watch or args.repository_folders or args.workspace:
+            from .artifact_workspace import ArtifactWorkspace
+
+            folders = ArtifactWorkspace(
+                ([args.repository_folder] if args.repository_folder else [])
+                + (args.repository_folders or []),
+                args.workspace,
+            ).folders()
+        else:
+            folders = [args.repository_folder] if args.repository_folder else []
+        if not folders:
+            print(f"-r|--repository-folder is mandatory")
+            sys.exit(1)
+        for folder in folders:
+            app.accept_repository_folder(folder)
+        if watch:
+            # only watch mode needs the watcher and the event dispatcher
+            from .artifact_cli import ArtifactCli
+            from .artifact_repository_watcher import ArtifactRepositoryWatcher
+
+            await ArtifactRepositoryWatcher(app, ArtifactCli(), folders).watch()
 # vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
 # Local Variables:
 # mode: python
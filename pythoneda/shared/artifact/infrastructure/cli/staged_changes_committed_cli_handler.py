@@ -19,10 +19,16 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import asyncio
 from pythoneda.shared import BaseObject
 from pythoneda.shared.application import PythonEDA
 from pythoneda.shared.artifact.events import Change, StagedChangesCommitted
-from pythoneda.shared.git import GitCommit, GitDiff, GitRepo
+from ..common.artifact_diff_store import ArtifactDiffStore
+from ..common.artifact_metrics import ArtifactMetrics
+from .git_commit_extractor import GitCommitExtractor
+from .git_executor import GitExecutor
+from .git_metadata_cache import GitMetadataCache
+import subprocess
 import sys
 
 
@@ -35,9 +41,16 @@ class StagedChangesCommittedCliHandler(BaseObject):
 
     Responsibilities:
         - Build and emit a StagedChangesCommitted event from the information provided by the CLI.
+        - Store the diff in the ArtifactDiffStore, if enabled, so the event carries just a reference.
+        - Process a burst of commits collapsed by ArtifactCommitDebouncer with a single git process.
 
     Collaborators:
         - pythoneda.artifact.application.ArtifactApp: Gets notified back to process the StagedChangesCommitted event.
+        - pythoneda.shared.artifact.infrastructure.cli.GitMetadataCache: Provides the repository metadata.
+        - pythoneda.shared.artifact.infrastructure.cli.GitExecutor: Runs git off the event loop.
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactMetrics: Times each stage.
+        - pythoneda.shared.artifact.infrastructure.cli.GitCommitExtractor: Retrieves the commit and its diff.
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactDiffStore: Stores the diff, if enabled.
         - pythoneda.shared.artifact.events.StagedChangesCommitted
     """
 
@@ -59,19 +72,105 @@ class StagedChangesCommittedCliHandler(BaseObject):
             print(f"-r|--repository-folder is mandatory")
             sys.exit(1)
         else:
-            git_repo = GitRepo.from_folder(args.repository_folder)
+            executor = GitExecutor.instance()
+            metrics = ArtifactMetrics.instance()
+            extractor = GitCommitExtractor(
+                args.repository_folder,
+                getattr(args, "max_file_diff_bytes", None),
+                executor.timeout,
+            )
+            hashes = getattr(args, "commits", None)
+            try:
+                if hashes:
+                    git_repo, commits = await asyncio.gather(
+                        metrics.measure(
+                            "git_metadata",
+                            "StagedChangesCommitted",
+                            executor.run(
+                                args.repository_folder,
+                                GitMetadataCache.instance().get,
+                                args.repository_folder,
+                            ),
+                        ),
+                        metrics.measure(
+                            "git_commit",
+                            "StagedChangesCommitted",
+                            executor.run(
+                                args.repository_folder,
+                                lambda: list(extractor.commits_of(hashes)),
+                            ),
+                        ),
+                    )
+                else:
+                    git_repo, commit = await asyncio.gather(
+                        metrics.measure(
+                            "git_metadata",
+                            "StagedChangesCommitted",
+                            executor.run(
+                                args.repository_folder,
+                                GitMetadataCache.instance().get,
+                                args.repository_folder,
+                            ),
+                        ),
+                        metrics.measure(
+                            "git_commit",
+                            "StagedChangesCommitted",
+                            executor.run(
+                                args.repository_folder, extractor.latest_commit
+                            ),
+                        ),
+                    )
+                    commits = [commit] if commit is not None else []
+            except subprocess.CalledProcessError:
+                # already logged by the extractor
+                commits = []
+            if not commits:
+                print(f"Cannot retrieve the latest commit of {args.repository_folder}")
+                sys.exit(1)
+            for hash_value, diff, message in commits:
+                await self.accept_commit(app, args, git_repo, hash_value, diff, message)
+
+    async def accept_commit(
+        self, app: PythonEDA, args, gitRepo, hashValue: str, diff: str, message: str
+    ):
+        """
+        Builds the StagedChangesCommitted event of a commit, and hands it to the application.
+        :param app: The PythonEDA application.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param args: The CLI args.
+        :type args: argparse.args
+        :param gitRepo: The repository metadata.
+        :type gitRepo: pythoneda.shared.artifact.infrastructure.cli.GitMetadata
+        :param hashValue: The commit hash.
+        :type hashValue: str
+        :param diff: The commit diff.
+        :type diff: str
+        :param message: The commit message.
+        :type message: str
+        """
+        metrics = ArtifactMetrics.instance()
+        if ArtifactDiffStore.enabled(args):
+            diff = await metrics.measure(
+                "diff_store",
+                "StagedChangesCommitted",
+                GitExecutor.instance().run(
+                    args.repository_folder,
+                    ArtifactDiffStore.instance().put,
+                    hashValue,
+                    diff,
+                ),
+            )
+        with metrics.span("diff_parse", "StagedChangesCommitted"):
             change = Change.from_unidiff_text(
-                GitDiff(args.repository_folder).committed_diff(),
-                git_repo.url,
-                git_repo.rev,
+                diff,
+                gitRepo.url,
+                gitRepo.rev,
                 args.repository_folder,
             )
-            hash_value, diff, message = GitCommit(
-                args.repository_folder
-            ).latest_commit()
-            event = StagedChangesCommitted(message, change, hash_value)
-            StagedChangesCommittedCliHandler.logger().debug(event)
-            await app.accept(event)
+        with metrics.span("event_build", "StagedChangesCommitted"):
+            event = StagedChangesCommitted(message, change, hashValue)
+        StagedChangesCommittedCliHandler.logger().debug(event)
+        await metrics.measure("accept", "StagedChangesCommitted", app.accept(event))
 # vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
 # Local Variables:
 # mode: python
@@ -19,11 +19,18 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import asyncio
 from pythoneda.shared import BaseObject
 from pythoneda.shared.application import PythonEDA
 from pythoneda.shared.artifact.events import TagPushed
-from pythoneda.shared.git import GitCommit, GitRepo
+from .artifact_hook_client import ArtifactHookClient
+from ..common.artifact_metrics import ArtifactMetrics
+from .artifact_outbox import ArtifactOutbox
+from .git_executor import GitExecutor
+from .git_metadata_cache import GitMetadataCache
+from .git_tag_resolver import GitTagResolver
 import sys
+from typing import List, Tuple
 
 
 class TagPushedCliHandler(BaseObject):
@@ -35,9 +42,16 @@ class TagPushedCliHandler(BaseObject):
 
     Responsibilities:
         - Build and emit a TagPushed event from the information provided by the CLI.
+        - Resolve and emit many tags at once, e.g. those a pre-push hook receives.
+        - Append it to the ArtifactOutbox instead, if enabled.
 
     Collaborators:
         - pythoneda.artifact.application.ArtifactApp: Gets notified back to process the TagPushed event.
+        - pythoneda.shared.artifact.infrastructure.cli.GitMetadataCache: Provides the repository metadata.
+        - pythoneda.shared.artifact.infrastructure.cli.GitExecutor: Runs git off the event loop.
+        - pythoneda.shared.artifact.infrastructure.cli.GitTagResolver: Finds the commit of the tag, without any diff.
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactMetrics: Times each stage.
+        - pythoneda.shared.artifact.infrastructure.cli.ArtifactOutbox: Stores the event, if enabled.
         - pythoneda.shared.artifact.events.TagPushed
     """
 
@@ -47,6 +61,41 @@ class TagPushedCliHandler(BaseObject):
         """
         super().__init__()
 
+    @classmethod
+    def requested_tags(cls, args) -> List[str]:
+        """
+        Retrieves the tags given with -t|--tag, --tags, or through the
+        standard input of a pre-push hook, without duplicates.
+        :param args: The CLI args.
+        :type args: argparse.args
+        :return: The tags, in the order given.
+        :rtype: List[str]
+        """
+        result = [args.tag] if args.tag else []
+        result.extend(getattr(args, "tags", None) or [])
+        if getattr(args, "pre_push_stdin", False):
+            result.extend(ArtifactHookClient.pre_push_tags(sys.stdin))
+        return list(dict.fromkeys(result))
+
+    @classmethod
+    def resolve_tags(
+        cls, resolver: GitTagResolver, tags: List[str]
+    ) -> List[Tuple[str, str]]:
+        """
+        Retrieves the commits of given tags: from the repository files if
+        there is just one, with a single "git for-each-ref" otherwise.
+        :param resolver: The resolver.
+        :type resolver: pythoneda.shared.artifact.infrastructure.cli.GitTagResolver
+        :param tags: The tags.
+        :type tags: List[str]
+        :return: A list of (tag, commit hash) tuples, for the tags found.
+        :rtype: List[Tuple[str, str]]
+        """
+        if len(tags) > 1:
+            return resolver.tags(tags)
+        commit = resolver.resolve(tags[0])
+        return [(tags[0], commit)] if commit else []
+
     async def handle(self, app: PythonEDA, args):
         """
         Processes the command specified from the command line.
@@ -59,17 +108,66 @@ class TagPushedCliHandler(BaseObject):
             print(f"-r|--repository-folder is mandatory")
             sys.exit(1)
         else:
-            if not args.tag:
+            tags = self.__class__.requested_tags(args)
+            if not tags:
+                if getattr(args, "pre_push_stdin", False):
+                    # only branches are being pushed
+                    return
                 print(f"-t|--tag is mandatory")
                 sys.exit(1)
             else:
-                git_repo = GitRepo.from_folder(args.repository_folder)
-                hash, diff = GitCommit(args.repository_folder).latest_commit()
-                event = TagPushed(
-                    args.tag, hash, git_repo.url, git_repo.rev, args.repository_folder
+                executor = GitExecutor.instance()
+                metrics = ArtifactMetrics.instance()
+                git_repo, resolved = await asyncio.gather(
+                    metrics.measure(
+                        "git_metadata",
+                        "TagPushed",
+                        executor.run(
+                            args.repository_folder,
+                            GitMetadataCache.instance().get,
+                            args.repository_folder,
+                        ),
+                    ),
+                    metrics.measure(
+                        "tag_resolve",
+                        "TagPushed",
+                        executor.run(
+                            args.repository_folder,
+                            self.__class__.resolve_tags,
+                            GitTagResolver(args.repository_folder, executor.timeout),
+                            tags,
+                        ),
+                    ),
                 )
-                TagPushedCliHandler.logger().debug(event)
-                await app.emit(event)
+                if not resolved:
+                    print(
+                        f"Tag {', '.join(tags)} not found in {args.repository_folder}"
+                    )
+                    sys.exit(1)
+                with metrics.span("event_build", "TagPushed"):
+                    all_event_args = [
+                        [
+                            tag,
+                            commit,
+                            git_repo.url,
+                            git_repo.rev,
+                            args.repository_folder,
+                        ]
+                        for tag, commit in resolved
+                    ]
+                    events = [TagPushed(*event_args) for event_args in all_event_args]
+                for event in events:
+                    TagPushedCliHandler.logger().debug(event)
+                if ArtifactOutbox.enabled(args):
+                    with metrics.span("outbox_append", "TagPushed"):
+                        for event_args in all_event_args:
+                            ArtifactOutbox.instance().append(
+                                args.repository_folder, "TagPushed", event_args
+                            )
+                else:
+                    # in order, through the same emitter and bus connection
+                    for event in events:
+                        await metrics.measure("emit", "TagPushed", app.emit(event))
 # vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
 # Local Variables:
 # mode: python
@@ -0,0 +1,46 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/common/__init__.py
+
+This file ensures pythoneda.shared.artifact.infrastructure.common is a namespace.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+__path__ = __import__("pkgutil").extend_path(__path__, __name__)
+
+from .lazy_attributes import LazyAttributes
+
+# Services shared by the cli and dbus packages. Classes are imported on
+# first access, so importing one of them doesn't import all of them.
+_LAZY_ATTRIBUTES = {
+    "ArtifactDedupIndex": ".artifact_dedup_index",
+    "ArtifactDiffStore": ".artifact_diff_store",
+    "ArtifactMetrics": ".artifact_metrics",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+_lazy_attributes = LazyAttributes(__name__, _LAZY_ATTRIBUTES)
+__getattr__ = _lazy_attributes.getattr
+__dir__ = _lazy_attributes.dir
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
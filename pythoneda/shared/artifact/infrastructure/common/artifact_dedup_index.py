@@ -0,0 +1,434 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/common/artifact_dedup_index.py
+
+This file defines the ArtifactDedupIndex class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from collections import OrderedDict
+import fcntl
+import hashlib
+import mmap
+import os
+from pythoneda.shared import BaseObject
+import time
+from typing import Any, Dict, List, Tuple
+
+
+class ArtifactDedupIndex(BaseObject):
+    """
+    A bounded index of the events recently seen, to suppress re-deliveries.
+
+    Class name: ArtifactDedupIndex
+
+    Responsibilities:
+        - Build the identity of an event: its type, repository, branch, tag and commit.
+        - Remember the identities seen within a window, in memory (LRU) and on disk (bloom filter).
+        - Tell whether an event is a duplicate of one seen within the window.
+        - Forget events that were recorded but couldn't be delivered.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalEmitter: Skips re-emitting events.
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalListener: Skips re-accepting them.
+
+    Hooks run in short-lived processes, so the LRU alone would forget
+    everything between them. The bloom filters are memory-mapped files,
+    one per window-long generation, shared by the processes of the same
+    scope; an identity is remembered for one to two windows. Bloom filters
+    have false positives, so they're sized for a negligible rate at the
+    expected volume, rather than for minimal space.
+    """
+
+    WINDOW_ENV_VAR = "PYTHONEDA_ARTIFACT_DEDUP_WINDOW"
+    LRU_SIZE_ENV_VAR = "PYTHONEDA_ARTIFACT_DEDUP_LRU_SIZE"
+    BLOOM_BITS_ENV_VAR = "PYTHONEDA_ARTIFACT_DEDUP_BLOOM_BITS"
+    FOLDER_ENV_VAR = "PYTHONEDA_ARTIFACT_DEDUP_FOLDER"
+    # CommittedChangesPushed carries no commit: two pushes of a branch
+    # within the window would share the identity, so they aren't deduplicated
+    EVENT_TYPES = [
+        "CommittedChangesTagged",
+        "StagedChangesCommitted",
+        "TagPushed",
+    ]
+    IDENTITY_ATTRIBUTES = ["repository_url", "branch", "tag", "commit"]
+    BLOOM_HASHES = 7
+
+    def __init__(
+        self,
+        scope: str,
+        window: float = None,
+        lruSize: int = None,
+        bloomBits: int = None,
+        folder: str = None,
+    ):
+        """
+        Creates a new ArtifactDedupIndex instance.
+        :param scope: The side using it, e.g. "emitter" or "listener". Each scope has its own files.
+        :type scope: str
+        :param window: How long an event is remembered, in seconds; zero disables the index.
+        Defaults to PYTHONEDA_ARTIFACT_DEDUP_WINDOW, or to 0.
+        :type window: float
+        :param lruSize: The number of identities kept in memory. Defaults to
+        PYTHONEDA_ARTIFACT_DEDUP_LRU_SIZE, or to 4096.
+        :type lruSize: int
+        :param bloomBits: The size of each bloom filter, in bits; zero keeps only the LRU.
+        Defaults to PYTHONEDA_ARTIFACT_DEDUP_BLOOM_BITS, or to 2^23 (1 MiB).
+        :type bloomBits: int
+        :param folder: The folder of the bloom filters. Defaults to
+        PYTHONEDA_ARTIFACT_DEDUP_FOLDER, or to $XDG_CACHE_HOME/pythoneda/artifact/dedup.
+        :type folder: str
+        """
+        super().__init__()
+        self._scope = scope
+        self._window = (
+            window
+            if window is not None
+            else float(os.environ.get(self.__class__.WINDOW_ENV_VAR, "0"))
+        )
+        self._lru_size = (
+            lruSize
+            if lruSize is not None
+            else int(os.environ.get(self.__class__.LRU_SIZE_ENV_VAR, "4096"))
+        )
+        bits = (
+            bloomBits
+            if bloomBits is not None
+            else int(os.environ.get(self.__class__.BLOOM_BITS_ENV_VAR, str(2**23)))
+        )
+        self._bloom_bytes = (bits + 7) // 8
+        self._folder = folder or self.__class__.default_folder()
+        self._lru: OrderedDict = OrderedDict()
+        self._filters: Dict[int, Tuple[int, mmap.mmap]] = {}
+
+    @classmethod
+    def default_folder(cls) -> str:
+        """
+        Retrieves the default folder of the bloom filters.
+        :return: Such folder.
+        :rtype: str
+        """
+        result = os.environ.get(cls.FOLDER_ENV_VAR)
+        if not result:
+            cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+                os.path.expanduser("~"), ".cache"
+            )
+            result = os.path.join(cache_home, "pythoneda", "artifact", "dedup")
+        return result
+
+    @property
+    def scope(self) -> str:
+        """
+        Retrieves the side using this index.
+        :return: Such scope.
+        :rtype: str
+        """
+        return self._scope
+
+    @property
+    def window(self) -> float:
+        """
+        Retrieves how long an event is remembered.
+        :return: Such time, in seconds.
+        :rtype: float
+        """
+        return self._window
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Checks whether duplicates get suppressed.
+        :return: True in such case.
+        :rtype: bool
+        """
+        return self._window > 0
+
+    @classmethod
+    def identity(cls, event: Any) -> str:
+        """
+        Builds the identity of given event. A re-delivered event gets
+        the same one, even if it was built again from scratch.
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        :return: The identity, or None if the event isn't deduplicated, or
+        has none of the identity attributes.
+        :rtype: str
+        """
+        event_name = event.__class__.__name__
+        if event_name not in cls.EVENT_TYPES:
+            return None
+        holders = [event, getattr(event, "change", None)]
+        values = [event_name]
+        for attribute in cls.IDENTITY_ATTRIBUTES:
+            value = None
+            for holder in holders:
+                value = getattr(holder, attribute, None)
+                if value is not None:
+                    break
+            values.append("" if value is None else str(value))
+        if not any(values[1:]):
+            return None
+        return "\0".join(values)
+
+    def _generation(self) -> int:
+        """
+        Retrieves the current generation of the bloom filters.
+        :return: Its number.
+        :rtype: int
+        """
+        return int(time.time() // self._window)
+
+    def _filter(self, generation: int, create: bool) -> Tuple[int, mmap.mmap]:
+        """
+        Retrieves the bloom filter of given generation, memory-mapped.
+        :param generation: The generation.
+        :type generation: int
+        :param create: Whether to create it if it doesn't exist.
+        :type create: bool
+        :return: Its file descriptor and mapping, or None.
+        :rtype: Tuple[int, mmap.mmap]
+        """
+        result = self._filters.get(generation)
+        if result is not None:
+            return result
+        path = os.path.join(self._folder, f"{self._scope}-{generation}.bloom")
+        flags = os.O_RDWR | (os.O_CREAT if create else 0)
+        try:
+            if create:
+                os.makedirs(self._folder, exist_ok=True)
+            descriptor = os.open(path, flags, 0o600)
+        except FileNotFoundError:
+            return None
+        try:
+            if os.fstat(descriptor).st_size < self._bloom_bytes:
+                fcntl.flock(descriptor, fcntl.LOCK_EX)
+                try:
+                    if os.fstat(descriptor).st_size < self._bloom_bytes:
+                        os.ftruncate(descriptor, self._bloom_bytes)
+                finally:
+                    fcntl.flock(descriptor, fcntl.LOCK_UN)
+            result = (descriptor, mmap.mmap(descriptor, self._bloom_bytes))
+        except BaseException:
+            os.close(descriptor)
+            raise
+        self._filters[generation] = result
+        if create:
+            self._expire(generation)
+        return result
+
+    def _expire(self, generation: int):
+        """
+        Closes and removes the bloom filters older than the previous generation.
+        :param generation: The current generation.
+        :type generation: int
+        """
+        for old in [old for old in self._filters if old < generation - 1]:
+            descriptor, mapping = self._filters.pop(old)
+            mapping.close()
+            os.close(descriptor)
+        prefix = f"{self._scope}-"
+        try:
+            names = os.listdir(self._folder)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not (name.startswith(prefix) and name.endswith(".bloom")):
+                continue
+            try:
+                old = int(name[len(prefix) : -len(".bloom")])
+            except ValueError:
+                continue
+            if old < generation - 1:
+                try:
+                    os.unlink(os.path.join(self._folder, name))
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        """
+        Unmaps the bloom filters.
+        """
+        for descriptor, mapping in self._filters.values():
+            mapping.close()
+            os.close(descriptor)
+        self._filters = {}
+
+    def _positions(self, identity: str) -> List[int]:
+        """
+        Retrieves the bits of given identity in the bloom filters.
+        :param identity: The identity.
+        :type identity: str
+        :return: The bit positions.
+        :rtype: List[int]
+        """
+        digest = hashlib.blake2b(identity.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        bits = self._bloom_bytes * 8
+        return [
+            (first + index * second) % bits
+            for index in range(self.__class__.BLOOM_HASHES)
+        ]
+
+    def _in_bloom(self, positions: List[int]) -> bool:
+        """
+        Checks whether the bloom filters of the current or the previous generation have given bits set.
+        :param positions: The bit positions.
+        :type positions: List[int]
+        :return: True in such case.
+        :rtype: bool
+        """
+        generation = self._generation()
+        for candidate in (generation, generation - 1):
+            bloom = self._filter(candidate, False)
+            if bloom is not None and all(
+                bloom[1][position >> 3] & (1 << (position & 7))
+                for position in positions
+            ):
+                return True
+        return False
+
+    def _lru_contains(self, identity: str) -> bool:
+        """
+        Checks whether given identity was recorded in memory within the window.
+        :param identity: The identity.
+        :type identity: str
+        :return: True in such case.
+        :rtype: bool
+        """
+        recorded = self._lru.get(identity)
+        if recorded is None:
+            return False
+        if time.monotonic() - recorded >= self._window:
+            del self._lru[identity]
+            return False
+        self._lru.move_to_end(identity)
+        return True
+
+    def _record(self, identity: str, positions: List[int]):
+        """
+        Records given identity in memory and in the current bloom filter.
+        :param identity: The identity.
+        :type identity: str
+        :param positions: Its bit positions.
+        :type positions: List[int]
+        """
+        self._lru[identity] = time.monotonic()
+        self._lru.move_to_end(identity)
+        while len(self._lru) > self._lru_size:
+            self._lru.popitem(last=False)
+        if positions:
+            _, mapping = self._filter(self._generation(), True)
+            for position in positions:
+                mapping[position >> 3] |= 1 << (position & 7)
+
+    def duplicate(self, event: Any) -> bool:
+        """
+        Checks whether given event was already recorded within the window.
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        :return: True in such case.
+        :rtype: bool
+        """
+        if not self.enabled:
+            return False
+        identity = self.__class__.identity(event)
+        if identity is None:
+            return False
+        if self._lru_contains(identity):
+            return True
+        return self._bloom_bytes > 0 and self._in_bloom(self._positions(identity))
+
+    def record(self, event: Any):
+        """
+        Records given event.
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        """
+        if not self.enabled:
+            return
+        identity = self.__class__.identity(event)
+        if identity is None:
+            return
+        self._record(
+            identity, self._positions(identity) if self._bloom_bytes > 0 else []
+        )
+
+    def forget(self, event: Any):
+        """
+        Forgets given event, e.g. because it was recorded but couldn't be sent.
+        Its bits are cleared from the current bloom filter, which could make
+        another identity sharing them pass as new: a duplicate getting through
+        is preferable to an event never being sent.
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        """
+        if not self.enabled:
+            return
+        identity = self.__class__.identity(event)
+        if identity is None:
+            return
+        self._lru.pop(identity, None)
+        if self._bloom_bytes == 0:
+            return
+        bloom = self._filter(self._generation(), False)
+        if bloom is None:
+            return
+        descriptor, mapping = bloom
+        fcntl.flock(descriptor, fcntl.LOCK_EX)
+        try:
+            for position in self._positions(identity):
+                mapping[position >> 3] &= ~(1 << (position & 7)) & 0xFF
+        finally:
+            fcntl.flock(descriptor, fcntl.LOCK_UN)
+
+    def check_and_record(self, event: Any) -> bool:
+        """
+        Records given event, unless it was already recorded within the window.
+        The check and the update are atomic across processes of the same scope.
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        :return: True if it's a duplicate.
+        :rtype: bool
+        """
+        if not self.enabled:
+            return False
+        identity = self.__class__.identity(event)
+        if identity is None:
+            return False
+        if self._lru_contains(identity):
+            return True
+        if self._bloom_bytes == 0:
+            self._record(identity, [])
+            return False
+        positions = self._positions(identity)
+        descriptor, _ = self._filter(self._generation(), True)
+        fcntl.flock(descriptor, fcntl.LOCK_EX)
+        try:
+            if self._in_bloom(positions):
+                return True
+            self._record(identity, positions)
+            return False
+        finally:
+            fcntl.flock(descriptor, fcntl.LOCK_UN)
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
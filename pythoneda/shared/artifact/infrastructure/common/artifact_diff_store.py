@@ -0,0 +1,336 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/common/artifact_diff_store.py
+
+This file defines the ArtifactDiffStore class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+from pythoneda.shared import BaseObject
+import re
+import tempfile
+import time
+from typing import Tuple
+
+
+class ArtifactDiffStore(BaseObject):
+    """
+    A local content-addressed store of commit diffs.
+
+    Class name: ArtifactDiffStore
+
+    Responsibilities:
+        - Store each diff once, keyed by its commit hash and its sha256.
+        - Build the reference events carry instead of the diff.
+        - Resolve references back to the diffs, memory-mapping the stored files.
+        - Evict the least recently used diffs beyond its size cap, and those unused beyond its age cap.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.StagedChangesCommittedCliHandler: Stores the diffs.
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalListener: Resolves them.
+
+    References are one-line unidiff comments, such as
+    "# pythoneda: diff stored (1234 bytes, commit:<hash>, sha256:<digest>)",
+    so consumers unaware of the store still get a valid, if empty, diff.
+    The store is local: only listeners on the same host can resolve them.
+    The modification time of each file tracks its last use: storing the same
+    diff again, or resolving it, touches it. Stores prune themselves at most
+    once every PRUNE_INTERVAL seconds; `--prune-diff-store` prunes on demand.
+    """
+
+    ENABLED_ENV_VAR = "PYTHONEDA_ARTIFACT_DIFF_STORE"
+    FOLDER_ENV_VAR = "PYTHONEDA_ARTIFACT_DIFF_STORE_FOLDER"
+    MAX_BYTES_ENV_VAR = "PYTHONEDA_ARTIFACT_DIFF_STORE_MAX_BYTES"
+    MAX_AGE_ENV_VAR = "PYTHONEDA_ARTIFACT_DIFF_STORE_MAX_AGE"
+    DEFAULT_MAX_BYTES = 1 << 30
+    DEFAULT_MAX_AGE = 30 * 24 * 3600
+    PRUNE_INTERVAL = 300
+    LOCK_FILE = "prune.lock"
+    REFERENCE_PATTERN = re.compile(
+        r"^# pythoneda: diff stored \((\d+) bytes, commit:([0-9a-f]+), sha256:([0-9a-f]{64})\)\n?$"
+    )
+
+    _singleton = None
+
+    def __init__(self, folder: str = None, maxBytes: int = None, maxAge: float = None):
+        """
+        Creates a new ArtifactDiffStore instance.
+        :param folder: The folder of the store, or None to use the default one.
+        :type folder: str
+        :param maxBytes: The size cap, in bytes, or None to use PYTHONEDA_ARTIFACT_DIFF_STORE_MAX_BYTES (1 GiB by default). 0 disables it.
+        :type maxBytes: int
+        :param maxAge: The age cap, in seconds, or None to use PYTHONEDA_ARTIFACT_DIFF_STORE_MAX_AGE (30 days by default). 0 disables it.
+        :type maxAge: float
+        """
+        super().__init__()
+        self._folder = folder or self.__class__.default_folder()
+        self._max_bytes = (
+            maxBytes
+            if maxBytes is not None
+            else int(
+                os.environ.get(
+                    self.__class__.MAX_BYTES_ENV_VAR,
+                    str(self.__class__.DEFAULT_MAX_BYTES),
+                )
+            )
+        )
+        self._max_age = (
+            maxAge
+            if maxAge is not None
+            else float(
+                os.environ.get(
+                    self.__class__.MAX_AGE_ENV_VAR, str(self.__class__.DEFAULT_MAX_AGE)
+                )
+            )
+        )
+
+    @classmethod
+    def instance(cls):
+        """
+        Retrieves the shared instance.
+        :return: Such instance.
+        :rtype: pythoneda.shared.artifact.infrastructure.common.ArtifactDiffStore
+        """
+        if cls._singleton is None:
+            cls._singleton = cls()
+        return cls._singleton
+
+    @classmethod
+    def enabled(cls, args) -> bool:
+        """
+        Checks whether diffs should be stored, and events carry references.
+        :param args: The CLI args.
+        :type args: argparse.args
+        :return: True if --diff-store was given, or PYTHONEDA_ARTIFACT_DIFF_STORE is set.
+        :rtype: bool
+        """
+        return bool(getattr(args, "diff_store", False)) or os.environ.get(
+            cls.ENABLED_ENV_VAR, ""
+        ).lower() in ("1", "true", "yes")
+
+    @classmethod
+    def default_folder(cls) -> str:
+        """
+        Retrieves the default folder of the store.
+        :return: Such folder.
+        :rtype: str
+        """
+        result = os.environ.get(cls.FOLDER_ENV_VAR)
+        if not result:
+            cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+                os.path.expanduser("~"), ".cache"
+            )
+            result = os.path.join(cache_home, "pythoneda", "artifact", "diffs")
+        return result
+
+    @property
+    def folder(self) -> str:
+        """
+        Retrieves the folder of the store.
+        :return: Such folder.
+        :rtype: str
+        """
+        return self._folder
+
+    @property
+    def max_bytes(self) -> int:
+        """
+        Retrieves the size cap of the store.
+        :return: Such cap, in bytes, or 0 if there's none.
+        :rtype: int
+        """
+        return self._max_bytes
+
+    @property
+    def max_age(self) -> float:
+        """
+        Retrieves the age cap of the stored diffs.
+        :return: Such cap, in seconds, or 0 if there's none.
+        :rtype: float
+        """
+        return self._max_age
+
+    def path(self, commit: str, digest: str) -> str:
+        """
+        Retrieves the file of given diff.
+        :param commit: The commit hash.
+        :type commit: str
+        :param digest: The sha256 of the diff.
+        :type digest: str
+        :return: The path of the file.
+        :rtype: str
+        """
+        return os.path.join(self.folder, commit[:2], f"{commit}-{digest}.diff")
+
+    def put(self, commit: str, diff: str) -> str:
+        """
+        Stores given diff, unless it's already there.
+        :param commit: The commit hash.
+        :type commit: str
+        :param diff: The diff.
+        :type diff: str
+        :return: The reference to the stored diff.
+        :rtype: str
+        """
+        data = diff.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(commit, digest)
+        try:
+            # already stored: mark it as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            # before writing, so the diff the event refers to is never evicted
+            self._prune_if_due()
+            folder = os.path.dirname(path)
+            os.makedirs(folder, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        return f"# pythoneda: diff stored ({len(data)} bytes, commit:{commit}, sha256:{digest})\n"
+
+    @classmethod
+    def parse_reference(cls, text: str) -> Tuple[int, str, str]:
+        """
+        Parses a reference.
+        :param text: The text that may be a reference.
+        :type text: str
+        :return: The size, commit hash and sha256 of the diff, or None if it's not a reference.
+        :rtype: Tuple[int, str, str]
+        """
+        match = cls.REFERENCE_PATTERN.match(text) if len(text) < 256 else None
+        if match is None:
+            return None
+        return int(match.group(1)), match.group(2), match.group(3)
+
+    def open(self, reference: str):
+        """
+        Memory-maps the diff of given reference.
+        :param reference: The reference.
+        :type reference: str
+        :return: The read-only mapping (empty bytes for empty diffs), or None if
+        the text is not a reference or the diff is not in this store.
+        :rtype: mmap.mmap
+        """
+        parsed = self.__class__.parse_reference(reference)
+        if parsed is None:
+            return None
+        size, commit, digest = parsed
+        try:
+            with open(self.path(commit, digest), "rb") as file:
+                try:
+                    os.utime(file.fileno())
+                except OSError:
+                    # e.g. a listener running as another user
+                    pass
+                if size == 0:
+                    return b""
+                return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            ArtifactDiffStore.logger().warning(
+                f"Diff of {commit} (sha256:{digest}) not found in {self.folder}"
+            )
+            return None
+
+    def _prune_if_due(self):
+        """
+        Prunes the store, unless some process did it in the last PRUNE_INTERVAL seconds.
+        """
+        try:
+            last = os.stat(os.path.join(self.folder, self.__class__.LOCK_FILE)).st_mtime
+        except FileNotFoundError:
+            last = 0
+        if time.time() - last >= self.__class__.PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self) -> int:
+        """
+        Evicts the diffs unused for longer than the age cap, and then the least
+        recently used ones until the store fits in its size cap.
+        Does nothing if another process is already pruning the store.
+        :return: The number of diffs evicted.
+        :rtype: int
+        """
+        result = 0
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            lock_path = os.path.join(self.folder, self.__class__.LOCK_FILE)
+            with open(lock_path, "a") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return result
+                os.utime(lock_path)
+                entries = []
+                for root, _, files in os.walk(self.folder):
+                    for name in files:
+                        if name.endswith(".diff"):
+                            path = os.path.join(root, name)
+                            try:
+                                stat = os.stat(path)
+                            except FileNotFoundError:
+                                continue
+                            entries.append((stat.st_mtime, stat.st_size, path))
+                # least recently used first
+                entries.sort()
+                total = sum(size for _, size, _ in entries)
+                now = time.time()
+                for last_used, size, path in entries:
+                    if not (
+                        (self.max_age and now - last_used > self.max_age)
+                        or (self.max_bytes and total > self.max_bytes)
+                    ):
+                        break
+                    try:
+                        os.remove(path)
+                        result += 1
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+        except OSError as error:
+            ArtifactDiffStore.logger().warning(
+                f"Could not prune {self.folder}: {error}"
+            )
+        return result
+
+    def resolve(self, text: str) -> str:
+        """
+        Retrieves the diff given text refers to.
+        :param text: A reference, or a diff.
+        :type text: str
+        :return: The stored diff if the text is a reference to it, the text itself otherwise.
+        :rtype: str
+        """
+        mapping = self.open(text)
+        if mapping is None:
+            return text
+        try:
+            return mapping[:].decode("utf-8")
+        finally:
+            if isinstance(mapping, mmap.mmap):
+                mapping.close()
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
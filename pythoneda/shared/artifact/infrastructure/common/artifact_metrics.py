@@ -0,0 +1,414 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/common/artifact_metrics.py
+
+This file defines the ArtifactMetrics class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import atexit
+from bisect import bisect_left
+import fcntl
+import json
+import os
+from pythoneda.shared import BaseObject
+import tempfile
+import threading
+import time
+from typing import Any, Awaitable, Dict
+
+
+class _NoSpan:
+    """
+    The span handed out while metrics are disabled.
+
+    Class name: _NoSpan
+
+    Responsibilities:
+        - Do nothing, as cheaply as possible.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactMetrics: Hands it out.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        """
+        Enters the span.
+        :return: This instance.
+        :rtype: pythoneda.shared.artifact.infrastructure.common._NoSpan
+        """
+        return self
+
+    def __exit__(self, *args):
+        """
+        Leaves the span.
+        :return: False, so exceptions propagate.
+        :rtype: bool
+        """
+        return False
+
+
+class _Span:
+    """
+    A timed stage.
+
+    Class name: _Span
+
+    Responsibilities:
+        - Time the with block it's used in.
+        - Record the duration in the metrics.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactMetrics: Hands it out, and records the duration.
+    """
+
+    __slots__ = ("_metrics", "_key", "_start")
+
+    def __init__(self, metrics, key: tuple):
+        """
+        Creates a new _Span instance.
+        :param metrics: The metrics to record the duration in.
+        :type metrics: pythoneda.shared.artifact.infrastructure.common.ArtifactMetrics
+        :param key: The stage and the event name.
+        :type key: tuple
+        """
+        self._metrics = metrics
+        self._key = key
+        self._start = None
+
+    def __enter__(self):
+        """
+        Starts timing.
+        :return: This instance.
+        :rtype: pythoneda.shared.artifact.infrastructure.common._Span
+        """
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        """
+        Stops timing, and records the duration.
+        :return: False, so exceptions propagate.
+        :rtype: bool
+        """
+        self._metrics.observe(self._key, time.perf_counter() - self._start)
+        return False
+
+
+class ArtifactMetrics(BaseObject):
+    """
+    Times the stages of the artifact events, and counts them.
+
+    Class name: ArtifactMetrics
+
+    Responsibilities:
+        - Hand out timing spans for each stage: git metadata, diff extraction
+          and parsing, event build, serialization, bus send, listener dispatch.
+        - Keep a histogram of each stage, and counters, per event.
+        - Keep gauges, such as the depth of the listener queues.
+        - Export them in Prometheus text format to a file, merged with what
+          other processes exported there before.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli.*CliHandler: Time their stages.
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalEmitter: Times serialization and sending.
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalListener: Times dispatching.
+
+    Metrics are disabled unless PYTHONEDA_ARTIFACT_METRICS_FILE is set; then
+    spans are a shared no-op object. The file suits the textfile collector of
+    the Prometheus node exporter; a sibling ".json" file keeps the totals.
+    """
+
+    FILE_ENV_VAR = "PYTHONEDA_ARTIFACT_METRICS_FILE"
+    EXPORT_INTERVAL_ENV_VAR = "PYTHONEDA_ARTIFACT_METRICS_EXPORT_INTERVAL"
+    PREFIX = "pythoneda_artifact"
+    BUCKETS = [
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+    ]
+
+    _singleton = None
+    _no_span = _NoSpan()
+
+    def __init__(self, file: str = None, exportInterval: float = None):
+        """
+        Creates a new ArtifactMetrics instance.
+        :param file: The file to export to, or None to disable metrics.
+        :type file: str
+        :param exportInterval: How often long-running processes export, in seconds.
+        :type exportInterval: float
+        """
+        super().__init__()
+        self._file = file
+        self._export_interval = (
+            exportInterval
+            if exportInterval is not None
+            else float(os.environ.get(self.__class__.EXPORT_INTERVAL_ENV_VAR, "15"))
+        )
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._last_export = time.monotonic()
+        if file:
+            atexit.register(self.export)
+
+    @classmethod
+    def instance(cls):
+        """
+        Retrieves the shared instance.
+        :return: Such instance.
+        :rtype: pythoneda.shared.artifact.infrastructure.common.ArtifactMetrics
+        """
+        if cls._singleton is None:
+            cls._singleton = cls(os.environ.get(cls.FILE_ENV_VAR))
+        return cls._singleton
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Checks whether metrics are being collected.
+        :return: True in such case.
+        :rtype: bool
+        """
+        return bool(self._file)
+
+    @property
+    def file(self) -> str:
+        """
+        Retrieves the file metrics are exported to.
+        :return: Such file, or None.
+        :rtype: str
+        """
+        return self._file
+
+    def span(self, stage: str, event: str):
+        """
+        Retrieves a span timing given stage, to use in a with block.
+        :param stage: The stage, e.g. "git_metadata".
+        :type stage: str
+        :param event: The event name, e.g. "TagPushed".
+        :type event: str
+        :return: The span.
+        :rtype: object
+        """
+        if not self._file:
+            return self.__class__._no_span
+        return _Span(self, (stage, event))
+
+    async def measure(self, stage: str, event: str, awaitable: Awaitable) -> Any:
+        """
+        Awaits given awaitable, timing it as a stage.
+        :param stage: The stage, e.g. "git_metadata".
+        :type stage: str
+        :param event: The event name, e.g. "TagPushed".
+        :type event: str
+        :param awaitable: The awaitable.
+        :type awaitable: Awaitable
+        :return: What the awaitable returns.
+        :rtype: Any
+        """
+        if not self._file:
+            return await awaitable
+        with _Span(self, (stage, event)):
+            return await awaitable
+
+    def observe(self, key: tuple, seconds: float):
+        """
+        Records the duration of a stage.
+        :param key: The stage and the event name.
+        :type key: tuple
+        :param seconds: The duration.
+        :type seconds: float
+        """
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = [[0] * (len(self.__class__.BUCKETS) + 1), 0.0]
+                self._histograms[key] = histogram
+            histogram[0][bisect_left(self.__class__.BUCKETS, seconds)] += 1
+            histogram[1] += seconds
+        self._maybe_export()
+
+    def count(self, name: str, event: str, value: float = 1):
+        """
+        Increments a counter.
+        :param name: The counter, e.g. "emitted_events".
+        :type name: str
+        :param event: The event name, e.g. "TagPushed".
+        :type event: str
+        :param value: The increment.
+        :type value: float
+        """
+        if not self._file:
+            return
+        with self._lock:
+            key = (name, event)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float):
+        """
+        Sets a gauge.
+        :param name: The gauge, e.g. "listener_queue_depth".
+        :type name: str
+        :param value: Its current value.
+        :type value: float
+        """
+        if not self._file:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    def _maybe_export(self):
+        """
+        Exports the metrics if the export interval elapsed, so long-running
+        processes publish them as they go.
+        """
+        if time.monotonic() - self._last_export >= self._export_interval:
+            self.export()
+
+    @classmethod
+    def _merge(
+        cls, totals: Dict, histograms: Dict, counters: Dict, gauges: Dict
+    ) -> Dict:
+        """
+        Adds new observations to the persisted totals.
+        :param totals: The totals, as persisted.
+        :type totals: Dict
+        :param histograms: The new histogram observations.
+        :type histograms: Dict
+        :param counters: The new counter increments.
+        :type counters: Dict
+        :param gauges: The current gauge values.
+        :type gauges: Dict
+        :return: The updated totals.
+        :rtype: Dict
+        """
+        total_histograms = totals.setdefault("histograms", {})
+        for (stage, event), (buckets, seconds) in histograms.items():
+            key = f"{stage}\0{event}"
+            total = total_histograms.setdefault(
+                key, {"buckets": [0] * len(buckets), "sum": 0.0}
+            )
+            total["buckets"] = [a + b for a, b in zip(total["buckets"], buckets)]
+            total["sum"] += seconds
+        total_counters = totals.setdefault("counters", {})
+        for (name, event), value in counters.items():
+            key = f"{name}\0{event}"
+            total_counters[key] = total_counters.get(key, 0) + value
+        totals.setdefault("gauges", {}).update(gauges)
+        return totals
+
+    @classmethod
+    def render(cls, totals: Dict) -> str:
+        """
+        Renders the totals in Prometheus text format.
+        :param totals: The totals.
+        :type totals: Dict
+        :return: The text.
+        :rtype: str
+        """
+        lines = [
+            f"# HELP {cls.PREFIX}_stage_seconds Time spent in each stage of artifact events.",
+            f"# TYPE {cls.PREFIX}_stage_seconds histogram",
+        ]
+        for key, histogram in sorted(totals.get("histograms", {}).items()):
+            stage, event = key.split("\0")
+            labels = f'stage="{stage}",event="{event}"'
+            cumulative = 0
+            for bound, count in zip(
+                [str(bound) for bound in cls.BUCKETS] + ["+Inf"], histogram["buckets"]
+            ):
+                cumulative += count
+                lines.append(
+                    f'{cls.PREFIX}_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f"{cls.PREFIX}_stage_seconds_sum{{{labels}}} {histogram['sum']}"
+            )
+            lines.append(f"{cls.PREFIX}_stage_seconds_count{{{labels}}} {cumulative}")
+        names = {}
+        for key, value in sorted(totals.get("counters", {}).items()):
+            name, event = key.split("\0")
+            names.setdefault(name, []).append((event, value))
+        for name, values in names.items():
+            lines.append(f"# TYPE {cls.PREFIX}_{name}_total counter")
+            for event, value in values:
+                lines.append(f'{cls.PREFIX}_{name}_total{{event="{event}"}} {value}')
+        for name, value in sorted(totals.get("gauges", {}).items()):
+            lines.append(f"# TYPE {cls.PREFIX}_{name} gauge")
+            lines.append(f"{cls.PREFIX}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """
+        Adds the metrics collected since the last export to the totals, and
+        rewrites the Prometheus file with them.
+        """
+        if not self._file:
+            return
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+            counters, self._counters = self._counters, {}
+            gauges, self._gauges = self._gauges, {}
+            self._last_export = time.monotonic()
+        if not histograms and not counters and not gauges:
+            return
+        folder = os.path.dirname(os.path.abspath(self._file))
+        try:
+            os.makedirs(folder, exist_ok=True)
+            with open(f"{self._file}.lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    with open(f"{self._file}.json", "r", encoding="utf-8") as file:
+                        totals = json.load(file)
+                except (FileNotFoundError, ValueError):
+                    totals = {}
+                totals = self.__class__._merge(totals, histograms, counters, gauges)
+                for path, content in [
+                    (f"{self._file}.json", json.dumps(totals)),
+                    (self._file, self.__class__.render(totals)),
+                ]:
+                    descriptor, temp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+                    with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                        file.write(content)
+                    os.replace(temp_path, path)
+        except OSError as error:
+            ArtifactMetrics.logger().warning(
+                f"Could not export metrics to {self._file}: {error}"
+            )
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
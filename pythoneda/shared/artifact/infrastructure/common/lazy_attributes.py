@@ -0,0 +1,107 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/common/lazy_attributes.py
+
+This file defines the LazyAttributes class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from importlib import import_module
+import sys
+from typing import Dict, List
+
+
+class LazyAttributes:
+    """
+    The attributes of a package, imported from their modules on first access.
+
+    Class name: LazyAttributes
+
+    Responsibilities:
+        - Import the module defining an attribute the first time it's accessed,
+          and keep it in the package afterwards.
+        - List the attributes of the package, including the not-yet-imported ones.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.cli: Imports its classes through it.
+        - pythoneda.shared.artifact.infrastructure.common: Imports its classes through it.
+        - pythoneda.shared.artifact.infrastructure.dbus: Imports its classes through it.
+    """
+
+    def __init__(self, packageName: str, attributes: Dict[str, str]):
+        """
+        Creates a new LazyAttributes instance.
+        :param packageName: The name of the package.
+        :type packageName: str
+        :param attributes: The module defining each attribute, relative to the package.
+        :type attributes: Dict[str, str]
+        """
+        super().__init__()
+        self._package_name = packageName
+        self._attributes = attributes
+
+    @property
+    def package_name(self) -> str:
+        """
+        Retrieves the name of the package.
+        :return: Such name.
+        :rtype: str
+        """
+        return self._package_name
+
+    @property
+    def attributes(self) -> Dict[str, str]:
+        """
+        Retrieves the module defining each attribute.
+        :return: Such modules, relative to the package.
+        :rtype: Dict[str, str]
+        """
+        return self._attributes
+
+    def getattr(self, name: str):
+        """
+        Imports the module defining given attribute, the first time it's accessed.
+        Meant to be the __getattr__ of the package.
+        :param name: The attribute name.
+        :type name: str
+        :return: The attribute.
+        :rtype: Any
+        """
+        module = self.attributes.get(name)
+        if module is None:
+            raise AttributeError(
+                f"module {self.package_name!r} has no attribute {name!r}"
+            )
+        result = getattr(import_module(module, self.package_name), name)
+        setattr(sys.modules[self.package_name], name, result)
+        return result
+
+    def dir(self) -> List[str]:
+        """
+        Lists the attributes of the package, including the not-yet-imported ones.
+        Meant to be the __dir__ of the package.
+        :return: The attribute names.
+        :rtype: List[str]
+        """
+        return sorted(set(vars(sys.modules[self.package_name])) | set(self.attributes))
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -21,8 +21,24 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 __path__ = __import__("pkgutil").extend_path(__path__, __name__)
 
-from .artifact_dbus_signal_emitter import ArtifactDbusSignalEmitter
-from .artifact_dbus_signal_listener import ArtifactDbusSignalListener
+from ..common.lazy_attributes import LazyAttributes
+
+# Classes are imported on first access, so importing one module of this
+# package (e.g. the handler of a single event) doesn't import all of them.
+_LAZY_ATTRIBUTES = {
+    "ArtifactDbusTransport": ".artifact_dbus_transport",
+    "DbusArtifactCompactEvent": ".dbus_artifact_compact_event",
+    "DbusArtifactEventBatch": ".dbus_artifact_event_batch",
+    "ArtifactListenerWorkerPool": ".artifact_listener_worker_pool",
+    "ArtifactDbusSignalEmitter": ".artifact_dbus_signal_emitter",
+    "ArtifactDbusSignalListener": ".artifact_dbus_signal_listener",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+_lazy_attributes = LazyAttributes(__name__, _LAZY_ATTRIBUTES)
+__getattr__ = _lazy_attributes.getattr
+__dir__ = _lazy_attributes.dir
 # vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
 # Local Variables:
 # mode: python
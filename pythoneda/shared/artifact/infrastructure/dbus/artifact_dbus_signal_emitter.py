@@ -19,7 +19,11 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-from dbus_next import BusType
+import asyncio
+from dbus_next import BusType, Message
+from dbus_next.aio import MessageBus
+import os
+from pythoneda.shared import Event
 from pythoneda.shared.artifact.events import (
     CommittedChangesPushed,
     CommittedChangesTagged,
@@ -39,7 +43,13 @@ from pythoneda.shared.artifact.events.infrastructure.dbus import (
     DbusTagPushed,
 )
 from pythoneda.shared.infrastructure.dbus import DbusSignalEmitter
-from typing import Dict
+from ..common.artifact_dedup_index import ArtifactDedupIndex
+from ..common.artifact_metrics import ArtifactMetrics
+from .artifact_dbus_transport import ArtifactDbusTransport
+from .dbus_artifact_compact_event import DbusArtifactCompactEvent
+from .dbus_artifact_event_batch import DbusArtifactEventBatch
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Tuple, Type, Union
 
 
 class ArtifactDbusSignalEmitter(DbusSignalEmitter):
@@ -51,6 +61,12 @@ class ArtifactDbusSignalEmitter(DbusSignalEmitter):
     Responsibilities:
         - Connect to d-bus.
         - Emit domain events as d-bus signals.
+        - Optionally coalesce bursts of events into DbusArtifactEventBatch envelopes.
+        - Send each event through its configured transport: system bus, session bus or a private bus.
+        - Route each event with a single lookup by type in a precomputed table.
+        - Optionally send events as compressed DbusArtifactCompactEvent signals.
+        - Time serialization and sending, if metrics are enabled.
+        - Skip events already emitted within the deduplication window, if enabled.
 
     Collaborators:
         - pythoneda.shared.application.PythonEDA: Requests emitting events.
@@ -61,40 +77,447 @@ class ArtifactDbusSignalEmitter(DbusSignalEmitter):
         - pythoneda.shared.artifact.events.infrastructure.dbus.DbusDockerImageRequested
         - pythoneda.shared.artifact.events.infrastructure.dbus.StagedChangesCommitted
         - pythoneda.shared.artifact.events.infrastructure.dbus.TagPushed
+        - pythoneda.shared.artifact.infrastructure.dbus.DbusArtifactEventBatch
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusTransport
+        - pythoneda.shared.artifact.infrastructure.dbus.DbusArtifactCompactEvent
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactMetrics
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactDedupIndex
     """
 
-    def __init__(self):
+    BATCH_SIZE_ENV_VAR = "PYTHONEDA_ARTIFACT_DBUS_BATCH_SIZE"
+    BATCH_LATENCY_ENV_VAR = "PYTHONEDA_ARTIFACT_DBUS_BATCH_LATENCY_MS"
+    ENCODING_ENV_VAR = "PYTHONEDA_ARTIFACT_DBUS_ENCODING"
+    CODEC_ENV_VAR = "PYTHONEDA_ARTIFACT_DBUS_CODEC"
+    COMPACT_MIN_BYTES_ENV_VAR = "PYTHONEDA_ARTIFACT_DBUS_COMPACT_MIN_BYTES"
+    ENCODINGS = ["dbus", "compact", "auto"]
+    MAX_FLUSH_ATTEMPTS = 5
+
+    def __init__(
+        self,
+        batchMaxSize: int = None,
+        batchMaxLatency: float = None,
+        transports: Dict[str, Union[BusType, str]] = None,
+        encoding: str = None,
+        codec: str = None,
+        compactMinBytes: int = None,
+        dedupIndex: ArtifactDedupIndex = None,
+    ):
         """
         Creates a new ArtifactDbusSignalEmitter instance.
+        Batching is disabled unless the maximum batch size, given or read from
+        PYTHONEDA_ARTIFACT_DBUS_BATCH_SIZE, is greater than one.
+        :param batchMaxSize: The maximum number of events per envelope.
+        :type batchMaxSize: int
+        :param batchMaxLatency: The maximum time an event waits for its envelope, in seconds.
+        :type batchMaxLatency: float
+        :param transports: The transport of each event name ("*" for the default one).
+        Defaults to PYTHONEDA_ARTIFACT_DBUS_TRANSPORTS, or to the system bus.
+        :type transports: Dict[str, Union[dbus_next.BusType, str]]
+        :param encoding: "dbus" (plain d-bus signals), "compact" (DbusArtifactCompactEvent
+        signals) or "auto" (compact only for big events). Defaults to
+        PYTHONEDA_ARTIFACT_DBUS_ENCODING, or to "dbus".
+        :type encoding: str
+        :param codec: The compression of compact signals: "none", "zlib" or "zstd".
+        Defaults to PYTHONEDA_ARTIFACT_DBUS_CODEC, or to "zlib".
+        :type codec: str
+        :param compactMinBytes: The size from which "auto" sends events compact.
+        Defaults to PYTHONEDA_ARTIFACT_DBUS_COMPACT_MIN_BYTES, or to 64 KiB.
+        :type compactMinBytes: int
+        :param dedupIndex: The index of the events already emitted. Defaults to
+        one configured from PYTHONEDA_ARTIFACT_DEDUP_WINDOW, disabled unless it's set.
+        :type dedupIndex: pythoneda.shared.artifact.infrastructure.common.ArtifactDedupIndex
         """
         super().__init__("pythoneda.shared.artifact.events.infrastructure.dbus")
+        self._batch_max_size = (
+            batchMaxSize
+            if batchMaxSize is not None
+            else int(os.environ.get(self.__class__.BATCH_SIZE_ENV_VAR, "1"))
+        )
+        self._batch_max_latency = (
+            batchMaxLatency
+            if batchMaxLatency is not None
+            else float(os.environ.get(self.__class__.BATCH_LATENCY_ENV_VAR, "50"))
+            / 1000
+        )
+        self._pending: List[Tuple[Event, asyncio.Future]] = []
+        self._flush_timer = None
+        self._flush_tasks = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_attempts = 0
+        self._buses = {}
+        self._routing_table = None
+        self._signal_emitters = None
+        self._transports = (
+            dict(transports)
+            if transports is not None
+            else ArtifactDbusTransport.from_environment()
+        )
+        self._encoding = encoding or os.environ.get(
+            self.__class__.ENCODING_ENV_VAR, "dbus"
+        )
+        if self._encoding not in self.__class__.ENCODINGS:
+            raise ValueError(f"Unknown artifact event encoding: {self._encoding}")
+        self._codec = codec or os.environ.get(self.__class__.CODEC_ENV_VAR, "zlib")
+        if self._codec not in DbusArtifactCompactEvent.available_codecs():
+            raise ValueError(f"Unavailable artifact event codec: {self._codec}")
+        self._compact_min_bytes = (
+            compactMinBytes
+            if compactMinBytes is not None
+            else int(
+                os.environ.get(self.__class__.COMPACT_MIN_BYTES_ENV_VAR, str(64 * 1024))
+            )
+        )
+        self._dedup_index = dedupIndex or ArtifactDedupIndex("emitter")
+
+    @property
+    def batch_max_size(self) -> int:
+        """
+        Retrieves the maximum number of events per envelope.
+        :return: Such size.
+        :rtype: int
+        """
+        return self._batch_max_size
+
+    @property
+    def batch_max_latency(self) -> float:
+        """
+        Retrieves the maximum time an event waits for its envelope.
+        :return: Such latency, in seconds.
+        :rtype: float
+        """
+        return self._batch_max_latency
+
+    @property
+    def batching(self) -> bool:
+        """
+        Checks whether events get coalesced into envelopes.
+        :return: True in such case.
+        :rtype: bool
+        """
+        return self.batch_max_size > 1
+
+    @property
+    def encoding(self) -> str:
+        """
+        Retrieves how events are encoded on the wire.
+        :return: "dbus", "compact" or "auto".
+        :rtype: str
+        """
+        return self._encoding
+
+    @property
+    def codec(self) -> str:
+        """
+        Retrieves the compression of compact signals.
+        :return: "none", "zlib" or "zstd".
+        :rtype: str
+        """
+        return self._codec
+
+    @property
+    def compact_min_bytes(self) -> int:
+        """
+        Retrieves the size from which "auto" sends events compact.
+        :return: Such size, in bytes.
+        :rtype: int
+        """
+        return self._compact_min_bytes
+
+    @property
+    def dedup_index(self) -> ArtifactDedupIndex:
+        """
+        Retrieves the index of the events already emitted.
+        :return: Such index.
+        :rtype: pythoneda.shared.artifact.infrastructure.common.ArtifactDedupIndex
+        """
+        return self._dedup_index
+
+    def transport_for(self, eventClass: Type) -> Union[BusType, str]:
+        """
+        Retrieves the transport of given event class.
+        :param eventClass: The event class.
+        :type eventClass: Type
+        :return: The bus type, or the d-bus address of a private bus.
+        :rtype: Union[dbus_next.BusType, str]
+        """
+        return ArtifactDbusTransport.resolve(self._transports, eventClass.__name__)
+
+    def set_transport(self, eventName: str, transport: str):
+        """
+        Changes the transport of given event at runtime.
+        :param eventName: The event name (e.g. "TagPushed"), or "*" for the default transport.
+        :type eventName: str
+        :param transport: "system", "session" or a d-bus address.
+        :type transport: str
+        """
+        self._transports[eventName] = ArtifactDbusTransport.parse(transport)
+        self._routing_table = None
+        self._signal_emitters = None
+
+    @classmethod
+    def routes(cls) -> Mapping[Type, Type]:
+        """
+        Retrieves the d-bus class of each event class. It's built once per class.
+        :return: Such read-only mapping.
+        :rtype: Mapping[Type, Type]
+        """
+        if "_routes" not in cls.__dict__:
+            cls._routes = MappingProxyType(
+                {
+                    CommittedChangesPushed: DbusCommittedChangesPushed,
+                    CommittedChangesTagged: DbusCommittedChangesTagged,
+                    DockerImageAvailable: DbusDockerImageAvailable,
+                    DockerImagePushed: DbusDockerImagePushed,
+                    DockerImageRequested: DbusDockerImageRequested,
+                    StagedChangesCommitted: DbusStagedChangesCommitted,
+                    TagPushed: DbusTagPushed,
+                }
+            )
+        return cls._routes
+
+    def routing_table(self) -> Mapping[Type, Tuple[Type, Union[BusType, str]]]:
+        """
+        Retrieves the d-bus class and transport of each event class.
+        It's rebuilt only when a transport changes.
+        :return: Such read-only mapping.
+        :rtype: Mapping[Type, Tuple[Type, Union[dbus_next.BusType, str]]]
+        """
+        if self._routing_table is None:
+            self._routing_table = MappingProxyType(
+                {
+                    event_class: (dbus_class, self.transport_for(event_class))
+                    for event_class, dbus_class in self.__class__.routes().items()
+                }
+            )
+        return self._routing_table
 
     def signal_emitters(self) -> Dict:
         """
         Retrieves the configured event emitters.
-        :return: For each event, a list with the event interface and the bus type.
+        :return: For each event, a list with the event interface and the transport:
+        a bus type, or the d-bus address of a private bus.
         :rtype: Dict
         """
-        result = {}
-
-        key = self.__class__.full_class_name(CommittedChangesPushed)
-        result[key] = [DbusCommittedChangesPushed, BusType.SYSTEM]
-        key = self.__class__.full_class_name(CommittedChangesTagged)
-        result[key] = [DbusCommittedChangesTagged, BusType.SYSTEM]
-        key = self.__class__.full_class_name(DockerImageAvailable)
-        result[key] = [DbusDockerImageAvailable, BusType.SYSTEM]
-        key = self.__class__.full_class_name(DockerImagePushed)
-        result[key] = [DbusDockerImagePushed, BusType.SYSTEM]
-        key = self.__class__.full_class_name(DockerImageRequested)
-        result[key] = [DbusDockerImageRequested, BusType.SYSTEM]
-        key = self.__class__.full_class_name(StagedChangesCommitted)
-        result[key] = [DbusStagedChangesCommitted, BusType.SYSTEM]
-        key = self.__class__.full_class_name(TagPushed)
-        result[key] = [DbusTagPushed, BusType.SYSTEM]
+        if self._signal_emitters is None:
+            result = {}
+            for event_class, route in self.routing_table().items():
+                result[self.__class__.full_class_name(event_class)] = list(route)
+            self._signal_emitters = result
+        return self._signal_emitters
+
+    async def emit(self, event: Event):
+        """
+        Emits given event as d-bus signal. If batching is enabled, the event
+        waits for the next envelope, and this method returns once it's sent,
+        so events can't be left behind when a short-lived process exits.
+        Events already emitted within the deduplication window are skipped.
+        Events are recorded as they're claimed, so concurrent emitters can't
+        both send the same event, and forgotten if they can't be sent, so
+        they can be retried.
+        :param event: The domain event to emit.
+        :type event: pythoneda.shared.Event
+        """
+        if self.dedup_index.check_and_record(event):
+            ArtifactMetrics.instance().count(
+                "suppressed_duplicates", event.__class__.__name__
+            )
+            ArtifactDbusSignalEmitter.logger().debug(f"Skipping duplicate {event}")
+            return
+        try:
+            if not self.batching:
+                await self._send(event)
+                return
+            sent = asyncio.get_running_loop().create_future()
+            self._pending.append((event, sent))
+            if len(self._pending) >= self.batch_max_size:
+                await self._flush_or_retry()
+            elif self._flush_timer is None:
+                self._schedule_flush(self.batch_max_latency)
+            await sent
+        except BaseException:
+            self.dedup_index.forget(event)
+            raise
+
+    def _schedule_flush(self, delay: float):
+        """
+        Schedules flushing the queued events.
+        :param delay: How long to wait, in seconds.
+        :type delay: float
+        """
+        self._flush_timer = asyncio.get_running_loop().call_later(
+            delay,
+            lambda: self._flush_tasks.add(
+                asyncio.ensure_future(self._flush_or_retry())
+            ),
+        )
+
+    async def _flush_or_retry(self):
+        """
+        Flushes the queued events. If sending fails, the events not sent stay
+        queued, and are retried with exponential backoff; their emitters keep
+        waiting for them. After MAX_FLUSH_ATTEMPTS failed attempts in a row,
+        their emitters get the error instead.
+        """
+        try:
+            await self.flush()
+            self._flush_attempts = 0
+        except Exception as error:
+            self._flush_attempts += 1
+            if self._flush_attempts >= self.__class__.MAX_FLUSH_ATTEMPTS:
+                ArtifactDbusSignalEmitter.logger().error(
+                    f"Giving up on {len(self._pending)} queued events after {self._flush_attempts} attempts: {error}"
+                )
+                self._flush_attempts = 0
+                pending, self._pending = self._pending, []
+                for _, sent in pending:
+                    if not sent.done():
+                        sent.set_exception(error)
+            elif self._flush_timer is None:
+                delay = self.batch_max_latency * 2**self._flush_attempts
+                ArtifactDbusSignalEmitter.logger().warning(
+                    f"Could not emit {len(self._pending)} queued events ({error}), retrying in {delay}s"
+                )
+                self._schedule_flush(delay)
+        finally:
+            self._flush_tasks = {task for task in self._flush_tasks if not task.done()}
+
+    async def flush(self):
+        """
+        Emits the queued events, in order, packing consecutive events that
+        travel on the same bus into one envelope.
+        If sending fails, the events not sent yet are queued again, ahead of
+        those queued meanwhile, and the error is raised.
+        """
+        async with self._flush_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            pending, self._pending = self._pending, []
+            done = 0
+            try:
+                for transport, group in self._groups(pending):
+                    if transport is None:
+                        await self._send(group[0][1])
+                    else:
+                        await self._send_batch(group, transport)
+                    for _ in group:
+                        _, sent = pending[done]
+                        if not sent.done():
+                            sent.set_result(None)
+                        done += 1
+            except BaseException:
+                self._pending = pending[done:] + self._pending
+                raise
+
+    def _groups(self, pending: List[Tuple[Event, asyncio.Future]]) -> List:
+        """
+        Splits given queued events into runs of consecutive events travelling
+        on the same bus. Events we don't route travel on their own.
+        :param pending: The queued events, each one along with its delivery future.
+        :type pending: List[Tuple[pythoneda.shared.Event, asyncio.Future]]
+        :return: Each run, with its transport (None for events we don't route),
+        and its events along with their d-bus class.
+        :rtype: List[Tuple[Union[dbus_next.BusType, str], List[Tuple[Type, pythoneda.shared.Event]]]]
+        """
+        result = []
+        routing_table = self.routing_table()
+        for event, _ in pending:
+            emitter = routing_table.get(event.__class__)
+            if emitter is None:
+                result.append((None, [(None, event)]))
+                continue
+            dbus_class, transport = emitter
+            if not result or result[-1][0] != transport:
+                result.append((transport, []))
+            result[-1][1].append((dbus_class, event))
+        return result
 
+    async def _bus(self, transport: Union[BusType, str]) -> MessageBus:
+        """
+        Retrieves a connection to given transport, reusing it across signals.
+        :param transport: The bus type, or the d-bus address.
+        :type transport: Union[dbus_next.BusType, str]
+        :return: The connection.
+        :rtype: dbus_next.aio.MessageBus
+        """
+        result = self._buses.get(transport)
+        if result is None or not result.connected:
+            result = await ArtifactDbusTransport.connect(transport)
+            self._buses[transport] = result
         return result
 
+    async def _send(self, event: Event):
+        """
+        Sends given event on its own, through our own connection to its
+        transport, reused across signals, so bursts of events (e.g. the tags
+        of a release train) don't connect once each. Events we don't route
+        go through DbusSignalEmitter.
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        """
+        metrics = ArtifactMetrics.instance()
+        event_name = event.__class__.__name__
+        metrics.count("emitted_events", event_name)
+        emitter = self.routing_table().get(event.__class__)
+        if emitter is not None and self.encoding != "dbus":
+            dbus_class, transport = emitter
+            with metrics.span("serialize", event_name):
+                body = dbus_class.transform(event)
+                compact = self.encoding == "compact" or (
+                    sum(len(item) for item in body if isinstance(item, str))
+                    >= self.compact_min_bytes
+                )
+                if compact:
+                    signal = DbusArtifactCompactEvent.new_signal(
+                        event, dbus_class.sign(event), body, self.codec
+                    )
+            if compact:
+                bus = await self._bus(transport)
+                with metrics.span("bus_send", event_name):
+                    await bus.send(signal)
+                return
+        if emitter is None:
+            # DbusSignalEmitter serializes and sends in one go
+            await metrics.measure("bus_send", event_name, super().emit(event))
+        else:
+            dbus_class, transport = emitter
+            instance = dbus_class()
+            with metrics.span("serialize", event_name):
+                signal = Message.new_signal(
+                    instance.path,
+                    instance.name,
+                    event_name,
+                    dbus_class.sign(event),
+                    dbus_class.transform(event),
+                )
+            bus = await self._bus(transport)
+            with metrics.span("bus_send", event_name):
+                await bus.send(signal)
 
+    async def _send_batch(self, events: List, transport: Union[BusType, str]):
+        """
+        Sends given events: alone if there is just one or they must be sent
+        compact, in an envelope otherwise.
+        :param events: The events, each one along with its d-bus class.
+        :type events: List[Tuple[Type, pythoneda.shared.Event]]
+        :param transport: The bus type, or the d-bus address, to send them through.
+        :type transport: Union[dbus_next.BusType, str]
+        """
+        if len(events) == 1 or self.encoding == "compact":
+            for _, event in events:
+                await self._send(event)
+        elif events:
+            metrics = ArtifactMetrics.instance()
+            for _, event in events:
+                metrics.count("emitted_events", event.__class__.__name__)
+            with metrics.span("serialize", DbusArtifactEventBatch.MEMBER):
+                signal = DbusArtifactEventBatch.new_signal(events)
+            bus = await self._bus(transport)
+            with metrics.span("bus_send", DbusArtifactEventBatch.MEMBER):
+                await bus.send(signal)
+            ArtifactDbusSignalEmitter.logger().debug(
+                f"Sent {len(events)} events in one envelope"
+            )
 # vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
 # Local Variables:
 # mode: python
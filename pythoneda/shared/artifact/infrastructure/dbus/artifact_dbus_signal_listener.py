@@ -20,8 +20,19 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import abc
+import asyncio
+from dbus_next import BusType, Message
+from importlib import import_module
+from pythoneda.shared.application import PythonEDA
 from pythoneda.shared.infrastructure.dbus import DbusSignalListener
-from typing import List
+from ..common.artifact_dedup_index import ArtifactDedupIndex
+from ..common.artifact_diff_store import ArtifactDiffStore
+from ..common.artifact_metrics import ArtifactMetrics
+from .artifact_dbus_transport import ArtifactDbusTransport
+from .artifact_listener_worker_pool import ArtifactListenerWorkerPool
+from .dbus_artifact_compact_event import DbusArtifactCompactEvent
+from .dbus_artifact_event_batch import DbusArtifactEventBatch
+from typing import Any, Dict, List, Tuple, Type, Union
 
 
 class ArtifactDbusSignalListener(DbusSignalListener, abc.ABC):
@@ -33,28 +44,262 @@ class ArtifactDbusSignalListener(DbusSignalListener, abc.ABC):
     Responsibilities:
         - Connect to d-bus.
         - Listen to signals relevant to domain-artifact.
+        - Unpack DbusArtifactEventBatch envelopes into individual events.
+        - Decode DbusArtifactCompactEvent signals.
+        - Listen to the private buses some events may be configured to travel through.
+        - Import and subscribe to only the events declared in event_types(), if any.
+        - Resolve, on demand, the diffs events refer to in the ArtifactDiffStore.
+        - Time the dispatching of each event, if metrics are enabled.
+        - Keep reading the bus while the application handles events, through a worker pool
+          that keeps the events of each repository in order.
+        - Skip events already accepted within the deduplication window, if enabled.
 
     Collaborators:
         - pythoneda.shared.application.PythonEDA: Receives relevant domain events.
         - pythoneda.shared.artifact.events.infrastructure.dbus.*
+        - pythoneda.shared.artifact.infrastructure.dbus.DbusArtifactEventBatch
+        - pythoneda.shared.artifact.infrastructure.dbus.DbusArtifactCompactEvent
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusTransport
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactListenerWorkerPool
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactDiffStore
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactMetrics
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactDedupIndex
     """
 
+    EVENTS_PACKAGE = "pythoneda.shared.artifact.events.infrastructure.dbus"
+
+    ALL_EVENT_TYPES = [
+        "CommittedChangesPushed",
+        "CommittedChangesTagged",
+        "DockerImageAvailable",
+        "DockerImagePushed",
+        "DockerImageRequested",
+        "StagedChangesCommitted",
+        "TagPushed",
+    ]
+
     def __init__(self):
         """
         Creates a new ArtifactDbusSignalListener instance.
         """
         super().__init__()
+        self._dedup_index = ArtifactDedupIndex("listener")
+
+    @property
+    def dedup_index(self) -> ArtifactDedupIndex:
+        """
+        Retrieves the index of the events already accepted.
+        :return: Such index.
+        :rtype: pythoneda.shared.artifact.infrastructure.common.ArtifactDedupIndex
+        """
+        return self._dedup_index
+
+    @classmethod
+    def event_types(cls) -> List[str]:
+        """
+        Retrieves the names of the events this listener handles.
+        Subclasses interested in a few events should override it, so only
+        those get imported and subscribed to.
+        :return: The event names (e.g. ["TagPushed"]), or None for all of them.
+        :rtype: List[str]
+        """
+        return None
+
+    @classmethod
+    def selective(cls) -> bool:
+        """
+        Checks whether this listener declares the exact events it handles.
+        :return: True in such case.
+        :rtype: bool
+        """
+        return cls.event_types() is not None
 
     @classmethod
     def event_packages(cls) -> List[str]:
         """
         Retrieves the packages of the supported events.
+        It returns none, to prevent DbusSignalListener from scanning and
+        subscribing to them: accept_transport() does it, so every signal goes
+        through the worker pool and the deduplication window.
         :return: The packages.
         :rtype: List[str]
         """
-        return ["pythoneda.shared.artifact.events.infrastructure.dbus"]
+        return []
+
+    @classmethod
+    def dbus_class(cls, eventName: str) -> Type:
+        """
+        Imports the d-bus class of given event, and nothing else.
+        :param eventName: The event name, e.g. "TagPushed".
+        :type eventName: str
+        :return: The d-bus class, e.g. DbusTagPushed.
+        :rtype: Type
+        """
+        module = import_module(
+            f"{cls.EVENTS_PACKAGE}.dbus_{cls.camel_to_snake(eventName)}"
+        )
+        return getattr(module, f"Dbus{eventName}")
 
+    @classmethod
+    def resolve_diff(cls, text: str) -> str:
+        """
+        Retrieves the diff of a change. Diffs kept in the ArtifactDiffStore
+        travel as references, and are read only when this method is called.
+        :param text: The unidiff text of the change.
+        :type text: str
+        :return: The diff.
+        :rtype: str
+        """
+        return ArtifactDiffStore.instance().resolve(text)
 
+    @classmethod
+    def repository_of(cls, event: Any) -> str:
+        """
+        Retrieves the repository an event refers to, to keep the events of
+        each repository in order.
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        :return: The repository url or folder, or the event class name if it has none.
+        :rtype: str
+        """
+        holders = [event, getattr(event, "change", None)]
+        for attribute in ["repository_url", "repository_folder"]:
+            for holder in holders:
+                value = getattr(holder, attribute, None)
+                if value:
+                    return value
+        return event.__class__.__name__
+
+    def receivers(self) -> Dict[str, Tuple[Type, Union[BusType, str]]]:
+        """
+        Retrieves the d-bus class and transport of each handled event.
+        :return: Such information, keyed by event name.
+        :rtype: Dict[str, Tuple[Type, Union[dbus_next.BusType, str]]]
+        """
+        transports = ArtifactDbusTransport.from_environment()
+        return {
+            event_name: (
+                self.__class__.dbus_class(event_name),
+                ArtifactDbusTransport.resolve(transports, event_name),
+            )
+            for event_name in (
+                self.__class__.event_types() or self.__class__.ALL_EVENT_TYPES
+            )
+        }
+
+    async def accept(self, app: PythonEDA):
+        """
+        Listens to the individual signals, to the envelopes and to the compact
+        signals, on every transport the handled events are configured to
+        travel through.
+        :param app: The PythonEDA instance.
+        :type app: pythoneda.shared.application.PythonEDA
+        """
+        receivers = self.receivers()
+        transports = []
+        for _, transport in receivers.values():
+            if transport not in transports:
+                transports.append(transport)
+        await asyncio.gather(
+            *[
+                self.accept_transport(app, transport, receivers)
+                for transport in transports
+            ]
+        )
+
+    async def accept_transport(
+        self, app: PythonEDA, transport: Union[BusType, str], receivers: Dict
+    ):
+        """
+        Listens to the individual signals, the envelopes and the compact
+        signals on given transport.
+        Each subscription is a match rule, so the bus only wakes us up for
+        the handled events.
+        Signals go through an ArtifactListenerWorkerPool, so the bus keeps
+        being read while the application handles events.
+        :param app: The PythonEDA instance.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param transport: The bus type, or the d-bus address of a private bus.
+        :type transport: Union[dbus_next.BusType, str]
+        :param receivers: The d-bus class and transport of each handled event.
+        :type receivers: Dict
+        """
+        interfaces = {
+            DbusArtifactEventBatch.INTERFACE: DbusArtifactEventBatch,
+            DbusArtifactCompactEvent.INTERFACE: DbusArtifactCompactEvent,
+        }
+        for dbus_class, event_transport in receivers.values():
+            if event_transport == transport:
+                interfaces[dbus_class().name] = dbus_class
+
+        def prepare(message: Message) -> List[Tuple[str, Any]]:
+            interface_class = interfaces[message.interface]
+            if interface_class not in (
+                DbusArtifactEventBatch,
+                DbusArtifactCompactEvent,
+            ):
+                return [(message.member, interface_class.parse(message, app))]
+            if message.member != interface_class.MEMBER:
+                return []
+            result = []
+            for event_class_name, item in interface_class.unpack(message):
+                receiver = receivers.get(event_class_name.rsplit(".", 1)[-1])
+                if receiver is None:
+                    continue
+                dbus_class, _ = receiver
+                result.append((item.member, dbus_class.parse(item, app)))
+            return result
+
+        async def dispatch(eventName: str, event: Any):
+            await self._dispatch(app, event, eventName)
+
+        pool = ArtifactListenerWorkerPool(
+            prepare, dispatch, self.__class__.repository_of
+        )
+        bus = await ArtifactDbusTransport.connect(transport)
+        for interface in interfaces:
+            await bus.call(
+                Message(
+                    destination="org.freedesktop.DBus",
+                    path="/org/freedesktop/DBus",
+                    interface="org.freedesktop.DBus",
+                    member="AddMatch",
+                    signature="s",
+                    body=[f"type='signal',interface='{interface}'"],
+                )
+            )
+
+        def on_message(message: Message):
+            if message.interface in interfaces:
+                pool.offer(message)
+
+        bus.add_message_handler(on_message)
+        await pool.run()
+
+    async def _dispatch(self, app: PythonEDA, event: Any, eventName: str):
+        """
+        Hands an event to the application, unless it was already accepted
+        within the deduplication window. Events the application fails to
+        accept are forgotten, so a redelivery isn't skipped.
+        :param app: The PythonEDA instance.
+        :type app: pythoneda.shared.application.PythonEDA
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        :param eventName: The event name, e.g. "TagPushed".
+        :type eventName: str
+        """
+        metrics = ArtifactMetrics.instance()
+        metrics.count("received_events", eventName)
+        if self.dedup_index.check_and_record(event):
+            metrics.count("suppressed_duplicates", eventName)
+            ArtifactDbusSignalListener.logger().debug(f"Skipping duplicate {event}")
+            return
+        try:
+            with metrics.span("listener_dispatch", eventName):
+                await app.accept(event)
+        except BaseException:
+            self.dedup_index.forget(event)
+            raise
 # vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
 # Local Variables:
 # mode: python
@@ -0,0 +1,120 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/dbus/artifact_dbus_transport.py
+
+This file defines the ArtifactDbusTransport class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from dbus_next import BusType
+from dbus_next.aio import MessageBus
+import os
+from pythoneda.shared import BaseObject
+from typing import Dict, Union
+
+
+class ArtifactDbusTransport(BaseObject):
+    """
+    The buses artifact signals can travel through.
+
+    Class name: ArtifactDbusTransport
+
+    Responsibilities:
+        - Parse transport specifications: "system", "session", or a d-bus address
+          such as "unix:path=/run/user/1000/pythoneda-artifact-bus".
+        - Read the per-event transports configured at runtime.
+        - Connect to a transport.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalEmitter: Sends signals through the transports.
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalListener: Listens to the transports.
+
+    An address transport points to a private dbus-daemon, typically started
+    by the build user with "dbus-daemon --session --address=unix:path=...".
+    It bypasses the system bus policy checks and rate limits.
+    """
+
+    TRANSPORTS_ENV_VAR = "PYTHONEDA_ARTIFACT_DBUS_TRANSPORTS"
+    DEFAULT = "*"
+
+    @classmethod
+    def parse(cls, value: str) -> Union[BusType, str]:
+        """
+        Parses a transport specification.
+        :param value: The specification.
+        :type value: str
+        :return: The bus type, or the d-bus address.
+        :rtype: Union[dbus_next.BusType, str]
+        """
+        normalized = value.strip()
+        if normalized.lower() == "system":
+            return BusType.SYSTEM
+        if normalized.lower() == "session":
+            return BusType.SESSION
+        if ":" in normalized:
+            return normalized
+        raise ValueError(f"Unknown d-bus transport: {value}")
+
+    @classmethod
+    def from_environment(cls) -> Dict[str, Union[BusType, str]]:
+        """
+        Reads the transports configured in PYTHONEDA_ARTIFACT_DBUS_TRANSPORTS,
+        formatted as "TagPushed=session;StagedChangesCommitted=unix:path=/x;*=system".
+        :return: The transport of each event name, "*" being the default one.
+        :rtype: Dict[str, Union[dbus_next.BusType, str]]
+        """
+        result = {}
+        for entry in os.environ.get(cls.TRANSPORTS_ENV_VAR, "").split(";"):
+            if entry.strip():
+                event_name, _, transport = entry.partition("=")
+                result[event_name.strip()] = cls.parse(transport)
+        return result
+
+    @classmethod
+    def resolve(
+        cls, transports: Dict[str, Union[BusType, str]], eventName: str
+    ) -> Union[BusType, str]:
+        """
+        Retrieves the transport of given event.
+        :param transports: The transport of each event name, "*" being the default one.
+        :type transports: Dict[str, Union[dbus_next.BusType, str]]
+        :param eventName: The event name, e.g. "TagPushed".
+        :type eventName: str
+        :return: The bus type, or the d-bus address of a private bus.
+        :rtype: Union[dbus_next.BusType, str]
+        """
+        return transports.get(eventName, transports.get(cls.DEFAULT, BusType.SYSTEM))
+
+    @classmethod
+    async def connect(cls, transport: Union[BusType, str]) -> MessageBus:
+        """
+        Connects to given transport.
+        :param transport: The bus type, or the d-bus address.
+        :type transport: Union[dbus_next.BusType, str]
+        :return: The connection.
+        :rtype: dbus_next.aio.MessageBus
+        """
+        if isinstance(transport, str):
+            return await MessageBus(bus_address=transport).connect()
+        return await MessageBus(bus_type=transport).connect()
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,446 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/dbus/artifact_listener_worker_pool.py
+
+This file defines the ArtifactListenerWorkerPool class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import base64
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dbus_next import Message
+import json
+import os
+from pythoneda.shared import BaseObject
+from ..common.artifact_metrics import ArtifactMetrics
+import tempfile
+from typing import Any, Callable, Dict, List, Tuple
+import weakref
+
+
+class ArtifactListenerWorkerPool(BaseObject):
+    """
+    A bounded queue, and the workers behind it, between d-bus and the application.
+
+    Class name: ArtifactListenerWorkerPool
+
+    Responsibilities:
+        - Take signals from the bus without ever waiting, so the bus keeps being read.
+        - Keep at most a given number of signals in memory, and apply the overflow
+          policy to the rest: block, drop the oldest, or spill to disk.
+        - Parse the signals in arrival order, inline or in a thread pool.
+        - Dispatch the events of each repository in order, and those of different
+          repositories concurrently.
+        - Publish the depth of the queues as a metric.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalListener: Feeds and consumes it.
+        - pythoneda.shared.artifact.infrastructure.common.ArtifactMetrics: Receives the queue depth.
+
+    D-Bus can't be asked to wait: the "block" policy keeps accepting signals
+    past the capacity, and only counts them, so nothing is lost but memory
+    grows. Events are dispatched on the event loop in every mode, since the
+    application isn't thread-safe; the thread mode only moves the decoding
+    and parsing of signals out of it.
+    """
+
+    WORKERS_ENV_VAR = "PYTHONEDA_ARTIFACT_LISTENER_WORKERS"
+    QUEUE_SIZE_ENV_VAR = "PYTHONEDA_ARTIFACT_LISTENER_QUEUE_SIZE"
+    OVERFLOW_ENV_VAR = "PYTHONEDA_ARTIFACT_LISTENER_OVERFLOW"
+    MODE_ENV_VAR = "PYTHONEDA_ARTIFACT_LISTENER_MODE"
+    SPILL_FOLDER_ENV_VAR = "PYTHONEDA_ARTIFACT_LISTENER_SPILL_FOLDER"
+    OVERFLOW_POLICIES = ["block", "drop_oldest", "spill"]
+    MODES = ["asyncio", "thread"]
+    DEPTH_GAUGE = "listener_queue_depth"
+
+    _pools = weakref.WeakSet()
+
+    def __init__(
+        self,
+        prepare: Callable,
+        dispatch: Callable,
+        key: Callable,
+        workers: int = None,
+        capacity: int = None,
+        overflow: str = None,
+        mode: str = None,
+        spillFolder: str = None,
+    ):
+        """
+        Creates a new ArtifactListenerWorkerPool instance.
+        :param prepare: Turns a signal into a list of (event name, event) tuples.
+        :type prepare: Callable
+        :param dispatch: The coroutine function handing an event, and its name, to the application.
+        :type dispatch: Callable
+        :param key: Retrieves the ordering key (usually the repository) of an event.
+        :type key: Callable
+        :param workers: The number of concurrent dispatchers. Defaults to
+        PYTHONEDA_ARTIFACT_LISTENER_WORKERS, or to 4.
+        :type workers: int
+        :param capacity: The maximum number of signals kept in memory. Defaults to
+        PYTHONEDA_ARTIFACT_LISTENER_QUEUE_SIZE, or to 1024.
+        :type capacity: int
+        :param overflow: "block", "drop_oldest" or "spill". Defaults to
+        PYTHONEDA_ARTIFACT_LISTENER_OVERFLOW, or to "block".
+        :type overflow: str
+        :param mode: "asyncio" or "thread". Defaults to
+        PYTHONEDA_ARTIFACT_LISTENER_MODE, or to "asyncio".
+        :type mode: str
+        :param spillFolder: The folder of the spill files. Defaults to
+        PYTHONEDA_ARTIFACT_LISTENER_SPILL_FOLDER, or to $XDG_STATE_HOME/pythoneda/artifact/listener.
+        :type spillFolder: str
+        """
+        super().__init__()
+        self._prepare = prepare
+        self._dispatch = dispatch
+        self._key = key
+        self._workers = max(
+            1,
+            (
+                workers
+                if workers is not None
+                else int(os.environ.get(self.__class__.WORKERS_ENV_VAR, "4"))
+            ),
+        )
+        self._capacity = max(
+            1,
+            (
+                capacity
+                if capacity is not None
+                else int(os.environ.get(self.__class__.QUEUE_SIZE_ENV_VAR, "1024"))
+            ),
+        )
+        self._overflow = overflow or os.environ.get(
+            self.__class__.OVERFLOW_ENV_VAR, "block"
+        )
+        if self._overflow not in self.__class__.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown listener overflow policy: {self._overflow}")
+        self._mode = mode or os.environ.get(self.__class__.MODE_ENV_VAR, "asyncio")
+        if self._mode not in self.__class__.MODES:
+            raise ValueError(f"Unknown listener worker mode: {self._mode}")
+        self._spill_folder = spillFolder or self.__class__.default_spill_folder()
+        self._intake = deque()
+        self._available = asyncio.Event()
+        self._lanes: List[asyncio.Queue] = []
+        self._spill_writer = None
+        self._spill_reader = None
+        self._spilled = 0
+        self._overflowing = False
+        self.__class__._pools.add(self)
+
+    @classmethod
+    def default_spill_folder(cls) -> str:
+        """
+        Retrieves the default folder of the spill files.
+        :return: Such folder.
+        :rtype: str
+        """
+        result = os.environ.get(cls.SPILL_FOLDER_ENV_VAR)
+        if not result:
+            state_home = os.environ.get("XDG_STATE_HOME") or os.path.join(
+                os.path.expanduser("~"), ".local", "state"
+            )
+            result = os.path.join(state_home, "pythoneda", "artifact", "listener")
+        return result
+
+    @property
+    def workers(self) -> int:
+        """
+        Retrieves the number of concurrent dispatchers.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._workers
+
+    @property
+    def capacity(self) -> int:
+        """
+        Retrieves the maximum number of signals kept in memory.
+        :return: Such number.
+        :rtype: int
+        """
+        return self._capacity
+
+    @property
+    def overflow(self) -> str:
+        """
+        Retrieves what happens to signals arriving when the queue is full.
+        :return: "block", "drop_oldest" or "spill".
+        :rtype: str
+        """
+        return self._overflow
+
+    @property
+    def mode(self) -> str:
+        """
+        Retrieves where signals get parsed.
+        :return: "asyncio" or "thread".
+        :rtype: str
+        """
+        return self._mode
+
+    @property
+    def depth(self) -> int:
+        """
+        Retrieves the number of signals and events waiting in this pool.
+        :return: Such number.
+        :rtype: int
+        """
+        return (
+            len(self._intake)
+            + self._spilled
+            + sum(lane.qsize() for lane in self._lanes)
+        )
+
+    @classmethod
+    def _publish_depth(cls):
+        """
+        Publishes the depth of all the pools.
+        """
+        ArtifactMetrics.instance().gauge(
+            cls.DEPTH_GAUGE, sum(pool.depth for pool in list(cls._pools))
+        )
+
+    def offer(self, message: Message):
+        """
+        Takes a signal, applying the overflow policy if the queue is full.
+        It never waits, so it can be called from the bus callbacks.
+        :param message: The signal.
+        :type message: dbus_next.Message
+        """
+        metrics = ArtifactMetrics.instance()
+        if self._spilled > 0:
+            # keep the order until the spill is drained
+            self._spill(message)
+        elif len(self._intake) < self.capacity:
+            self._intake.append(message)
+        else:
+            if not self._overflowing:
+                self._overflowing = True
+                ArtifactListenerWorkerPool.logger().warning(
+                    f"Listener queue full ({self.capacity} signals), applying the {self.overflow} policy"
+                )
+            if self.overflow == "spill":
+                self._spill(message)
+            elif self.overflow == "drop_oldest":
+                dropped = self._intake.popleft()
+                self._intake.append(message)
+                metrics.count("dropped_signals", dropped.member)
+            else:
+                self._intake.append(message)
+                metrics.count("overflowed_signals", message.member)
+        self._available.set()
+        self.__class__._publish_depth()
+
+    def _spill(self, message: Message):
+        """
+        Appends a signal to the spill file.
+        :param message: The signal.
+        :type message: dbus_next.Message
+        """
+        if self._spill_writer is None:
+            os.makedirs(self._spill_folder, exist_ok=True)
+            descriptor, path = tempfile.mkstemp(
+                dir=self._spill_folder, prefix=f"spill-{os.getpid()}-", suffix=".jsonl"
+            )
+            self._spill_writer = os.fdopen(descriptor, "w", encoding="utf-8")
+            self._spill_reader = open(path, "r", encoding="utf-8")
+            # nobody else needs it, and it's gone if we crash
+            os.unlink(path)
+        self._spill_writer.write(json.dumps(self.__class__.encode(message)) + "\n")
+        self._spill_writer.flush()
+        self._spilled += 1
+        ArtifactMetrics.instance().count("spilled_signals", message.member)
+
+    def _unspill(self) -> Message:
+        """
+        Reads the oldest signal in the spill file.
+        :return: The signal.
+        :rtype: dbus_next.Message
+        """
+        line = self._spill_reader.readline()
+        self._spilled -= 1
+        if self._spilled == 0:
+            self._spill_writer.seek(0)
+            self._spill_writer.truncate()
+            self._spill_reader.seek(0)
+        return self.__class__.decode(json.loads(line))
+
+    @classmethod
+    def encode(cls, message: Message) -> Dict:
+        """
+        Converts a signal to JSON-friendly values.
+        :param message: The signal.
+        :type message: dbus_next.Message
+        :return: Its path, interface, member, signature and body.
+        :rtype: Dict
+        """
+
+        def to_json(value: Any) -> Any:
+            if isinstance(value, (bytes, bytearray)):
+                return {"b64": base64.b64encode(value).decode("ascii")}
+            if isinstance(value, (list, tuple)):
+                return [to_json(item) for item in value]
+            return value
+
+        return {
+            "path": message.path,
+            "interface": message.interface,
+            "member": message.member,
+            "signature": message.signature,
+            "body": to_json(message.body),
+        }
+
+    @classmethod
+    def decode(cls, data: Dict) -> Message:
+        """
+        Rebuilds a signal converted with encode().
+        :param data: The converted signal.
+        :type data: Dict
+        :return: The signal.
+        :rtype: dbus_next.Message
+        """
+
+        def from_json(value: Any) -> Any:
+            if isinstance(value, dict) and "b64" in value:
+                return base64.b64decode(value["b64"])
+            if isinstance(value, list):
+                return [from_json(item) for item in value]
+            return value
+
+        return Message.new_signal(
+            data["path"],
+            data["interface"],
+            data["member"],
+            data["signature"],
+            from_json(data["body"]),
+        )
+
+    def _take(self, maxItems: int) -> List[Message]:
+        """
+        Takes the oldest signals.
+        :param maxItems: The maximum number of signals to take.
+        :type maxItems: int
+        :return: The signals, oldest first.
+        :rtype: List[dbus_next.Message]
+        """
+        result = []
+        while len(result) < maxItems:
+            if self._intake:
+                result.append(self._intake.popleft())
+            elif self._spilled > 0:
+                result.append(self._unspill())
+            else:
+                self._overflowing = False
+                break
+        return result
+
+    def _prepare_safely(self, message: Message) -> List[Tuple[str, Any]]:
+        """
+        Parses a signal, logging any failure.
+        :param message: The signal.
+        :type message: dbus_next.Message
+        :return: Its events, with their names.
+        :rtype: List[Tuple[str, Any]]
+        """
+        try:
+            return self._prepare(message)
+        except Exception as error:
+            ArtifactListenerWorkerPool.logger().error(
+                f"Discarding unparseable {message.member} signal: {error}"
+            )
+            return []
+
+    async def _feed(self, executor: ThreadPoolExecutor):
+        """
+        Parses the signals in arrival order, and routes each event to the
+        lane of its repository.
+        :param executor: The thread pool parsing the signals, or None to parse them inline.
+        :type executor: concurrent.futures.ThreadPoolExecutor
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            messages = self._take(self.workers if executor is not None else 1)
+            if not messages:
+                self._available.clear()
+                await self._available.wait()
+                continue
+            if executor is None:
+                prepared = [self._prepare_safely(messages[0])]
+            else:
+                prepared = await asyncio.gather(
+                    *[
+                        loop.run_in_executor(executor, self._prepare_safely, message)
+                        for message in messages
+                    ]
+                )
+            for events in prepared:
+                for event_name, event in events:
+                    lane = self._lanes[hash(self._key(event)) % self.workers]
+                    await lane.put((event_name, event))
+            self.__class__._publish_depth()
+
+    async def _work(self, lane: asyncio.Queue):
+        """
+        Dispatches the events of a lane, one at a time.
+        :param lane: The lane.
+        :type lane: asyncio.Queue
+        """
+        while True:
+            event_name, event = await lane.get()
+            try:
+                await self._dispatch(event_name, event)
+            except Exception as error:
+                ArtifactListenerWorkerPool.logger().error(
+                    f"Error dispatching {event_name}: {error}"
+                )
+            finally:
+                lane.task_done()
+                self.__class__._publish_depth()
+
+    async def run(self):
+        """
+        Runs the parser and the dispatchers, forever.
+        """
+        self._lanes = [
+            asyncio.Queue(max(1, self.capacity // self.workers))
+            for _ in range(self.workers)
+        ]
+        executor = (
+            ThreadPoolExecutor(max_workers=self.workers)
+            if self.mode == "thread"
+            else None
+        )
+        try:
+            await asyncio.gather(
+                self._feed(executor), *[self._work(lane) for lane in self._lanes]
+            )
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+            if self._spill_writer is not None:
+                self._spill_writer.close()
+                self._spill_reader.close()
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
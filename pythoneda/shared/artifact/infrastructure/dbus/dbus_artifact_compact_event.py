@@ -0,0 +1,268 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/dbus/dbus_artifact_compact_event.py
+
+This file defines the DbusArtifactCompactEvent class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from dbus_next import Message
+from dbus_next.service import ServiceInterface, signal
+import json
+from pythoneda.shared import BaseObject, Event
+import struct
+from typing import List, Tuple, Type
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class DbusArtifactCompactEvent(BaseObject, ServiceInterface):
+    """
+    D-Bus interface for artifact events in a compact, compressed binary encoding.
+
+    Class name: DbusArtifactCompactEvent
+
+    Responsibilities:
+        - Define the d-bus interface of the compact signal.
+        - Encode the d-bus representation of an event as length-prefixed
+          binary fields, compressed with zlib or zstd.
+        - Decode a compact signal back into the d-bus message of the event.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalEmitter: Emits compact signals.
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalListener: Decodes them.
+
+    The payload is a 5-byte header (magic "PEC", version, codec) followed by
+    the compressed fields: the d-bus signature, the number of body items,
+    and each item as a type byte ("s" for strings, "j" for json) plus its
+    length-prefixed bytes.
+    """
+
+    INTERFACE = "Pythoneda.Artifact.CompactEvent"
+    PATH = "/pythoneda/artifact/compact_event"
+    MEMBER = "ArtifactCompactEvent"
+    MAGIC = b"PEC"
+    VERSION = 1
+    CODECS = {"none": 0, "zlib": 1, "zstd": 2}
+
+    def __init__(self):
+        """
+        Creates a new DbusArtifactCompactEvent.
+        """
+        super().__init__(self.__class__.INTERFACE)
+
+    @signal()
+    def ArtifactCompactEvent(self, event: "s", payload: "ay"):
+        """
+        Defines the ArtifactCompactEvent d-bus signal.
+        :param event: The event class.
+        :type event: str
+        :param payload: The encoded d-bus signature and body of the event.
+        :type payload: bytes
+        """
+        pass
+
+    @property
+    def path(self) -> str:
+        """
+        Retrieves the d-bus path.
+        :return: Such value.
+        :rtype: str
+        """
+        return self.__class__.PATH
+
+    @classmethod
+    def sign(cls) -> str:
+        """
+        Retrieves the signature of the compact signal.
+        :return: Such signature.
+        :rtype: str
+        """
+        return "say"
+
+    @classmethod
+    def available_codecs(cls) -> List[str]:
+        """
+        Retrieves the codecs this process can encode and decode.
+        :return: Their names.
+        :rtype: List[str]
+        """
+        return [
+            codec for codec in cls.CODECS if codec != "zstd" or zstandard is not None
+        ]
+
+    @classmethod
+    def compress(cls, data: bytes, codec: str) -> bytes:
+        """
+        Compresses given data.
+        :param data: The data.
+        :type data: bytes
+        :param codec: "none", "zlib" or "zstd".
+        :type codec: str
+        :return: The compressed data.
+        :rtype: bytes
+        """
+        if codec == "zlib":
+            return zlib.compress(data, 6)
+        if codec == "zstd":
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        return data
+
+    @classmethod
+    def decompress(cls, data: bytes, codec: int) -> bytes:
+        """
+        Decompresses given data.
+        :param data: The data.
+        :type data: bytes
+        :param codec: The codec identifier, as found in the header.
+        :type codec: int
+        :return: The decompressed data.
+        :rtype: bytes
+        """
+        if codec == cls.CODECS["zlib"]:
+            return zlib.decompress(data)
+        if codec == cls.CODECS["zstd"]:
+            if zstandard is None:
+                raise ValueError(
+                    "zstd-encoded artifact event, but zstandard is missing"
+                )
+            return zstandard.ZstdDecompressor().decompress(data)
+        if codec == cls.CODECS["none"]:
+            return data
+        raise ValueError(f"Unknown codec in compact artifact event: {codec}")
+
+    @classmethod
+    def encode(cls, signature: str, body: List, codec: str = "zlib") -> bytes:
+        """
+        Encodes the d-bus signature and body of an event.
+        :param signature: The d-bus signature.
+        :type signature: str
+        :param body: The d-bus body.
+        :type body: List
+        :param codec: "none", "zlib" or "zstd".
+        :type codec: str
+        :return: The payload.
+        :rtype: bytes
+        """
+        encoded_signature = signature.encode("utf-8")
+        fields = [
+            struct.pack(">H", len(encoded_signature)),
+            encoded_signature,
+            struct.pack(">I", len(body)),
+        ]
+        for item in body:
+            if isinstance(item, str):
+                kind, data = b"s", item.encode("utf-8")
+            else:
+                kind, data = b"j", json.dumps(item).encode("utf-8")
+            fields.extend([kind, struct.pack(">I", len(data)), data])
+        return (
+            cls.MAGIC
+            + bytes([cls.VERSION, cls.CODECS[codec]])
+            + cls.compress(b"".join(fields), codec)
+        )
+
+    @classmethod
+    def decode(cls, payload: bytes) -> Tuple[str, List]:
+        """
+        Decodes a payload.
+        :param payload: The payload.
+        :type payload: bytes
+        :return: The d-bus signature and body.
+        :rtype: Tuple[str, List]
+        """
+        payload = bytes(payload)
+        if payload[:3] != cls.MAGIC or payload[3] != cls.VERSION:
+            raise ValueError("Unsupported compact artifact event")
+        data = memoryview(cls.decompress(payload[5:], payload[4]))
+        (length,) = struct.unpack_from(">H", data, 0)
+        offset = 2 + length
+        signature = bytes(data[2:offset]).decode("utf-8")
+        (count,) = struct.unpack_from(">I", data, offset)
+        offset += 4
+        body = []
+        for _ in range(count):
+            kind = bytes(data[offset : offset + 1])
+            (length,) = struct.unpack_from(">I", data, offset + 1)
+            offset += 5
+            text = bytes(data[offset : offset + length]).decode("utf-8")
+            offset += length
+            body.append(text if kind == b"s" else json.loads(text))
+        return signature, body
+
+    @classmethod
+    def new_signal(
+        cls, event: Event, signature: str, body: List, codec: str = "zlib"
+    ) -> Message:
+        """
+        Builds the compact signal for given event.
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        :param signature: The d-bus signature of the event.
+        :type signature: str
+        :param body: The d-bus body of the event.
+        :type body: List
+        :param codec: "none", "zlib" or "zstd".
+        :type codec: str
+        :return: The signal.
+        :rtype: dbus_next.Message
+        """
+        return Message.new_signal(
+            cls.PATH,
+            cls.INTERFACE,
+            cls.MEMBER,
+            cls.sign(),
+            [
+                cls.full_class_name(event.__class__),
+                cls.encode(signature, body, codec),
+            ],
+        )
+
+    @classmethod
+    def unpack(cls, message: Message) -> List[Tuple[str, Message]]:
+        """
+        Decodes a compact signal into the message of its event.
+        :param message: The compact signal.
+        :type message: dbus_next.Message
+        :return: The event class name and its own d-bus message, as the only item.
+        :rtype: List[Tuple[str, dbus_next.Message]]
+        """
+        event_class_name, payload = message.body
+        signature, body = cls.decode(payload)
+        return [
+            (
+                event_class_name,
+                Message.new_signal(
+                    message.path,
+                    message.interface,
+                    event_class_name.rsplit(".", 1)[-1],
+                    signature,
+                    body,
+                ),
+            )
+        ]
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
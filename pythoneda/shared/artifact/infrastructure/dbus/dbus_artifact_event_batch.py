@@ -0,0 +1,147 @@
+# vim: set fileencoding=utf-8
+"""
+pythoneda/shared/artifact/infrastructure/dbus/dbus_artifact_event_batch.py
+
+This file defines the DbusArtifactEventBatch class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from dbus_next import Message
+from dbus_next.service import ServiceInterface, signal
+import json
+from pythoneda.shared import BaseObject, Event
+from typing import List, Tuple, Type
+
+
+class DbusArtifactEventBatch(BaseObject, ServiceInterface):
+    """
+    D-Bus interface for envelopes carrying several artifact events in one signal.
+
+    Class name: DbusArtifactEventBatch
+
+    Responsibilities:
+        - Define the d-bus interface of the envelope signal.
+        - Pack the d-bus representation of several events into one envelope.
+        - Unpack an envelope into the individual d-bus messages.
+
+    Collaborators:
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalEmitter: Emits envelopes.
+        - pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalListener: Unpacks envelopes.
+    """
+
+    INTERFACE = "Pythoneda.Artifact.EventBatch"
+    PATH = "/pythoneda/artifact/event_batch"
+    MEMBER = "ArtifactEventBatch"
+
+    def __init__(self):
+        """
+        Creates a new DbusArtifactEventBatch.
+        """
+        super().__init__(self.__class__.INTERFACE)
+
+    @signal()
+    def ArtifactEventBatch(self, events: "a(sss)"):
+        """
+        Defines the ArtifactEventBatch d-bus signal.
+        :param events: For each event, its class, its d-bus signature and its d-bus body as json.
+        :type events: List[Tuple[str, str, str]]
+        """
+        pass
+
+    @property
+    def path(self) -> str:
+        """
+        Retrieves the d-bus path.
+        :return: Such value.
+        :rtype: str
+        """
+        return self.__class__.PATH
+
+    @classmethod
+    def sign(cls) -> str:
+        """
+        Retrieves the signature of the envelope.
+        :return: Such signature.
+        :rtype: str
+        """
+        return "a(sss)"
+
+    @classmethod
+    def transform(cls, events: List[Tuple[Type, Event]]) -> List:
+        """
+        Packs given events into the body of an envelope.
+        :param events: The events, each one along with its d-bus class.
+        :type events: List[Tuple[Type, pythoneda.shared.Event]]
+        :return: The envelope body.
+        :rtype: List
+        """
+        return [
+            [
+                [
+                    cls.full_class_name(event.__class__),
+                    dbus_class.sign(event),
+                    json.dumps(dbus_class.transform(event)),
+                ]
+                for dbus_class, event in events
+            ]
+        ]
+
+    @classmethod
+    def new_signal(cls, events: List[Tuple[Type, Event]]) -> Message:
+        """
+        Builds the envelope signal for given events.
+        :param events: The events, each one along with its d-bus class.
+        :type events: List[Tuple[Type, pythoneda.shared.Event]]
+        :return: The signal.
+        :rtype: dbus_next.Message
+        """
+        return Message.new_signal(
+            cls.PATH, cls.INTERFACE, cls.MEMBER, cls.sign(), cls.transform(events)
+        )
+
+    @classmethod
+    def unpack(cls, message: Message) -> List[Tuple[str, Message]]:
+        """
+        Unpacks an envelope into the messages of its events.
+        :param message: The envelope.
+        :type message: dbus_next.Message
+        :return: For each event, its class name and its own d-bus message.
+        :rtype: List[Tuple[str, dbus_next.Message]]
+        """
+        result = []
+        for event_class_name, signature, body in message.body[0]:
+            member = event_class_name.rsplit(".", 1)[-1]
+            result.append(
+                (
+                    event_class_name,
+                    Message.new_signal(
+                        message.path,
+                        message.interface,
+                        member,
+                        signature,
+                        json.loads(body),
+                    ),
+                )
+            )
+        return result
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,176 @@
+# vim: set fileencoding=utf-8
+"""
+tests/cli/test_artifact_cli.py
+
+This file tests the ArtifactCli class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from argparse import ArgumentParser
+import asyncio
+from pythoneda.shared.artifact.infrastructure.cli import (
+    ArtifactCli,
+    ArtifactCliHandlerRegistry,
+)
+import pytest
+import sys
+
+PACKAGE = "pythoneda.shared.artifact.infrastructure"
+
+# the self time, in microseconds, of the modules of this package a hook imports
+IMPORT_BUDGET = 100000
+
+HOOK = f"""
+from argparse import ArgumentParser
+from {PACKAGE}.cli.artifact_cli import ArtifactCli
+from {PACKAGE}.cli.artifact_cli_handler_registry import ArtifactCliHandlerRegistry
+import sys
+parser = ArgumentParser()
+ArtifactCli().add_arguments(parser)
+args = parser.parse_args(["-e", "TagPushed", "-r", "/tmp", "-t", "0.0.1"])
+ArtifactCliHandlerRegistry.instance().handler(args.event)
+print("\\n".join(sys.modules))
+"""
+
+
+class SlowHandler:
+    """
+    Stands in for a CLI handler, recording how many folders it handles at once.
+    It exits, as handlers do, for the folders named "broken".
+    """
+
+    def __init__(self):
+        """
+        Creates a new SlowHandler instance.
+        """
+        self.running = 0
+        self.peak = 0
+        self.folders = []
+
+    async def handle(self, app, args):
+        """
+        Handles an event, slowly.
+        """
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.05)
+        self.running -= 1
+        if args.repository_folder.endswith("broken"):
+            sys.exit(1)
+        self.folders.append(args.repository_folder)
+
+
+@pytest.fixture
+def workspace(tmp_path, git):
+    """
+    Creates a workspace with five repositories, one of them named "broken".
+    :return: The workspace folder.
+    :rtype: pathlib.Path
+    """
+    result = tmp_path / "workspace"
+    for name in ["a", "b", "broken", "c", "d"]:
+        folder = result / name
+        folder.mkdir(parents=True)
+        git(folder, "init", "-q", "-b", "main")
+        git(folder, "commit", "-q", "--allow-empty", "-m", name)
+    return result
+
+
+def imported_modules(run_python, code: str) -> dict:
+    """
+    Runs given code with -X importtime.
+    The code prints the names of the modules it imported, since those
+    imported through importlib.import_module don't appear in the report.
+    :return: The self time, in microseconds, of each module found in the
+    report, or None for the rest.
+    :rtype: dict
+    """
+    process = run_python(code, env={"PYTHONPROFILEIMPORTTIME": "1"})
+    assert process.returncode == 0, process.stderr
+    result = dict.fromkeys(process.stdout.split())
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            self_time, _, module = line[len("import time:") :].split("|")
+            if self_time.strip().isdigit():
+                result[module.strip()] = int(self_time)
+    return result
+
+
+def test_a_hook_only_imports_the_handler_of_its_event(run_python):
+    modules = imported_modules(run_python, HOOK)
+
+    assert f"{PACKAGE}.cli.tag_pushed_cli_handler" in modules
+    assert [module for module in modules if module.endswith("_cli_handler")] == [
+        f"{PACKAGE}.cli.tag_pushed_cli_handler"
+    ]
+    for module in [
+        "artifact_daemon",
+        "artifact_outbox_drainer",
+        "artifact_workspace",
+        "artifact_repository_watcher",
+    ]:
+        assert f"{PACKAGE}.cli.{module}" not in modules
+    assert not [module for module in modules if module.startswith("dbus_next")]
+    assert f"{PACKAGE}.dbus" not in modules
+
+
+def test_a_hook_stays_within_its_import_budget(run_python):
+    modules = imported_modules(run_python, HOOK)
+
+    assert (
+        sum(time or 0 for module, time in modules.items() if module.startswith(PACKAGE))
+        < IMPORT_BUDGET
+    )
+
+
+def test_workspace_handlers_run_concurrently_within_the_workers(workspace, monkeypatch):
+    monkeypatch.setattr(ArtifactCliHandlerRegistry, "_singleton", None)
+    handler = SlowHandler()
+    ArtifactCliHandlerRegistry.instance().register("TagPushed", handler)
+    cli = ArtifactCli()
+    parser = ArgumentParser()
+    cli.add_arguments(parser)
+    args = parser.parse_args(
+        ["-e", "TagPushed", "-t", "0.0.1", "-w", str(workspace), "--workers", "2"]
+    )
+
+    asyncio.run(cli.handle(None, args))
+
+    assert handler.peak == 2
+    assert sorted(handler.folders) == [
+        str(workspace / name) for name in ["a", "b", "c", "d"]
+    ]
+
+
+def test_the_repository_folder_port_does_not_import_the_watcher(run_python):
+    modules = imported_modules(
+        run_python,
+        f"from {PACKAGE}.cli.repository_folder_cli import RepositoryFolderCli\n"
+        "import sys\n"
+        'print("\\n".join(sys.modules))',
+    )
+
+    assert f"{PACKAGE}.cli.repository_folder_cli" in modules
+    assert f"{PACKAGE}.cli.artifact_repository_watcher" not in modules
+    assert f"{PACKAGE}.cli.artifact_cli" not in modules
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,236 @@
+# vim: set fileencoding=utf-8
+"""
+tests/cli/test_artifact_daemon.py
+
+This file tests the ArtifactDaemon and ArtifactHookClient classes.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import os
+from pythoneda.shared.artifact.infrastructure.cli import (
+    ArtifactCli,
+    ArtifactDaemon,
+    ArtifactHookClient,
+)
+import pythoneda.shared.artifact.infrastructure.cli.artifact_hook_client as hook_client
+import pytest
+import subprocess
+import sys
+
+
+class RecordingCli(ArtifactCli):
+    """
+    An ArtifactCli that records the requests instead of handling them.
+    """
+
+    def __init__(self):
+        """
+        Creates a new RecordingCli instance.
+        """
+        super().__init__()
+        self.requests = asyncio.Queue()
+
+    async def handle_event(self, app, args):
+        """
+        Records a single-repository request.
+        """
+        self.requests.put_nowait(("event", args))
+
+    async def handle_workspace(self, app, args):
+        """
+        Records a workspace request.
+        """
+        self.requests.put_nowait(("workspace", args))
+
+
+def run_hook(socketPath: str, cwd: str, *argv: str) -> subprocess.CompletedProcess:
+    """
+    Runs the hook client as git would, without the PythonEDA stack.
+    :param socketPath: The daemon socket.
+    :type socketPath: str
+    :param cwd: The folder to run it in.
+    :type cwd: str
+    :param argv: Its arguments.
+    :type argv: List[str]
+    :return: The finished process.
+    :rtype: subprocess.CompletedProcess
+    """
+    return subprocess.run(
+        [sys.executable, hook_client.__file__, *argv],
+        cwd=cwd,
+        env={**os.environ, ArtifactHookClient.SOCKET_ENV_VAR: socketPath},
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+
+async def serve_and_run(socketPath: str, cwd: str, *argv: str):
+    """
+    Serves hook requests while the hook client runs.
+    :param socketPath: The daemon socket.
+    :type socketPath: str
+    :param cwd: The folder to run the client in.
+    :type cwd: str
+    :param argv: The client arguments.
+    :type argv: List[str]
+    :return: The finished client, and the request the daemon dispatched, if any.
+    :rtype: Tuple[subprocess.CompletedProcess, Tuple[str, argparse.Namespace]]
+    """
+    cli = RecordingCli()
+    serving = asyncio.ensure_future(ArtifactDaemon(None, cli, socketPath).serve())
+    try:
+        for _ in range(100):
+            if os.path.exists(socketPath) or serving.done():
+                break
+            await asyncio.sleep(0.05)
+        process = await asyncio.get_running_loop().run_in_executor(
+            None, run_hook, socketPath, cwd, *argv
+        )
+        request = None
+        if process.returncode == ArtifactHookClient.EXIT_ACCEPTED:
+            request = await asyncio.wait_for(cli.requests.get(), 10)
+        return process, request
+    finally:
+        serving.cancel()
+        await asyncio.gather(serving, return_exceptions=True)
+
+
+def test_requests_reach_the_daemon_with_absolute_paths(tmp_path):
+    socket_path = str(tmp_path / "run" / "artifact.sock")
+
+    process, (kind, args) = asyncio.run(
+        serve_and_run(
+            socket_path, str(tmp_path), "-e", "TagPushed", "-r", "repo", "-t", "v1.0.0"
+        )
+    )
+
+    assert process.returncode == ArtifactHookClient.EXIT_ACCEPTED, process.stderr
+    assert kind == "event"
+    assert args.event == "TagPushed"
+    assert args.tag == "v1.0.0"
+    assert args.repository_folder == str(tmp_path / "repo")
+    assert os.stat(tmp_path / "run").st_mode & 0o777 == 0o700
+    assert not os.path.exists(socket_path)
+
+
+def test_workspace_and_image_paths_are_made_absolute(tmp_path):
+    socket_path = str(tmp_path / "run" / "artifact.sock")
+
+    process, (kind, args) = asyncio.run(
+        serve_and_run(
+            socket_path,
+            str(tmp_path),
+            "-e",
+            "DockerImagePushed",
+            "-R",
+            "one",
+            "/abs/two",
+            "-w",
+            "workspace",
+            "--image-path",
+            "image.tar",
+        )
+    )
+
+    assert process.returncode == ArtifactHookClient.EXIT_ACCEPTED, process.stderr
+    assert kind == "workspace"
+    assert args.repository_folders == [str(tmp_path / "one"), "/abs/two"]
+    assert args.workspace == [str(tmp_path / "workspace")]
+    assert args.image_path == str(tmp_path / "image.tar")
+
+
+def test_daemon_rejects_invalid_requests(tmp_path):
+    socket_path = str(tmp_path / "run" / "artifact.sock")
+
+    process, request = asyncio.run(
+        serve_and_run(socket_path, str(tmp_path), "-r", "repo")
+    )
+
+    assert process.returncode == ArtifactHookClient.EXIT_REJECTED
+    assert "mandatory" in process.stderr
+    assert request is None
+
+
+@pytest.mark.parametrize(
+    "argv, reason",
+    [
+        (["-e", "Bogus", "-r", "repo"], "invalid choice"),
+        (["-e", "TagPushed", "--workers", "many"], "invalid int value"),
+        (["-e", "TagPushed", "--bogus"], "unrecognized arguments"),
+    ],
+)
+def test_daemon_explains_unparseable_requests(tmp_path, argv, reason):
+    socket_path = str(tmp_path / "run" / "artifact.sock")
+
+    process, request = asyncio.run(serve_and_run(socket_path, str(tmp_path), *argv))
+
+    assert process.returncode == ArtifactHookClient.EXIT_REJECTED
+    assert reason in process.stderr
+    assert request is None
+
+
+def test_client_reports_a_missing_daemon(tmp_path):
+    process = run_hook(
+        str(tmp_path / "run" / "artifact.sock"), str(tmp_path), "-e", "TagPushed"
+    )
+
+    assert process.returncode == ArtifactHookClient.EXIT_UNAVAILABLE
+
+
+@pytest.mark.parametrize("mode", [0o755, 0o770, 0o701])
+def test_shared_socket_folders_are_refused(tmp_path, mode):
+    folder = tmp_path / "run"
+    folder.mkdir()
+    folder.chmod(mode)
+    socket_path = str(folder / "artifact.sock")
+
+    with pytest.raises(PermissionError):
+        asyncio.run(ArtifactDaemon(None, RecordingCli(), socket_path).serve())
+    process = run_hook(socket_path, str(tmp_path), "-e", "TagPushed")
+
+    assert process.returncode == ArtifactHookClient.EXIT_UNAVAILABLE
+    assert "Refusing" in process.stderr
+
+
+def test_symlinked_socket_folders_are_refused(tmp_path):
+    target = tmp_path / "target"
+    target.mkdir(mode=0o700)
+    (tmp_path / "run").symlink_to(target)
+    socket_path = str(tmp_path / "run" / "artifact.sock")
+
+    with pytest.raises(PermissionError):
+        asyncio.run(ArtifactDaemon(None, RecordingCli(), socket_path).serve())
+    process = run_hook(socket_path, str(tmp_path), "-e", "TagPushed")
+
+    assert process.returncode == ArtifactHookClient.EXIT_UNAVAILABLE
+
+
+def test_socket_falls_back_to_a_private_tmp_folder(monkeypatch):
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+
+    assert ArtifactHookClient.default_socket_path() == os.path.join(
+        "/tmp", f"pythoneda-artifact-{os.getuid()}", "artifact.sock"
+    )
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
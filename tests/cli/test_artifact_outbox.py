@@ -0,0 +1,227 @@
+# vim: set fileencoding=utf-8
+"""
+tests/cli/test_artifact_outbox.py
+
+This file tests the ArtifactOutbox and ArtifactOutboxDrainer classes.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import json
+import os
+from pythoneda.shared.artifact.events import TagPushed
+from pythoneda.shared.artifact.infrastructure.cli import (
+    ArtifactOutbox,
+    ArtifactOutboxDrainer,
+)
+import pytest
+
+APPEND_AND_EXIT = """
+import sys
+from pythoneda.shared.artifact.infrastructure.cli import ArtifactOutbox
+
+outbox = ArtifactOutbox(sys.argv[1], syncEvery=1000, syncInterval=1000)
+for index in range(int(sys.argv[2])):
+    outbox.append("folder", "TagPushed", [f"0.0.{index}", "0" * 40, "url", "main", "folder"])
+"""
+
+
+class RecordingEmitter:
+    """
+    Stands in for the emitter, recording the emitted events.
+    """
+
+    def __init__(self, failures: int = 0):
+        """
+        Creates a new RecordingEmitter instance.
+        :param failures: The number of emits that fail before the first success.
+        :type failures: int
+        """
+        self.events = []
+        self.failures = failures
+
+    async def emit(self, event):
+        """
+        Records an event, unless it must fail.
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        """
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("the bus is gone")
+        self.events.append(event)
+
+
+def tag_pushed_args(index: int) -> list:
+    """
+    Builds the arguments of a TagPushed event.
+    :param index: Its index, to tell events apart.
+    :type index: int
+    :return: The arguments.
+    :rtype: list
+    """
+    return [f"0.0.{index}", "0" * 40, "url", "main", "folder"]
+
+
+def dead_letters(outbox: ArtifactOutbox) -> list:
+    """
+    Reads the dead-letter file of given outbox.
+    :param outbox: The outbox.
+    :type outbox: pythoneda.shared.artifact.infrastructure.cli.ArtifactOutbox
+    :return: The dead-lettered records.
+    :rtype: list
+    """
+    path = os.path.join(outbox.folder, ArtifactOutbox.DEAD_LETTER_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    """
+    Creates an outbox in its own folder.
+    :return: The outbox.
+    :rtype: pythoneda.shared.artifact.infrastructure.cli.ArtifactOutbox
+    """
+    return ArtifactOutbox(str(tmp_path / "outbox"), maxSegmentBytes=200)
+
+
+def test_entries_appended_by_a_short_lived_process_are_kept(tmp_path, run_python):
+    folder = str(tmp_path / "outbox")
+
+    process = run_python(APPEND_AND_EXIT, folder, "5")
+
+    assert process.returncode == 0, process.stderr
+    entries = [entry for _, _, entry in ArtifactOutbox(folder).read()]
+    assert [entry["args"] for entry in entries] == [
+        tag_pushed_args(index) for index in range(5)
+    ]
+
+
+def test_appended_entries_are_synced_after_the_interval(tmp_path):
+    outbox = ArtifactOutbox(str(tmp_path / "outbox"), syncEvery=1000, syncInterval=0.1)
+    outbox.append("folder", "TagPushed", tag_pushed_args(0))
+    pending = len(outbox._unsynced)
+
+    asyncio.run(asyncio.sleep(0.5))
+
+    assert pending == 1
+    assert outbox._unsynced == []
+
+
+def test_drainer_forwards_in_order_and_removes_finished_segments(outbox):
+    for index in range(10):
+        outbox.append("folder", "TagPushed", tag_pushed_args(index))
+    emitter = RecordingEmitter()
+    segments = len(outbox.segments())
+
+    forwarded = asyncio.run(ArtifactOutboxDrainer(outbox, emitter).drain())
+
+    assert forwarded == 10
+    assert emitter.events == [TagPushed(*tag_pushed_args(index)) for index in range(10)]
+    assert segments > 1
+    assert len(outbox.segments()) == 1
+    assert list(outbox.read()) == []
+
+
+def test_bad_entries_are_dead_lettered_and_skipped(outbox):
+    outbox.append("folder", "TagPushed", tag_pushed_args(0))
+    outbox.append("folder", "NoSuchEvent", [])
+    outbox.append("folder", "TagPushed", ["too", "few"])
+    with open(os.path.join(outbox.folder, outbox.segments()[-1]), "ab") as file:
+        file.write(b"{not json\n")
+    outbox.append("folder", "TagPushed", tag_pushed_args(1))
+    outbox.sync()
+    emitter = RecordingEmitter()
+
+    asyncio.run(ArtifactOutboxDrainer(outbox, emitter).drain())
+
+    assert emitter.events == [TagPushed(*tag_pushed_args(index)) for index in range(2)]
+    assert len(dead_letters(outbox)) == 3
+    assert list(outbox.read()) == []
+
+
+def test_events_that_cannot_be_emitted_are_dead_lettered(outbox):
+    outbox.append("folder", "TagPushed", tag_pushed_args(0))
+    outbox.append("folder", "TagPushed", tag_pushed_args(1))
+    emitter = RecordingEmitter(failures=2)
+
+    asyncio.run(
+        ArtifactOutboxDrainer(outbox, emitter, maxAttempts=2, maxRetryDelay=0).drain()
+    )
+
+    assert emitter.events == [TagPushed(*tag_pushed_args(1))]
+    [dead_letter] = dead_letters(outbox)
+    assert dead_letter["entry"]["args"] == tag_pushed_args(0)
+    assert list(outbox.read()) == []
+
+
+def test_only_one_drainer_at_a_time(outbox):
+    outbox.append("folder", "TagPushed", tag_pushed_args(0))
+    other = ArtifactOutbox(outbox.folder)
+    emitter = RecordingEmitter()
+
+    async def scenario():
+        assert other.lock()
+        draining = asyncio.ensure_future(
+            ArtifactOutboxDrainer(outbox, emitter, pollInterval=0.05).drain()
+        )
+        await asyncio.sleep(0.3)
+        waiting = not draining.done() and emitter.events == []
+        other.unlock()
+        return waiting, await asyncio.wait_for(draining, 10)
+
+    waiting, forwarded = asyncio.run(scenario())
+
+    assert waiting
+    assert forwarded == 1
+
+
+def test_run_survives_a_failed_round(outbox):
+    outbox.append("folder", "TagPushed", tag_pushed_args(0))
+    emitter = RecordingEmitter()
+    drainer = ArtifactOutboxDrainer(outbox, emitter, pollInterval=0.05)
+    read = outbox.read
+    failures = [OSError("disk trouble")]
+
+    def flaky_read(*args):
+        if failures:
+            raise failures.pop()
+        return read(*args)
+
+    outbox.read = flaky_read
+
+    async def scenario():
+        running = asyncio.ensure_future(drainer.run())
+        for _ in range(100):
+            if emitter.events:
+                break
+            await asyncio.sleep(0.05)
+        running.cancel()
+
+    asyncio.run(scenario())
+
+    assert emitter.events == [TagPushed(*tag_pushed_args(0))]
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,190 @@
+# vim: set fileencoding=utf-8
+"""
+tests/cli/test_artifact_replay_cli.py
+
+This file tests the ArtifactReplayCli class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from argparse import ArgumentParser
+import asyncio
+from pythoneda.shared.artifact.infrastructure.cli import (
+    ArtifactCli,
+    ArtifactOutbox,
+    ArtifactReplayCli,
+)
+import pytest
+
+
+class RecordingApp:
+    """
+    Stands in for the PythonEDA application, recording the events.
+    """
+
+    def __init__(self):
+        """
+        Creates a new RecordingApp instance.
+        """
+        self.events = []
+
+    async def emit(self, event):
+        """
+        Records an emitted event.
+        """
+        self.events.append(event)
+
+    async def accept(self, event):
+        """
+        Records an accepted event.
+        """
+        self.events.append(event)
+
+
+def replay(*argv: str):
+    """
+    Runs the replay with given arguments.
+    :param argv: The arguments.
+    :type argv: List[str]
+    :return: The events the application got.
+    :rtype: list
+    """
+    cli = ArtifactReplayCli()
+    parser = ArgumentParser()
+    cli.add_arguments(parser)
+    app = RecordingApp()
+    asyncio.run(cli.handle(app, parser.parse_args(list(argv))))
+    return app.events
+
+
+@pytest.fixture
+def tagged(repository, git):
+    """
+    Tags the commits of the repository, in a branch other than the commit hashes.
+    :return: The repository folder.
+    :rtype: pathlib.Path
+    """
+    git(repository, "tag", "v0", "HEAD~2")
+    git(repository, "tag", "-a", "-m", "one", "v1", "HEAD~1")
+    git(repository, "tag", "v2", "HEAD")
+    return repository
+
+
+def test_commits_carry_the_branch_as_revision(tagged, git, monkeypatch):
+    monkeypatch.setattr(ArtifactReplayCli, "BATCH_SIZE", 1)
+
+    events = replay("-r", str(tagged), "--replay-rev-range", "v0..v2")
+
+    assert sorted(event.commit for event in events) == sorted(
+        [git(tagged, "rev-parse", "v1^{commit}"), git(tagged, "rev-parse", "v2")]
+    )
+    assert {event.change.branch for event in events} == {"main"}
+
+
+def test_commits_of_a_repository_keep_their_order(repository, git, monkeypatch):
+    monkeypatch.setattr(ArtifactReplayCli, "BATCH_SIZE", 1)
+    commits = git(repository, "rev-list", "--reverse", "HEAD").split()
+    dispatched = []
+
+    async def handle_event(self, app, args):
+        # the older the commit, the slower its dispatch
+        await asyncio.sleep(0.05 * (len(commits) - commits.index(args.commits[0])))
+        dispatched.extend(args.commits)
+
+    monkeypatch.setattr(ArtifactCli, "handle_event", handle_event)
+
+    replay("-r", str(repository), "--replay-rev-range", "HEAD")
+
+    assert dispatched == commits
+
+
+def test_failed_dispatches_are_counted(repository, monkeypatch, capsys):
+    monkeypatch.setattr(ArtifactReplayCli, "BATCH_SIZE", 1)
+    dispatched = []
+
+    async def handle_event(self, app, args):
+        if not dispatched:
+            dispatched.append(None)
+            raise RuntimeError("unavailable")
+        dispatched.extend(args.commits)
+
+    monkeypatch.setattr(ArtifactCli, "handle_event", handle_event)
+
+    replay("-r", str(repository), "--replay-rev-range", "HEAD")
+
+    output = capsys.readouterr().out
+    assert len(dispatched) == 3
+    assert "Replayed 2 events" in output
+    assert "1 failed dispatches" in output
+
+
+def test_tags_carry_the_branch_as_revision(tagged, git):
+    events = replay("-r", str(tagged), "--replay-tags")
+
+    assert sorted((event.tag, event.commit, event.branch) for event in events) == [
+        (tag, git(tagged, "rev-parse", f"{tag}^{{commit}}"), "main")
+        for tag in ["v0", "v1", "v2"]
+    ]
+
+
+def test_tagged_events_go_one_by_one(tagged):
+    events = replay(
+        "-r",
+        str(tagged),
+        "--replay-tags",
+        "v1",
+        "v2",
+        "--replay-event",
+        "CommittedChangesTagged",
+    )
+
+    assert sorted((event.tag, event.branch) for event in events) == [
+        ("v1", "main"),
+        ("v2", "main"),
+    ]
+
+
+def test_outbox_applies_to_replays(tagged):
+    events = replay("-r", str(tagged), "--replay-tags", "v1", "v2", "--outbox")
+
+    assert events == []
+    entries = [entry for _, _, entry in ArtifactOutbox.instance().read()]
+    assert sorted(entry["args"][0] for entry in entries) == ["v1", "v2"]
+
+
+def test_records_are_dispatched_to_their_handlers(tagged, tmp_path):
+    records = tmp_path / "records"
+    records.write_text(
+        f"# event folder tag\n"
+        f"TagPushed {tagged} v1\n"
+        f"CommittedChangesTagged {tagged} v2\n"
+        f"TagPushed {tagged} missing\n"
+        f"TagPushed\n"
+    )
+
+    events = replay("--replay-records", str(records))
+
+    assert sorted((type(event).__name__, event.tag) for event in events) == [
+        ("CommittedChangesTagged", "v2"),
+        ("TagPushed", "v1"),
+    ]
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
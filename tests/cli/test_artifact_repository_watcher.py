@@ -0,0 +1,223 @@
+# vim: set fileencoding=utf-8
+"""
+tests/cli/test_artifact_repository_watcher.py
+
+This file tests the ArtifactRepositoryWatcher class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import os
+from pythoneda.shared.artifact.infrastructure.cli import (
+    ArtifactCli,
+    ArtifactRepositoryWatcher,
+)
+
+
+class RecordingCli(ArtifactCli):
+    """
+    An ArtifactCli that records the events instead of handling them.
+    """
+
+    def __init__(self):
+        """
+        Creates a new RecordingCli instance.
+        """
+        super().__init__()
+        self.events = []
+
+    async def handle_event(self, app, args):
+        """
+        Records an event.
+        """
+        self.events.append((args.event, args.tag, getattr(args, "commits", None)))
+
+
+def compare(repository, change) -> list:
+    """
+    Snapshots given repository, changes it, and compares it again.
+    :param repository: The repository folder.
+    :type repository: pathlib.Path
+    :param change: The change.
+    :type change: Callable
+    :return: The events the watcher dispatched.
+    :rtype: list
+    """
+    cli = RecordingCli()
+    watcher = ArtifactRepositoryWatcher(None, cli, [str(repository)])
+    folder = watcher.folders[0]
+    watcher._snapshots[folder] = ArtifactRepositoryWatcher.snapshot(folder)
+    change()
+    asyncio.run(watcher._compare(folder))
+    return cli.events
+
+
+def commit(git, repository, name: str) -> str:
+    """
+    Commits a new file.
+    :param git: The git runner.
+    :type git: Callable
+    :param repository: The repository folder.
+    :type repository: pathlib.Path
+    :param name: The file name.
+    :type name: str
+    :return: The commit hash.
+    :rtype: str
+    """
+    (repository / name).write_text(f"{name}\n")
+    git(repository, "add", name)
+    git(repository, "commit", "-q", "-m", name)
+    return git(repository, "rev-parse", "HEAD")
+
+
+def test_snapshot_reads_loose_and_packed_refs(repository, git):
+    git(repository, "tag", "loose")
+    git(repository, "tag", "-a", "-m", "annotated", "packed")
+    git(repository, "pack-refs", "--all")
+    git(repository, "tag", "after")
+    head = git(repository, "rev-parse", "HEAD")
+
+    snapshot_head, branch, refs = ArtifactRepositoryWatcher.snapshot(str(repository))
+
+    assert snapshot_head == head
+    assert branch == "refs/heads/main"
+    assert refs["refs/tags/loose"] == head
+    assert refs["refs/tags/after"] == head
+    assert refs["refs/tags/packed"] == git(repository, "rev-parse", "packed")
+
+
+def test_new_commits_are_reported_in_order(repository, git):
+    hashes = []
+
+    events = compare(
+        repository,
+        lambda: hashes.extend(commit(git, repository, name) for name in ["a", "b"]),
+    )
+
+    assert events == [("StagedChangesCommitted", None, hashes)]
+
+
+def test_checkouts_of_known_commits_are_not_reported(repository, git):
+    git(repository, "branch", "other", "HEAD~1")
+
+    events = compare(repository, lambda: git(repository, "checkout", "-q", "other"))
+
+    assert events == []
+
+
+def test_new_tags_are_reported(repository, git):
+    events = compare(repository, lambda: git(repository, "tag", "v1.0.0"))
+
+    assert events == [("CommittedChangesTagged", "v1.0.0", None)]
+
+
+def test_pushes_are_not_reported_as_tag_pushes(repository, git, tmp_path):
+    remote = tmp_path / "remote.git"
+    git(tmp_path, "init", "-q", "--bare", str(remote))
+    git(repository, "remote", "add", "origin", str(remote))
+
+    def push():
+        commit(git, repository, "pushed")
+        git(repository, "tag", "v1.0.0")
+        git(repository, "push", "-q", "origin", "main", "--tags")
+
+    events = compare(repository, push)
+
+    assert "TagPushed" not in [event for event, _, _ in events]
+
+
+def test_pushes_of_the_branch_are_reported(repository, git, tmp_path):
+    remote = tmp_path / "remote.git"
+    git(tmp_path, "init", "-q", "--bare", str(remote))
+    git(repository, "remote", "add", "origin", str(remote))
+    hashes = []
+
+    def push():
+        hashes.append(commit(git, repository, "pushed"))
+        git(repository, "push", "-q", "origin", "main")
+
+    events = compare(repository, push)
+
+    assert events == [
+        ("StagedChangesCommitted", None, hashes),
+        ("CommittedChangesPushed", None, None),
+    ]
+
+
+def test_pulls_are_not_reported_as_pushes(repository, git, tmp_path):
+    remote = tmp_path / "remote.git"
+    git(tmp_path, "init", "-q", "--bare", str(remote))
+    git(repository, "remote", "add", "origin", str(remote))
+    git(repository, "push", "-q", "-u", "origin", "main")
+    other = tmp_path / "other"
+    git(tmp_path, "clone", "-q", "-b", "main", str(remote), str(other))
+    commit(git, other, "theirs")
+    git(other, "push", "-q", "origin", "main")
+
+    events = compare(repository, lambda: git(repository, "pull", "-q", "--ff-only"))
+
+    assert events == []
+
+
+def test_remote_refs_behind_the_branch_are_not_pushes(repository, git):
+    events = compare(
+        repository,
+        lambda: git(repository, "update-ref", "refs/remotes/origin/main", "HEAD~1"),
+    )
+
+    assert events == []
+
+
+def test_pushes_of_other_branches_are_not_reported(repository, git):
+    events = compare(
+        repository,
+        lambda: git(repository, "update-ref", "refs/remotes/origin/other", "HEAD"),
+    )
+
+    assert events == []
+
+
+def test_watch_reports_commits_as_they_happen(repository, git):
+    cli = RecordingCli()
+    watcher = ArtifactRepositoryWatcher(
+        None, cli, [str(repository)], settle=0.05, pollInterval=0.1
+    )
+
+    async def scenario():
+        watching = asyncio.ensure_future(watcher.watch())
+        await asyncio.sleep(0.3)
+        hash_value = await asyncio.get_running_loop().run_in_executor(
+            None, commit, git, repository, "watched"
+        )
+        for _ in range(100):
+            if cli.events:
+                break
+            await asyncio.sleep(0.05)
+        watching.cancel()
+        await asyncio.gather(watching, return_exceptions=True)
+        return hash_value
+
+    hash_value = asyncio.run(scenario())
+
+    assert cli.events == [("StagedChangesCommitted", None, [hash_value])]
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,167 @@
+# vim: set fileencoding=utf-8
+"""
+tests/cli/test_docker_image_pushed_cli_handler.py
+
+This file tests the DockerImagePushedCliHandler class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from argparse import ArgumentParser
+import asyncio
+import hashlib
+import json
+from pythoneda.shared.artifact.infrastructure.cli import (
+    ArtifactCli,
+    ArtifactOutbox,
+    ArtifactOutboxDrainer,
+    DockerImagePushedCliHandler,
+)
+import pytest
+
+REGISTRY = "https://registry.example.com"
+
+
+class RecordingApp:
+    """
+    Stands in for the PythonEDA application, recording the events.
+    """
+
+    def __init__(self):
+        """
+        Creates a new RecordingApp instance.
+        """
+        self.events = []
+
+    async def emit(self, event):
+        """
+        Records an emitted event.
+        """
+        self.events.append(event)
+
+
+def blob(folder, data: bytes) -> str:
+    """
+    Adds a blob to an OCI image layout.
+    :return: Its digest.
+    :rtype: str
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    (folder / "blobs" / "sha256" / digest).write_bytes(data)
+    return f"sha256:{digest}"
+
+
+@pytest.fixture
+def layout(tmp_path):
+    """
+    Creates an OCI image layout with a single layer.
+    :return: The layout folder and the digest of the layer.
+    :rtype: Tuple[pathlib.Path, str]
+    """
+    folder = tmp_path / "image"
+    (folder / "blobs" / "sha256").mkdir(parents=True)
+    layer = blob(folder, b"layer" * 100)
+    config = blob(folder, b"{}")
+    manifest = blob(
+        folder,
+        json.dumps(
+            {
+                "schemaVersion": 2,
+                "config": {"digest": config, "size": 2},
+                "layers": [{"digest": layer, "size": 500}],
+            }
+        ).encode("utf-8"),
+    )
+    (folder / "oci-layout").write_text('{"imageLayoutVersion": "1.0.0"}')
+    (folder / "index.json").write_text(
+        json.dumps(
+            {
+                "schemaVersion": 2,
+                "manifests": [
+                    {
+                        "mediaType": "application/vnd.oci.image.manifest.v1+json",
+                        "digest": manifest,
+                        "annotations": {"org.opencontainers.image.ref.name": "0.0.1"},
+                    }
+                ],
+            }
+        )
+    )
+    return folder, layer
+
+
+def pushed(layout, *argv: str):
+    """
+    Runs the handler on given layout.
+    :return: The events the application got.
+    :rtype: list
+    """
+    parser = ArgumentParser()
+    ArtifactCli().add_arguments(parser)
+    args = parser.parse_args(
+        [
+            "-e",
+            "DockerImagePushed",
+            "--image-path",
+            str(layout),
+            "--image",
+            "pythoneda/artifact:0.0.1",
+            "--registry-url",
+            f"{REGISTRY}/",
+            *argv,
+        ]
+    )
+    app = RecordingApp()
+    asyncio.run(DockerImagePushedCliHandler().handle(app, args))
+    return app.events
+
+
+def test_the_event_describes_the_pushed_image(layout):
+    folder, layer = layout
+
+    (event,) = pushed(folder)
+
+    assert (event.image_name, event.image_version) == ("pythoneda/artifact", "0.0.1")
+    assert event.image_url == "registry.example.com/pythoneda/artifact:0.0.1"
+    assert event.registry_url == REGISTRY
+    assert event.metadata["layers"] == f"{layer}/500"
+
+
+def test_outbox_entries_rebuild_the_same_event(layout):
+    folder, _ = layout
+    (expected,) = pushed(folder)
+
+    assert pushed(folder, "--outbox") == []
+    (entry,) = [entry for _, _, entry in ArtifactOutbox.instance().read()]
+    event = ArtifactOutboxDrainer.event(entry)
+
+    assert vars(event) == vars(expected)
+
+
+def test_outbox_entries_are_keyed_by_the_image_name(layout):
+    folder, _ = layout
+
+    pushed(folder, "--outbox")
+    (entry,) = [entry for _, _, entry in ArtifactOutbox.instance().read()]
+
+    assert entry["repository"] == "pythoneda/artifact"
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,132 @@
+# vim: set fileencoding=utf-8
+"""
+tests/cli/test_git_commit_extractor.py
+
+This file tests the GitCommitExtractor class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from pythoneda.shared.artifact.infrastructure.cli import GitCommitExtractor
+import pytest
+import subprocess
+
+PARTIAL_OUTPUT = (
+    r"printf '\001aaaa\000first\000\ndiff --git a/x b/x\n--- a/x\n+++ b/x\n@@ -0,0 +1 @@\n+one\n"
+    r"\001bbbb\000second\000\ndiff --git a/y b/y\n--- a/y\n+++ b/y\n@@ -0,0 +1,2 @@\n+cut'"
+)
+
+
+def test_latest_commit_is_extracted(repository, git):
+    hash_value, diff, message = GitCommitExtractor(str(repository)).latest_commit()
+
+    assert hash_value == git(repository, "rev-parse", "HEAD")
+    assert message == "commit 2\n\nbody 2"
+    assert "diff --git a/file2.txt b/file2.txt" in diff
+    assert "+content 2" in diff
+
+
+def test_commit_ranges_are_streamed_oldest_first(repository):
+    commits = list(GitCommitExtractor(str(repository)).commits("HEAD~2..HEAD"))
+
+    assert [message for _, _, message in commits] == [
+        "commit 1\n\nbody 1",
+        "commit 2\n\nbody 2",
+    ]
+    assert ["file1.txt" in diff for _, diff, _ in commits] == [True, False]
+
+
+def test_oversized_file_diffs_are_summarized(repository, git):
+    (repository / "big.txt").write_text("line\n" * 1000)
+    git(repository, "add", ".")
+    git(repository, "commit", "-q", "-m", "big")
+
+    _, diff, _ = GitCommitExtractor(
+        str(repository), maxFileDiffBytes=100
+    ).latest_commit()
+
+    assert "diff --git a/big.txt b/big.txt" in diff
+    assert "# pythoneda: diff omitted (" in diff
+    assert "+line" not in diff
+
+
+def test_file_diffs_are_capped_by_default(repository, git, monkeypatch):
+    (repository / "big.txt").write_text("line\n" * 1000)
+    git(repository, "add", ".")
+    git(repository, "commit", "-q", "-m", "big")
+    monkeypatch.setenv(GitCommitExtractor.MAX_FILE_DIFF_BYTES_ENV_VAR, "100")
+
+    _, capped, _ = GitCommitExtractor(str(repository)).latest_commit()
+    _, whole, _ = GitCommitExtractor(
+        str(repository), maxFileDiffBytes=0
+    ).latest_commit()
+
+    assert "# pythoneda: diff omitted (" in capped
+    assert "+line" in whole
+
+
+def test_merges_carry_their_combined_diffs(repository, git):
+    git(repository, "checkout", "-q", "-b", "other")
+    (repository / "file1.txt").write_text("theirs\n")
+    git(repository, "commit", "-q", "-am", "theirs")
+    git(repository, "checkout", "-q", "main")
+    (repository / "file2.txt").write_text("ours\n")
+    git(repository, "commit", "-q", "-am", "ours")
+    git(repository, "merge", "-q", "--no-ff", "--no-commit", "other")
+    (repository / "file1.txt").write_text("resolved\n")
+    git(repository, "commit", "-q", "-am", "merge")
+    extractor = GitCommitExtractor(str(repository))
+
+    _, shown, _ = extractor.commit("HEAD")
+    logged = list(extractor.commits("HEAD^..HEAD"))[-1][1]
+
+    assert "diff --cc file1.txt" in shown
+    assert "+resolved" in shown
+    assert logged == shown
+
+
+def test_failed_git_does_not_yield_the_truncated_commit(tmp_path):
+    extractor = GitCommitExtractor(str(tmp_path))
+    received = []
+
+    with pytest.raises(subprocess.CalledProcessError):
+        for commit in extractor._run(["sh", "-c", PARTIAL_OUTPUT + "; exit 1"]):
+            received.append(commit)
+
+    assert [hash_value for hash_value, _, _ in received] == ["aaaa"]
+
+
+def test_killed_git_does_not_yield_the_truncated_commit(tmp_path):
+    extractor = GitCommitExtractor(str(tmp_path), timeout=0.5)
+    received = []
+
+    with pytest.raises(subprocess.CalledProcessError):
+        for commit in extractor._run(["sh", "-c", PARTIAL_OUTPUT + "; exec sleep 30"]):
+            received.append(commit)
+
+    assert [hash_value for hash_value, _, _ in received] == ["aaaa"]
+
+
+def test_unknown_revisions_raise(repository):
+    with pytest.raises(subprocess.CalledProcessError):
+        GitCommitExtractor(str(repository)).commit("does-not-exist")
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
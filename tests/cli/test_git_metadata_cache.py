@@ -0,0 +1,88 @@
+# vim: set fileencoding=utf-8
+"""
+tests/cli/test_git_metadata_cache.py
+
+This file tests the GitMetadataCache class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+from pythoneda.shared.artifact.infrastructure.cli import GitMetadataCache
+import pytest
+import subprocess
+
+
+def test_metadata_is_read_from_the_repository(repository, git, tmp_path):
+    git(repository, "remote", "add", "origin", "https://example.com/repository")
+    cache = GitMetadataCache(str(tmp_path / "cache.json"))
+
+    metadata = cache.get(str(repository))
+
+    assert (metadata.url, metadata.rev) == ("https://example.com/repository", "main")
+
+
+def test_metadata_is_cached_until_the_refs_change(repository, git, tmp_path):
+    cache = GitMetadataCache(str(tmp_path / "cache.json"))
+    assert cache.get(str(repository)).rev == "main"
+    git(repository, "checkout", "-q", "-b", "feature")
+
+    assert (
+        GitMetadataCache(str(tmp_path / "cache.json")).get(str(repository)).rev
+        == "feature"
+    )
+
+
+def test_entries_persisted_by_other_processes_are_kept(git, tmp_path):
+    folders = []
+    for name in ["a", "b", "c"]:
+        folder = tmp_path / name
+        folder.mkdir()
+        git(folder, "init", "-q", "-b", name)
+        git(folder, "commit", "-q", "--allow-empty", "-m", name)
+        folders.append(str(folder))
+    cache_file = str(tmp_path / "cache.json")
+    first, second = GitMetadataCache(cache_file), GitMetadataCache(cache_file)
+
+    first.get(folders[0])
+    second.get(folders[1])
+    first.get(folders[2])
+
+    assert sorted(GitMetadataCache(cache_file)._load()) == sorted(
+        os.path.realpath(folder) for folder in folders
+    )
+
+
+def test_hits_keep_the_folder_of_the_caller(repository, tmp_path, monkeypatch):
+    cache_file = str(tmp_path / "cache.json")
+    monkeypatch.chdir(repository)
+    assert GitMetadataCache(cache_file).get(".").folder == "."
+
+    assert GitMetadataCache(cache_file).get(str(repository)).folder == str(repository)
+
+
+def test_hanging_git_is_killed(repository, tmp_path, hanging_git):
+    cache = GitMetadataCache(str(tmp_path / "cache.json"), timeout=0.5)
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        cache.get(str(repository))
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,90 @@
+# vim: set fileencoding=utf-8
+"""
+tests/cli/test_git_tag_resolver.py
+
+This file tests the GitTagResolver class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from pythoneda.shared.artifact.infrastructure.cli import GitTagResolver
+import pytest
+import time
+
+TAGS = ["lightweight", "annotated", "nested", "twice-nested"]
+
+
+@pytest.fixture(params=["loose", "packed-refs", "packed-objects"])
+def tagged(request, repository, git):
+    """
+    Creates lightweight, annotated and nested tags, with their refs and
+    objects loose, with their refs packed, or with everything packed.
+    :return: The repository folder.
+    :rtype: pathlib.Path
+    """
+    git(repository, "tag", "lightweight", "HEAD~2")
+    git(repository, "tag", "-a", "-m", "annotated", "annotated", "HEAD~1")
+    git(repository, "tag", "-a", "-m", "nested", "nested", "annotated")
+    git(repository, "tag", "-a", "-m", "twice", "twice-nested", "nested")
+    git(repository, "tag", "tree", "HEAD^{tree}")
+    if request.param == "packed-refs":
+        git(repository, "pack-refs", "--all")
+    elif request.param == "packed-objects":
+        git(repository, "gc", "-q")
+    return repository
+
+
+def expected(repository, git, tags):
+    """
+    Retrieves the commits given tags point to, according to git.
+    :return: A list of (tag, commit hash) tuples.
+    :rtype: List[Tuple[str, str]]
+    """
+    return [(tag, git(repository, "rev-parse", f"{tag}^{{commit}}")) for tag in tags]
+
+
+def test_each_tag_is_resolved_to_its_commit(tagged, git):
+    resolver = GitTagResolver(str(tagged))
+
+    assert [(tag, resolver.resolve(tag)) for tag in TAGS] == expected(tagged, git, TAGS)
+
+
+def test_many_tags_are_resolved_to_their_commits(tagged, git):
+    assert GitTagResolver(str(tagged)).tags(TAGS) == expected(tagged, git, TAGS)
+
+
+def test_all_tags_pointing_to_commits_are_listed(tagged, git):
+    assert sorted(GitTagResolver(str(tagged)).tags()) == sorted(
+        expected(tagged, git, TAGS)
+    )
+
+
+def test_tags_not_pointing_to_commits_are_left_out(tagged):
+    assert GitTagResolver(str(tagged)).tags(["tree", "missing"]) == []
+
+
+def test_hanging_git_is_killed(repository, hanging_git):
+    start = time.monotonic()
+
+    assert GitTagResolver(str(repository), timeout=0.5).tags() == []
+    assert time.monotonic() - start < 10
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,126 @@
+# vim: set fileencoding=utf-8
+"""
+tests/cli/test_repository_folder_cli.py
+
+This file tests the RepositoryFolderCli class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from argparse import ArgumentParser
+import asyncio
+from pythoneda.shared.artifact.infrastructure.cli import RepositoryFolderCli
+import pytest
+
+
+class RecordingApp:
+    """
+    Stands in for the PythonEDA application, recording the repository folders.
+    """
+
+    def __init__(self):
+        """
+        Creates a new RecordingApp instance.
+        """
+        self.folders = []
+
+    def accept_repository_folder(self, folder: str):
+        """
+        Records a repository folder.
+        """
+        self.folders.append(folder)
+
+
+def accepted(*argv: str):
+    """
+    Runs RepositoryFolderCli with given arguments.
+    :param argv: The arguments.
+    :type argv: List[str]
+    :return: The repository folders the application got.
+    :rtype: List[str]
+    """
+    cli = RepositoryFolderCli()
+    parser = ArgumentParser()
+    cli.add_arguments(parser)
+    app = RecordingApp()
+    asyncio.run(cli.handle(app, parser.parse_args(list(argv))))
+    return app.folders
+
+
+@pytest.fixture
+def workspace(tmp_path, git):
+    """
+    Creates a workspace with two repositories and a folder which is not one.
+    :return: The workspace folder.
+    :rtype: pathlib.Path
+    """
+    result = tmp_path / "workspace"
+    for name in ["a", "b"]:
+        folder = result / name
+        folder.mkdir(parents=True)
+        git(folder, "init", "-q", "-b", "main")
+    (result / "notes").mkdir()
+    return result
+
+
+def test_a_single_folder_is_accepted(tmp_path):
+    assert accepted("-r", str(tmp_path)) == [str(tmp_path)]
+
+
+def test_every_repository_of_a_workspace_is_accepted(workspace):
+    assert accepted("-w", str(workspace)) == [
+        str(workspace / "a"),
+        str(workspace / "b"),
+    ]
+
+
+def test_every_repository_matching_the_patterns_is_accepted(workspace):
+    assert accepted("-R", str(workspace / "*")) == [
+        str(workspace / "a"),
+        str(workspace / "b"),
+    ]
+
+
+def test_watched_repositories_are_accepted(workspace, monkeypatch):
+    from pythoneda.shared.artifact.infrastructure.cli import (
+        ArtifactRepositoryWatcher,
+    )
+
+    watched = []
+
+    async def watch(self):
+        watched.extend(self.folders)
+
+    monkeypatch.setattr(ArtifactRepositoryWatcher, "watch", watch)
+
+    folders = accepted("--watch", "-w", str(workspace))
+
+    assert folders == [str(workspace / "a"), str(workspace / "b")]
+    assert len(watched) == 2
+
+
+def test_a_folder_is_mandatory(tmp_path):
+    with pytest.raises(SystemExit):
+        accepted()
+    with pytest.raises(SystemExit):
+        accepted("-w", str(tmp_path / "empty"))
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,129 @@
+# vim: set fileencoding=utf-8
+"""
+tests/common/test_artifact_dedup_index.py
+
+This file tests the ArtifactDedupIndex class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+from pythoneda.shared.artifact.events import Change, CommittedChangesPushed, TagPushed
+from pythoneda.shared.artifact.infrastructure.common import ArtifactDedupIndex
+from pythoneda.shared.artifact.infrastructure.dbus import ArtifactDbusSignalEmitter
+import pytest
+
+CHECK_AND_RECORD = """
+import sys
+from pythoneda.shared.artifact.events import Change, CommittedChangesPushed, TagPushed
+from pythoneda.shared.artifact.infrastructure.common import ArtifactDedupIndex
+
+sys.stdin.readline()
+index = ArtifactDedupIndex("emitter", window=60, folder=sys.argv[1])
+event = TagPushed("1.0.0", "0" * 40, "url", "main", "folder")
+print("duplicate" if index.check_and_record(event) else "recorded")
+"""
+
+
+def tag_pushed(tag: str = "1.0.0") -> TagPushed:
+    """
+    Builds a TagPushed event.
+    :param tag: The tag.
+    :type tag: str
+    :return: The event.
+    :rtype: pythoneda.shared.artifact.events.TagPushed
+    """
+    return TagPushed(tag, "0" * 40, "url", "main", "folder")
+
+
+def test_disabled_index_records_nothing(tmp_path):
+    index = ArtifactDedupIndex("emitter", window=0, folder=str(tmp_path))
+
+    assert not index.check_and_record(tag_pushed())
+    assert not index.check_and_record(tag_pushed())
+
+
+def test_events_are_remembered_across_processes(tmp_path):
+    first = ArtifactDedupIndex("emitter", window=60, folder=str(tmp_path))
+    second = ArtifactDedupIndex("emitter", window=60, folder=str(tmp_path))
+    other_scope = ArtifactDedupIndex("listener", window=60, folder=str(tmp_path))
+
+    assert not first.check_and_record(tag_pushed())
+
+    assert second.check_and_record(tag_pushed())
+    assert not second.check_and_record(tag_pushed("1.0.1"))
+    assert not other_scope.check_and_record(tag_pushed())
+
+
+def test_only_one_concurrent_process_records_an_event(tmp_path, spawn_python):
+    processes = [spawn_python(CHECK_AND_RECORD, str(tmp_path)) for _ in range(8)]
+    for process in processes:
+        process.stdin.write("go\n")
+        process.stdin.flush()
+    results = [process.communicate(timeout=60)[0].strip() for process in processes]
+
+    assert sorted(results) == ["duplicate"] * 7 + ["recorded"]
+
+
+def test_pushes_are_not_deduplicated_without_their_commit(tmp_path):
+    index = ArtifactDedupIndex("emitter", window=60, folder=str(tmp_path))
+
+    def pushed():
+        return CommittedChangesPushed(Change("", "url", "main", "folder"), None)
+
+    assert ArtifactDedupIndex.identity(pushed()) is None
+    assert not index.check_and_record(pushed())
+    assert not index.check_and_record(pushed())
+
+
+def test_forgotten_events_are_no_longer_duplicates(tmp_path):
+    first = ArtifactDedupIndex("emitter", window=60, folder=str(tmp_path))
+    second = ArtifactDedupIndex("emitter", window=60, folder=str(tmp_path))
+    first.check_and_record(tag_pushed())
+
+    first.forget(tag_pushed())
+
+    assert not second.check_and_record(tag_pushed())
+
+
+def test_emitter_forgets_events_it_could_not_send(tmp_path):
+    async def scenario():
+        emitter = ArtifactDbusSignalEmitter(
+            dedupIndex=ArtifactDedupIndex("emitter", window=60, folder=str(tmp_path))
+        )
+        sent = []
+        failures = [ConnectionError("the bus is gone")]
+
+        async def send(event):
+            if failures:
+                raise failures.pop()
+            sent.append(event)
+
+        emitter._send = send
+        with pytest.raises(ConnectionError):
+            await emitter.emit(tag_pushed())
+        await emitter.emit(tag_pushed())
+        await emitter.emit(tag_pushed())
+        return sent
+
+    assert asyncio.run(scenario()) == [tag_pushed()]
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
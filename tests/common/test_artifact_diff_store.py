@@ -0,0 +1,108 @@
+# vim: set fileencoding=utf-8
+"""
+tests/common/test_artifact_diff_store.py
+
+This file tests the ArtifactDiffStore class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+from pythoneda.shared.artifact.infrastructure.common import ArtifactDiffStore
+import time
+
+DIFF = "diff --git a/x b/x\n--- a/x\n+++ b/x\n@@ -0,0 +1 @@\n+{}\n"
+
+
+def stored(store: ArtifactDiffStore) -> list:
+    """
+    Retrieves the commits with a diff in given store.
+    :return: The commit hashes, sorted.
+    :rtype: list
+    """
+    return sorted(
+        name.split("-")[0]
+        for _, _, files in os.walk(store.folder)
+        for name in files
+        if name.endswith(".diff")
+    )
+
+
+def age(store: ArtifactDiffStore, reference: str, seconds: float):
+    """
+    Makes the diff of given reference look unused for some time.
+    """
+    _, commit, digest = ArtifactDiffStore.parse_reference(reference)
+    when = time.time() - seconds
+    os.utime(store.path(commit, digest), (when, when))
+
+
+def test_references_resolve_to_the_diffs(tmp_path):
+    store = ArtifactDiffStore(str(tmp_path))
+    reference = store.put("aaaa", DIFF.format("one"))
+
+    assert ArtifactDiffStore.parse_reference(reference)[1] == "aaaa"
+    assert store.resolve(reference) == DIFF.format("one")
+    assert store.resolve(DIFF.format("two")) == DIFF.format("two")
+
+
+def test_least_recently_used_diffs_are_evicted_beyond_the_size_cap(tmp_path):
+    store = ArtifactDiffStore(str(tmp_path), maxBytes=3 * len(DIFF) + 10, maxAge=0)
+    references = {
+        commit: store.put(commit, DIFF.format(commit))
+        for commit in ["aaaa", "bbbb", "cccc"]
+    }
+    for seconds, commit in enumerate(["cccc", "bbbb", "aaaa"]):
+        age(store, references[commit], 100 * (seconds + 1))
+    # resolving it makes the oldest one the most recently used
+    store.resolve(references["aaaa"])
+
+    store.put("dddd", DIFF.format("dddd"))
+    store.prune()
+
+    assert stored(store) == ["aaaa", "cccc", "dddd"]
+
+
+def test_diffs_unused_beyond_the_age_cap_are_evicted(tmp_path):
+    store = ArtifactDiffStore(str(tmp_path), maxBytes=0, maxAge=3600)
+    old = store.put("aaaa", DIFF.format("old"))
+    store.put("bbbb", DIFF.format("new"))
+    age(store, old, 7200)
+
+    assert store.prune() == 1
+    assert stored(store) == ["bbbb"]
+    assert store.resolve(old) == old
+
+
+def test_storing_prunes_at_most_once_per_interval(tmp_path):
+    store = ArtifactDiffStore(str(tmp_path), maxBytes=1, maxAge=0)
+
+    store.put("aaaa", DIFF.format("aaaa"))
+    store.put("bbbb", DIFF.format("bbbb"))
+    assert stored(store) == ["aaaa", "bbbb"]
+
+    when = time.time() - ArtifactDiffStore.PRUNE_INTERVAL
+    os.utime(os.path.join(store.folder, ArtifactDiffStore.LOCK_FILE), (when, when))
+    store.put("cccc", DIFF.format("cccc"))
+
+    assert stored(store) == ["cccc"]
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
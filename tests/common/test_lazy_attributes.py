@@ -0,0 +1,71 @@
+# vim: set fileencoding=utf-8
+"""
+tests/common/test_lazy_attributes.py
+
+This file tests the LazyAttributes class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from pythoneda.shared.artifact.infrastructure.common.lazy_attributes import (
+    LazyAttributes,
+)
+import pytest
+import sys
+import types
+
+
+@pytest.fixture
+def package(monkeypatch):
+    """
+    Registers a package whose attributes are lazy.
+    :return: The package.
+    :rtype: types.ModuleType
+    """
+    result = types.ModuleType("lazy_package")
+    monkeypatch.setitem(sys.modules, "lazy_package", result)
+    lazy_attributes = LazyAttributes(
+        "lazy_package", {"JSONDecoder": "json", "Missing": "json"}
+    )
+    result.__getattr__ = lazy_attributes.getattr
+    result.__dir__ = lazy_attributes.dir
+    return result
+
+
+def test_attributes_are_imported_and_kept_on_first_access(package):
+    import json
+
+    assert "JSONDecoder" not in vars(package)
+    assert package.JSONDecoder is json.JSONDecoder
+    assert vars(package)["JSONDecoder"] is json.JSONDecoder
+
+
+def test_unknown_attributes_raise(package):
+    with pytest.raises(AttributeError):
+        package.Unknown
+    with pytest.raises(AttributeError):
+        package.Missing
+
+
+def test_pending_attributes_are_listed(package):
+    assert {"JSONDecoder", "Missing"} <= set(dir(package))
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
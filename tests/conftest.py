@@ -0,0 +1,239 @@
+# vim: set fileencoding=utf-8
+"""
+tests/conftest.py
+
+This file defines the fixtures shared by the tests of the artifact infrastructure.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import pytest
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from benchmarks.private_dbus_daemon import PrivateDbusDaemon
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """
+    Keeps the caches, state and runtime files of each test in its own folder,
+    and disables the optional features configured through the environment.
+    Shared instances are rebuilt for each test, so they pick the new folders.
+    """
+    for name in ["XDG_CACHE_HOME", "XDG_STATE_HOME", "XDG_RUNTIME_DIR"]:
+        folder = tmp_path / name.lower()
+        folder.mkdir(mode=0o700)
+        monkeypatch.setenv(name, str(folder))
+    for name in list(os.environ):
+        if name.startswith("PYTHONEDA_ARTIFACT_"):
+            monkeypatch.delenv(name)
+    from pythoneda.shared.artifact.infrastructure.cli import (
+        ArtifactOutbox,
+        GitMetadataCache,
+    )
+    from pythoneda.shared.artifact.infrastructure.common import (
+        ArtifactDiffStore,
+        ArtifactMetrics,
+    )
+
+    # their shared instances would keep the folders of the first test
+    for singleton_class in [
+        ArtifactDiffStore,
+        ArtifactMetrics,
+        ArtifactOutbox,
+        GitMetadataCache,
+    ]:
+        monkeypatch.setattr(singleton_class, "_singleton", None)
+
+
+@pytest.fixture
+def private_bus(tmp_path):
+    """
+    Starts a throwaway dbus-daemon.
+    :return: Its d-bus address.
+    :rtype: str
+    """
+    if not PrivateDbusDaemon.available():
+        pytest.skip("dbus-daemon is not installed")
+    daemon = PrivateDbusDaemon(str(tmp_path / "bus"))
+    try:
+        yield daemon.start()
+    finally:
+        daemon.stop()
+
+
+def _environment(env: dict = None) -> dict:
+    """
+    Builds the environment of the Python processes tests start.
+    :param env: Extra environment variables.
+    :type env: dict
+    :return: The environment, with this repository importable.
+    :rtype: dict
+    """
+    result = dict(os.environ)
+    result["PYTHONPATH"] = os.pathsep.join(
+        [path for path in [result.get("PYTHONPATH"), ROOT] if path]
+    )
+    result.update(env or {})
+    return result
+
+
+def _spawn_python(code: str, *args: str, env: dict = None) -> subprocess.Popen:
+    """
+    Starts given code in a Python process, with this repository importable,
+    and its standard input and output piped.
+    :param code: The code.
+    :type code: str
+    :param args: Its arguments.
+    :type args: List[str]
+    :param env: Extra environment variables.
+    :type env: dict
+    :return: The process.
+    :rtype: subprocess.Popen
+    """
+    return subprocess.Popen(
+        [sys.executable, "-c", code, *args],
+        env=_environment(env),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+
+def _run_python(code: str, *args: str, env: dict = None, input: str = None):
+    """
+    Runs given code in a short-lived Python process, with this repository importable.
+    :param code: The code.
+    :type code: str
+    :param args: Its arguments.
+    :type args: List[str]
+    :param env: Extra environment variables.
+    :type env: dict
+    :param input: Its standard input.
+    :type input: str
+    :return: The finished process.
+    :rtype: subprocess.CompletedProcess
+    """
+    return subprocess.run(
+        [sys.executable, "-c", code, *args],
+        env=_environment(env),
+        input=input,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+
+@pytest.fixture
+def run_python():
+    """
+    Provides a way to run code in short-lived Python processes.
+    :return: A function taking the code, its arguments, and optionally extra
+    environment variables and the standard input.
+    :rtype: Callable
+    """
+    return _run_python
+
+
+@pytest.fixture
+def spawn_python():
+    """
+    Provides a way to start code in Python processes, to drive them through
+    their standard input.
+    :return: A function taking the code, its arguments, and optionally extra
+    environment variables.
+    :rtype: Callable
+    """
+    return _spawn_python
+
+
+def _git(folder, *args: str) -> str:
+    """
+    Runs git in given folder.
+    :param folder: The folder.
+    :type folder: pathlib.Path
+    :param args: The git arguments.
+    :type args: List[str]
+    :return: Its output.
+    :rtype: str
+    """
+    return subprocess.run(
+        ["git", "-C", str(folder), *args],
+        check=True,
+        capture_output=True,
+        text=True,
+        env={
+            "GIT_AUTHOR_NAME": "test",
+            "GIT_AUTHOR_EMAIL": "test@example.com",
+            "GIT_COMMITTER_NAME": "test",
+            "GIT_COMMITTER_EMAIL": "test@example.com",
+            "GIT_CONFIG_GLOBAL": "/dev/null",
+            "PATH": "/usr/bin:/bin:/usr/local/bin",
+        },
+    ).stdout.strip()
+
+
+@pytest.fixture
+def git():
+    """
+    Provides a way to run git in a folder, with a throwaway identity.
+    :return: A function taking the folder and the git arguments, and returning its output.
+    :rtype: Callable
+    """
+    return _git
+
+
+@pytest.fixture
+def repository(tmp_path):
+    """
+    Creates a repository with three commits.
+    :return: The repository folder.
+    :rtype: pathlib.Path
+    """
+    folder = tmp_path / "repository"
+    folder.mkdir()
+    _git(folder, "init", "-q", "-b", "main")
+    for index in range(3):
+        (folder / f"file{index}.txt").write_text(f"content {index}\n")
+        _git(folder, "add", ".")
+        _git(folder, "commit", "-q", "-m", f"commit {index}\n\nbody {index}")
+    return folder
+
+
+@pytest.fixture
+def hanging_git(tmp_path, monkeypatch):
+    """
+    Puts a git that never finishes first in the PATH.
+    """
+    folder = tmp_path / "bin"
+    folder.mkdir()
+    (folder / "git").write_text("#!/bin/sh\nexec sleep 30\n")
+    (folder / "git").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{folder}:/usr/bin:/bin")
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
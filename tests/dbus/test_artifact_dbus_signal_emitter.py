@@ -0,0 +1,206 @@
+# vim: set fileencoding=utf-8
+"""
+tests/dbus/test_artifact_dbus_signal_emitter.py
+
+This file tests the ArtifactDbusSignalEmitter class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+from dbus_next import Message
+from dbus_next.aio import MessageBus
+from pythoneda.shared.artifact.events import TagPushed
+from pythoneda.shared.artifact.events.infrastructure.dbus import DbusTagPushed
+from pythoneda.shared.artifact.infrastructure.dbus import (
+    ArtifactDbusSignalEmitter,
+    DbusArtifactEventBatch,
+)
+import pytest
+
+EMIT_AND_EXIT = """
+import asyncio
+import sys
+from pythoneda.shared.artifact.events import TagPushed
+from pythoneda.shared.artifact.infrastructure.dbus import ArtifactDbusSignalEmitter
+
+
+async def main(address, count):
+    emitter = ArtifactDbusSignalEmitter(
+        batchMaxSize=8, batchMaxLatency=0.05, transports={"*": address}
+    )
+    events = [
+        TagPushed(f"0.0.{index}", "0" * 40, "url", "main", "folder")
+        for index in range(count)
+    ]
+    # a burst filling some envelopes, and a straggler left alone
+    await asyncio.gather(*[emitter.emit(event) for event in events[:-1]])
+    await emitter.emit(events[-1])
+
+
+asyncio.run(main(sys.argv[1], int(sys.argv[2])))
+"""
+
+
+def tag_pushed(index: int) -> TagPushed:
+    """
+    Builds a TagPushed event.
+    :param index: Its index, to tell events apart.
+    :type index: int
+    :return: The event.
+    :rtype: pythoneda.shared.artifact.events.TagPushed
+    """
+    return TagPushed(f"0.0.{index}", "0" * 40, "url", "main", "folder")
+
+
+async def receive_tags(address: str, received: list) -> MessageBus:
+    """
+    Collects the tags of the TagPushed events sent through given bus,
+    alone or in envelopes.
+    :param address: The d-bus address.
+    :type address: str
+    :param received: The list to collect them in.
+    :type received: list
+    :return: The connection.
+    :rtype: dbus_next.aio.MessageBus
+    """
+    bus = await MessageBus(bus_address=address).connect()
+    for interface in [DbusArtifactEventBatch.INTERFACE, DbusTagPushed().name]:
+        await bus.call(
+            Message(
+                destination="org.freedesktop.DBus",
+                path="/org/freedesktop/DBus",
+                interface="org.freedesktop.DBus",
+                member="AddMatch",
+                signature="s",
+                body=[f"type='signal',interface='{interface}'"],
+            )
+        )
+
+    def on_message(message: Message):
+        if message.interface == DbusArtifactEventBatch.INTERFACE:
+            items = [item for _, item in DbusArtifactEventBatch.unpack(message)]
+        elif message.interface == DbusTagPushed().name:
+            items = [message]
+        else:
+            return
+        for item in items:
+            received.append(DbusTagPushed.parse(item, None).tag)
+
+    bus.add_message_handler(on_message)
+    return bus
+
+
+def test_batched_events_are_sent_before_a_short_lived_process_exits(
+    private_bus, run_python
+):
+    count = 21
+
+    async def scenario():
+        received = []
+        bus = await receive_tags(private_bus, received)
+        process = await asyncio.get_running_loop().run_in_executor(
+            None, run_python, EMIT_AND_EXIT, private_bus, str(count)
+        )
+        assert process.returncode == 0, process.stderr
+        for _ in range(50):
+            if len(received) >= count:
+                break
+            await asyncio.sleep(0.1)
+        bus.disconnect()
+        return received
+
+    received = asyncio.run(scenario())
+
+    assert sorted(received) == sorted(f"0.0.{index}" for index in range(count))
+
+
+def test_emit_waits_until_its_envelope_is_sent():
+    async def scenario():
+        emitter = ArtifactDbusSignalEmitter(
+            batchMaxSize=100, batchMaxLatency=0.01, transports={"*": "unix:path=/x"}
+        )
+        sent = []
+
+        async def send_batch(events, transport):
+            sent.extend(event for _, event in events)
+
+        emitter._send_batch = send_batch
+        events = [tag_pushed(index) for index in range(3)]
+        await asyncio.gather(*[emitter.emit(event) for event in events])
+        return events, sent
+
+    events, sent = asyncio.run(scenario())
+
+    assert sent == events
+
+
+def test_failed_flush_keeps_the_unsent_events_queued_in_order():
+    async def scenario():
+        emitter = ArtifactDbusSignalEmitter(
+            batchMaxSize=100, batchMaxLatency=60, transports={"*": "unix:path=/x"}
+        )
+        sent = []
+        attempts = []
+
+        async def send_batch(events, transport):
+            attempts.append(len(events))
+            if len(attempts) == 1:
+                raise ConnectionError("the bus is gone")
+            sent.extend(event for _, event in events)
+
+        emitter._send_batch = send_batch
+        events = [tag_pushed(index) for index in range(3)]
+        emissions = [asyncio.ensure_future(emitter.emit(event)) for event in events]
+        await asyncio.sleep(0)
+        with pytest.raises(ConnectionError):
+            await emitter.flush()
+        waiting = not any(emission.done() for emission in emissions)
+        late = tag_pushed(3)
+        emissions.append(asyncio.ensure_future(emitter.emit(late)))
+        await asyncio.sleep(0)
+        await emitter.flush()
+        await asyncio.gather(*emissions)
+        return waiting, events + [late], sent
+
+    waiting, events, sent = asyncio.run(scenario())
+
+    assert waiting
+    assert sent == events
+
+
+def test_emit_raises_once_the_retries_are_exhausted():
+    async def scenario():
+        emitter = ArtifactDbusSignalEmitter(
+            batchMaxSize=100, batchMaxLatency=0.001, transports={"*": "unix:path=/x"}
+        )
+
+        async def send_batch(events, transport):
+            raise ConnectionError("the bus is gone")
+
+        emitter._send_batch = send_batch
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(emitter.emit(tag_pushed(0)), 10)
+        return emitter._pending
+
+    assert asyncio.run(scenario()) == []
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,169 @@
+# vim: set fileencoding=utf-8
+"""
+tests/dbus/test_artifact_dbus_signal_listener.py
+
+This file tests the ArtifactDbusSignalListener class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+from pythoneda.shared.artifact.events import TagPushed
+from pythoneda.shared.artifact.infrastructure.common import ArtifactDedupIndex
+from pythoneda.shared.artifact.infrastructure.dbus import (
+    ArtifactDbusSignalEmitter,
+    ArtifactDbusSignalListener,
+    ArtifactListenerWorkerPool,
+)
+
+
+class RecordingApp:
+    """
+    Stands in for the PythonEDA application, recording the accepted events.
+    """
+
+    def __init__(self):
+        """
+        Creates a new RecordingApp instance.
+        """
+        self.events = asyncio.Queue()
+
+    async def accept(self, event):
+        """
+        Records an accepted event.
+        :param event: The event.
+        :type event: pythoneda.shared.Event
+        """
+        self.events.put_nowait(event)
+
+
+class TagPushedListener(ArtifactDbusSignalListener):
+    """
+    A listener interested only in TagPushed events.
+    """
+
+    @classmethod
+    def event_types(cls):
+        return ["TagPushed"]
+
+
+def tag_pushed(index: int) -> TagPushed:
+    """
+    Builds a TagPushed event.
+    :param index: Its index, to tell events apart.
+    :type index: int
+    :return: The event.
+    :rtype: pythoneda.shared.artifact.events.TagPushed
+    """
+    return TagPushed(f"0.0.{index}", "0" * 40, "url", "main", "folder")
+
+
+async def listen_and_emit(
+    listener, address: str, events: list, expected: int, **emitterArgs
+) -> list:
+    """
+    Starts given listener, emits given events, and collects what the
+    application receives.
+    :param listener: The listener.
+    :type listener: pythoneda.shared.artifact.infrastructure.dbus.ArtifactDbusSignalListener
+    :param address: The d-bus address of the private bus.
+    :type address: str
+    :param events: The events to emit.
+    :type events: list
+    :param expected: The number of events to wait for.
+    :type expected: int
+    :return: The received events.
+    :rtype: list
+    """
+    app = RecordingApp()
+    listening = asyncio.ensure_future(listener.accept(app))
+    await asyncio.sleep(0.3)
+    assert not listening.done(), listening.exception()
+    emitter = ArtifactDbusSignalEmitter(transports={"*": address}, **emitterArgs)
+    await asyncio.gather(*[emitter.emit(event) for event in events])
+    result = []
+    try:
+        while len(result) < expected:
+            result.append(await asyncio.wait_for(app.events.get(), 10))
+        await asyncio.sleep(0.2)
+        while not app.events.empty():
+            result.append(app.events.get_nowait())
+    finally:
+        listening.cancel()
+    return result
+
+
+def test_listeners_of_all_events_go_through_the_worker_pool(private_bus, monkeypatch):
+    monkeypatch.setenv("PYTHONEDA_ARTIFACT_DBUS_TRANSPORTS", f"*={private_bus}")
+    offered = []
+    offer = ArtifactListenerWorkerPool.offer
+
+    def counting_offer(pool, message):
+        offered.append(message.member)
+        offer(pool, message)
+
+    monkeypatch.setattr(ArtifactListenerWorkerPool, "offer", counting_offer)
+    event = tag_pushed(0)
+
+    received = asyncio.run(
+        listen_and_emit(ArtifactDbusSignalListener(), private_bus, [event], 1)
+    )
+
+    assert received == [event]
+    assert offered == ["TagPushed"]
+
+
+def test_envelopes_are_unpacked_in_order(private_bus, monkeypatch):
+    monkeypatch.setenv("PYTHONEDA_ARTIFACT_DBUS_TRANSPORTS", f"*={private_bus}")
+    events = [tag_pushed(index) for index in range(10)]
+
+    received = asyncio.run(
+        listen_and_emit(
+            TagPushedListener(),
+            private_bus,
+            events,
+            len(events),
+            batchMaxSize=4,
+            batchMaxLatency=0.05,
+        )
+    )
+
+    assert received == events
+
+
+def test_redelivered_events_are_accepted_once(private_bus, monkeypatch):
+    monkeypatch.setenv("PYTHONEDA_ARTIFACT_DBUS_TRANSPORTS", f"*={private_bus}")
+    monkeypatch.setenv("PYTHONEDA_ARTIFACT_DEDUP_WINDOW", "60")
+    events = [tag_pushed(0), tag_pushed(1), tag_pushed(0)]
+
+    received = asyncio.run(
+        listen_and_emit(
+            ArtifactDbusSignalListener(),
+            private_bus,
+            events,
+            2,
+            dedupIndex=ArtifactDedupIndex("emitter", window=0),
+        )
+    )
+
+    assert received == events[:2]
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End:
@@ -0,0 +1,105 @@
+# vim: set fileencoding=utf-8
+"""
+tests/dbus/test_dbus_artifact_compact_event.py
+
+This file tests the DbusArtifactCompactEvent class.
+
+Copyright (C) 2023-today rydnr's pythoneda-shared-artifact/infrastructure
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+from dbus_next import Message
+from dbus_next.aio import MessageBus
+from pythoneda.shared.artifact.events import TagPushed
+from pythoneda.shared.artifact.events.infrastructure.dbus import DbusTagPushed
+from pythoneda.shared.artifact.infrastructure.dbus import (
+    ArtifactDbusSignalEmitter,
+    DbusArtifactCompactEvent,
+)
+import pytest
+
+
+@pytest.mark.parametrize("codec", DbusArtifactCompactEvent.available_codecs())
+def test_encode_and_decode_round_trip(codec):
+    body = ["1.0.0", "x" * 4096, {"nested": [1, "two"]}, "ñ"]
+
+    payload = DbusArtifactCompactEvent.encode("ssss", body, codec)
+
+    assert DbusArtifactCompactEvent.decode(payload) == ("ssss", body)
+
+
+def test_decode_rejects_unknown_payloads():
+    with pytest.raises(ValueError):
+        DbusArtifactCompactEvent.decode(b"XYZ\x01\x00")
+
+
+def test_compact_signal_unpacks_into_the_event():
+    event = TagPushed("1.0.0", "0" * 40, "url", "main", "folder")
+    signal = DbusArtifactCompactEvent.new_signal(
+        event, DbusTagPushed.sign(event), DbusTagPushed.transform(event)
+    )
+
+    [(name, message)] = DbusArtifactCompactEvent.unpack(signal)
+
+    assert name.endswith(".TagPushed")
+    assert DbusTagPushed.parse(message, None) == event
+
+
+def test_compact_signals_travel_through_the_bus(private_bus):
+    event = TagPushed("1.0.0", "0" * 40, "url", "main", "folder")
+
+    async def scenario():
+        received = asyncio.get_running_loop().create_future()
+        bus = await MessageBus(bus_address=private_bus).connect()
+        await bus.call(
+            Message(
+                destination="org.freedesktop.DBus",
+                path="/org/freedesktop/DBus",
+                interface="org.freedesktop.DBus",
+                member="AddMatch",
+                signature="s",
+                body=[
+                    f"type='signal',interface='{DbusArtifactCompactEvent.INTERFACE}'"
+                ],
+            )
+        )
+
+        def on_message(message: Message):
+            if (
+                message.interface == DbusArtifactCompactEvent.INTERFACE
+                and not received.done()
+            ):
+                received.set_result(message)
+
+        bus.add_message_handler(on_message)
+        emitter = ArtifactDbusSignalEmitter(
+            transports={"*": private_bus}, encoding="compact"
+        )
+        await emitter.emit(event)
+        message = await asyncio.wait_for(received, 10)
+        bus.disconnect()
+        return message
+
+    [(_, message)] = DbusArtifactCompactEvent.unpack(asyncio.run(scenario()))
+
+    assert DbusTagPushed.parse(message, None) == event
+# vim: syntax=python ts=4 sw=4 sts=4 tw=79 sr et
+# Local Variables:
+# mode: python
+# python-indent-offset: 4
+# tab-width: 4
+# indent-tabs-mode: nil
+# fill-column: 79
+# End: